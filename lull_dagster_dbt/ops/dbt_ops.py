@@ -1,6 +1,22 @@
 from typing import List
 from lull_dagster_dbt.src import DBTApi
-import requests
+from lull_dagster_dbt.src.dbt_backfill import (
+    DBTBackfill,
+    DBTBackfillWindow,
+    date_partitions,
+)
+from lull_dagster_dbt.src.dbt_catalog import DBTJobCatalog
+from lull_dagster_dbt.src.dbt_graph import DBTModelGraph
+from lull_dagster_dbt.src.dbt_history import DBTRunHistory
+from lull_dagster_dbt.src.dbt_memoization import (
+    artifact_freshness_probe,
+    memoized_trigger_and_wait,
+)
+from lull_dagster_dbt.src.dbt_retry import attempt_cause, retry_steps_override
+from lull_dagster_dbt.src.dbt_scheduler import DBTJobScheduler
+from lull_dagster_dbt.src.dbt_sharding import DBTShardedRun
+from lull_dagster_dbt.src.dbt_stall import DBTStallDetector
+from lull_dagster_dbt.src.dbt_tuning import DBTThreadsTuner
 
 from dagster import (
     DynamicOut,
@@ -14,6 +30,7 @@ from dagster import (
 )
 
 from datetime import datetime, timezone
+from http import HTTPStatus
 
 
 @op(
@@ -48,7 +65,40 @@ from datetime import datetime, timezone
         "run_after_list": In(),
         "terminate_timed_out_run": In(
             description="Whether to cancel the DBT if it does not complete within the time_limit_sec."
-        )
+        ),
+        "priority": In(
+            description="Priority class used to queue for a run slot when "
+            "DBT_CONCURRENCY_DB is set, higher goes first. Default is 0."
+        ),
+        "memoize": In(
+            description="Skip the run when the job's last successful run was "
+            "triggered with the same steps_override, git_sha and source "
+            "freshness. Default is False."
+        ),
+        "git_sha": In(
+            description="The git sha the job would build, required for "
+            "memoize to skip anything"
+        ),
+        "freshness_job_id": In(
+            description="DBT Cloud Job Id running `dbt source freshness`, "
+            "its sources.json is part of the memoize key. Required for "
+            "memoize to skip runs."
+        ),
+        "retry_from_failure": In(
+            description="On a retry of this op, only rebuild the nodes that "
+            "failed or were skipped in the failed attempt's run, plus their "
+            "descendants. The run is found by an [attempt:...] tag added to "
+            "the cause. Default is False."
+        ),
+        "stall_timeout_sec": In(
+            description="Cancel the run when its heartbeat hasn't moved for "
+            "this many seconds, or it stays queued far longer than its usual "
+            "queued_duration. Default is no stall detection."
+        ),
+        "retrigger_stalled": In(
+            description="How many times to trigger a stalled run again "
+            "before failing, default is 0"
+        ),
     },
     retry_policy=RetryPolicy(
         max_retries=3, delay=5, backoff=Backoff("EXPONENTIAL")
@@ -63,18 +113,73 @@ def dbt_trigger_and_wait(
     time_limit_sec: int = 900,
     run_after: Any = None,
     run_after_list: list = [],
-    terminate_timed_out_run: bool = True
+    terminate_timed_out_run: bool = True,
+    priority: int = 0,
+    memoize: bool = False,
+    git_sha: str = None,
+    freshness_job_id: int = None,
+    retry_from_failure: bool = False,
+    stall_timeout_sec: int = None,
+    retrigger_stalled: int = 0,
 ):
     dbt: DBTApi = context.resources.dbt_interface
 
-    for run_status in dbt.trigger_and_wait(
-        job_id, 
-        cause, 
-        steps_override, 
-        time_limit_sec, 
-        logger=context.log, 
-        terminate_timed_out_run=terminate_timed_out_run
-    ):  
+    stall_detector = None
+    if stall_timeout_sec is not None:
+        stall_detector = DBTStallDetector.from_history(
+            dbt, job_id, heartbeat_timeout_sec=stall_timeout_sec
+        )
+
+    if retry_from_failure:
+        # The same for every attempt of this op in this Dagster run
+        attempt_key = f"{context.run_id}/{context.solid_handle}"
+        if context.retry_number > 0:
+            steps_override = (
+                retry_steps_override(
+                    dbt, job_id, attempt_key, steps_override, context.log
+                )
+                or steps_override
+            )
+        cause = attempt_cause(cause, attempt_key)
+
+    if memoize and freshness_job_id is None:
+        context.log.warning(
+            "memoize needs a freshness_job_id to see new source data, "
+            "running the job."
+        )
+        memoize = False
+
+    if memoize:
+        freshness_probe = artifact_freshness_probe(dbt, freshness_job_id, job_id)
+
+        run_statuses = memoized_trigger_and_wait(
+            dbt,
+            job_id,
+            cause,
+            steps_override,
+            time_limit_sec,
+            terminate_timed_out_run=terminate_timed_out_run,
+            git_sha=git_sha,
+            freshness_probe=freshness_probe,
+            logger=context.log,
+            priority=priority,
+            stall_detector=stall_detector,
+            retrigger_stalled=retrigger_stalled,
+        )
+    else:
+        run_statuses = dbt.trigger_and_wait(
+            job_id, 
+            cause, 
+            steps_override, 
+            time_limit_sec, 
+            logger=context.log, 
+            terminate_timed_out_run=terminate_timed_out_run,
+            priority=priority,
+            stall_detector=stall_detector,
+            retrigger_stalled=retrigger_stalled,
+        )
+
+    for run_status in run_statuses:
         run_status.check_run_progress(context.log)
 
 @op(
@@ -100,9 +205,21 @@ def dbt_trigger_and_wait(
 )
 def dbt_validate(context, job_id: int) -> str:
     dagster_dbt: DBTApi = context.resources.dbt_interface
-    run = dagster_dbt.get_job_runs(job_id).run_list[0]
+    run_history: DBTRunHistory = dagster_dbt.run_history
+
+    # The mirror is read only when it was synced recently and has the
+    # job's runs, otherwise the API is asked
+    runs = []
+    if run_history is not None and run_history.is_fresh():
+        runs = run_history.get_job_runs(job_id).run_list
+    elif run_history is not None:
+        context.log.warning(
+            f"Run history last synced at {run_history.last_synced_at()}, "
+            f"reading job {job_id} from the API."
+        )
+    run = runs[0] if runs else dagster_dbt.get_job_runs(job_id).run_list[0]
 
-    if run.request_status.code == requests.codes.ok:
+    if run.request_status.code == HTTPStatus.OK:
         finished_at = datetime.strptime(
             run.finished_at,
             "%Y-%m-%d %H:%M:%S.%f%z",
@@ -137,3 +254,293 @@ def dbt_uptime_get_yaml_config(dbt_jobs_ids: List[int]) -> int:
             output_name="job_id", value=job_id, mapping_key=str(job_id)
         )
 
+
+@op(
+    ins={
+        "job_dependencies": In(
+            description="A dict of DBT Cloud Job Ids to the list of Job Ids "
+            "they run after. Jobs with no upstreams can map to an empty list."
+            """
+            E.g.
+            { 101: [], 102: [101], 103: [101], 104: [102, 103] }
+            """
+        ),
+        "max_concurrency": In(
+            description="Maximum number of DBT Cloud runs in flight at once, "
+            "default is 4"
+        ),
+        "cause": In(
+            description="The cause for invoking these jobs, gets defaulted "
+            'to "Triggered by Dagster".'
+        ),
+        "time_limit_sec": In(
+            description="Time limit in seconds to wait for each dbt job, "
+            "default is no limit"
+        ),
+    },
+    required_resource_keys={"dbt_interface"},
+)
+def dbt_schedule_jobs(
+    context,
+    job_dependencies: dict,
+    max_concurrency: int = 4,
+    cause: str = "Triggered by Dagster",
+    time_limit_sec: int = None,
+):
+    dbt: DBTApi = context.resources.dbt_interface
+
+    scheduler = DBTJobScheduler(
+        dbt,
+        job_dependencies,
+        max_concurrency=max_concurrency,
+        cause=cause,
+        time_limit_sec=time_limit_sec,
+    )
+    result = scheduler.run(logger=context.log)
+    result.check_progress(context.log)
+
+
+@op(
+    ins={
+        "job_id": In(
+            description="The DBT Cloud Job Id to trigger. This can be found "
+            "by clicking on the job in DBT Cloud and retrieving from "
+            "the URL or description"
+        ),
+        "cause": In(
+            description="The cause for invoking this job, gets defaulted "
+            'to "Triggered by Dagster". Set in case more info is needed.'
+        ),
+        "time_limit_sec": In(
+            description="Time limit in seconds to wait for dbt job, "
+            "default is 900s (15 mins)"
+        ),
+        "apply_threads": In(
+            description="Whether to run the job with the proposed thread "
+            "count through steps_override. When False the proposal is only "
+            "logged and the run is recorded with the job's own threads."
+        ),
+    },
+    retry_policy=RetryPolicy(
+        max_retries=3, delay=5, backoff=Backoff("EXPONENTIAL")
+    ),
+    required_resource_keys={"dbt_interface", "dbt_threads_tuner"},
+)
+def dbt_trigger_and_wait_tuned(
+    context,
+    job_id: int,
+    cause: str = "Triggered by Dagster",
+    time_limit_sec: int = 900,
+    apply_threads: bool = True,
+):
+    dbt: DBTApi = context.resources.dbt_interface
+    tuner: DBTThreadsTuner = context.resources.dbt_threads_tuner
+
+    for run_status in tuner.trigger_and_wait(
+        dbt,
+        job_id,
+        cause,
+        time_limit_sec,
+        apply=apply_threads,
+        logger=context.log,
+    ):
+        run_status.check_run_progress(context.log)
+
+
+@op(
+    out={
+        "threads_report": Out(
+            description="One row per job and thread count with the number "
+            "of runs and their median and best run duration"
+        )
+    },
+    required_resource_keys={"dbt_threads_tuner"},
+)
+def dbt_threads_report(context) -> list:
+    tuner: DBTThreadsTuner = context.resources.dbt_threads_tuner
+    report = tuner.report()
+
+    for row in report:
+        mark = " (fastest)" if row["fastest"] else ""
+        context.log.info(
+            f"Job {row['job_id']} threads {row['threads']}: "
+            f"{row['runs']} runs, median {row['median_run_duration_sec']:.0f}s"
+            f"{mark}"
+        )
+
+    return report
+
+
+@op(
+    ins={
+        "job_id": In(
+            description="The DBT Cloud Job Id to split into shards. The plan "
+            "is built from the artifacts of its last successful run."
+        ),
+        "n_shards": In(
+            description="Number of concurrent runs to split the job into, "
+            "default is 4"
+        ),
+        "command": In(
+            description='The dbt command each shard runs, default is "run". '
+            'Use "build" to also run the tests of each shard\'s models.'
+        ),
+        "cause": In(
+            description="The cause for invoking this job, gets defaulted "
+            'to "Triggered by Dagster".'
+        ),
+        "time_limit_sec": In(
+            description="Time limit in seconds to wait for each shard, "
+            "default is no limit"
+        ),
+    },
+    required_resource_keys={"dbt_interface"},
+)
+def dbt_sharded_trigger_and_wait(
+    context,
+    job_id: int,
+    n_shards: int = 4,
+    command: str = "run",
+    cause: str = "Triggered by Dagster",
+    time_limit_sec: int = None,
+):
+    dbt: DBTApi = context.resources.dbt_interface
+
+    sharded_run = DBTShardedRun(
+        dbt,
+        job_id,
+        n_shards=n_shards,
+        command=command,
+        cause=cause,
+        time_limit_sec=time_limit_sec,
+    )
+    result = sharded_run.run(logger=context.log)
+    result.check_progress(context.log)
+
+
+@op(
+    ins={
+        "full_refresh": In(
+            description="Refetch every job instead of only the jobs updated "
+            "since the last refresh, default is False"
+        ),
+        "manifest_job_id": In(
+            description="Optional DBT Cloud Job Id whose last successful "
+            "run's manifest.json is used to resolve every selector in the "
+            "catalog to models. Without it only plain model names are indexed."
+        ),
+    },
+    out={
+        "job_ids": Out(
+            description="Every DBT Cloud Job Id in the environment"
+        )
+    },
+    required_resource_keys={"dbt_interface", "dbt_job_catalog"},
+)
+def dbt_refresh_job_catalog(
+    context, full_refresh: bool = False, manifest_job_id: int = None
+) -> List[str]:
+    catalog: DBTJobCatalog = context.resources.dbt_job_catalog
+    catalog.refresh(full=full_refresh, logger=context.log)
+
+    if manifest_job_id is not None:
+        dbt: DBTApi = context.resources.dbt_interface
+        last_run = dbt.get_job_runs(manifest_job_id, limit=10).get_last_successful_run()
+        if last_run is not None:
+            manifest = dbt.get_run_artifact(last_run.run_id, "manifest.json")
+            catalog.build_index(DBTModelGraph.from_manifest(manifest))
+
+    return catalog.job_ids
+
+
+@op(
+    ins={
+        "model": In(description="The dbt model name to look up"),
+    },
+    out={
+        "job_ids": Out(
+            description="The DBT Cloud Job Ids whose steps build the model"
+        )
+    },
+    required_resource_keys={"dbt_job_catalog"},
+)
+def dbt_jobs_for_model(context, model: str) -> List[str]:
+    catalog: DBTJobCatalog = context.resources.dbt_job_catalog
+    job_ids = catalog.jobs_for_model(model)
+    context.log.info(f"Jobs building {model}: {job_ids}")
+
+    return job_ids
+
+
+@op(
+    out={
+        "synced_runs": Out(
+            description="The number of runs fetched from DBT Cloud"
+        )
+    },
+    required_resource_keys={"dbt_interface", "dbt_run_history"},
+)
+def dbt_sync_run_history(context) -> int:
+    run_history: DBTRunHistory = context.resources.dbt_run_history
+
+    return run_history.sync(context.resources.dbt_interface, logger=context.log)
+
+
+@op(
+    ins={
+        "job_id": In(
+            description="The DBT Cloud Job Id to run once per partition"
+        ),
+        "start": In(description='The first partition date, E.g. "2021-11-01"'),
+        "end": In(description='The last partition date, included'),
+        "vars_template": In(
+            description="The dbt vars for each partition, string values are "
+            'formatted with the partition. E.g. {"run_date": "{partition}"}'
+        ),
+        "step_days": In(
+            description="Days between partitions, default is 1"
+        ),
+        "max_concurrency": In(
+            description="The most partition runs in flight, default is 8. "
+            "The backfill starts at 2 and adapts to queue pressure."
+        ),
+        "time_limit_sec": In(
+            description="Time limit in seconds to wait for each partition, "
+            "default is no limit"
+        ),
+        "checkpoint_path": In(
+            description="SQLite file where finished partitions are recorded, "
+            "so a backfill run again resumes where it stopped"
+        ),
+    },
+    out={
+        "partitions": Out(description="The partitions that were backfilled")
+    },
+    required_resource_keys={"dbt_interface"},
+)
+def dbt_backfill(
+    context,
+    job_id: int,
+    start: str,
+    end: str,
+    vars_template: dict,
+    step_days: int = 1,
+    max_concurrency: int = 8,
+    time_limit_sec: int = None,
+    checkpoint_path: str = "dbt_backfill.db",
+) -> List[str]:
+    dbt: DBTApi = context.resources.dbt_interface
+
+    backfill = DBTBackfill(
+        dbt,
+        job_id,
+        date_partitions(start, end, step_days),
+        vars_template,
+        checkpoint_path,
+        window=DBTBackfillWindow(size=min(2, max_concurrency), max_size=max_concurrency),
+        time_limit_sec=time_limit_sec,
+    )
+    result = backfill.run(logger=context.log)
+    result.check_progress(context.log)
+
+    return result.skipped + result.succeeded
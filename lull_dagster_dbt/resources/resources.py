@@ -1,13 +1,156 @@
-from dagster import resource
+from dagster import Field, Noneable, resource
+import json
 import os
 from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_catalog import DBTJobCatalog
+from lull_dagster_dbt.src.dbt_concurrency import DBTConcurrencyLimiter
+from lull_dagster_dbt.src.dbt_history import DBTRunHistory
+from lull_dagster_dbt.src.dbt_local import DBTBackendRouter, DBTLocalApi, DBTLocalJob
+from lull_dagster_dbt.src.dbt_pool import DBTClientPool
+from lull_dagster_dbt.src.dbt_tuning import DBTThreadsTuner
+
+
+def get_concurrency_limiter():
+    if not os.environ.get("DBT_CONCURRENCY_DB"):
+        return None
+
+    # Shared by every Dagster job that points at the same file
+    return DBTConcurrencyLimiter(
+        path=os.environ.get("DBT_CONCURRENCY_DB"),
+        max_slots=int(os.environ.get("DBT_MAX_CONCURRENT_RUNS", 4)),
+    )
+
+
+def get_run_history():
+    if not os.environ.get("DBT_RUN_HISTORY_DB"):
+        return None
+
+    return DBTRunHistory(
+        path=os.environ.get("DBT_RUN_HISTORY_DB"),
+        max_age_sec=float(os.environ.get("DBT_RUN_HISTORY_MAX_AGE_SEC", 900)),
+    )
 
 
 @resource
 def dbt_interface(init_context):
-    return DBTApi(
+    """
+    DBT_LOCAL_JOBS_CONFIG can point at a JSON object of job id to
+    {project_dir, execute_steps, profiles_dir, target, ...}; those jobs run
+    with the local dbt executable, every other job runs in DBT Cloud.
+    """
+    concurrency_limiter = get_concurrency_limiter()
+
+    dbt = DBTApi(
         access_token=os.environ.get("DBT_ACCESS_TOKEN"),
         environment_id=os.environ.get("DBT_ENVIRONMENT_ID"),
         account_id=os.environ.get("DBT_ACCOUNT_ID"),
         project_id=os.environ.get("DBT_PROJECT_ID"),
+        concurrency_limiter=concurrency_limiter,
+        run_history=get_run_history(),
+    )
+
+    if not os.environ.get("DBT_LOCAL_JOBS_CONFIG"):
+        return dbt
+
+    with open(os.environ.get("DBT_LOCAL_JOBS_CONFIG")) as fp:
+        local_jobs = json.load(fp)
+
+    local = DBTLocalApi(
+        jobs={job_id: DBTLocalJob(**job) for job_id, job in local_jobs.items()},
+        max_workers=int(os.environ.get("DBT_LOCAL_MAX_WORKERS", 2)),
+        dbt_executable=os.environ.get("DBT_EXECUTABLE", "dbt"),
+        log_dir=os.environ.get("DBT_LOCAL_LOG_DIR"),
+        concurrency_limiter=concurrency_limiter,
+        logger=init_context.log,
+    )
+
+    return DBTBackendRouter(cloud=dbt, local=local)
+
+
+def get_client_pool():
+    """
+    DBT_ACCESS_TOKENS is a comma separated list of tokens for the account
+    in DBT_ACCOUNT_ID. DBT_POOL_CONFIG can instead point at a JSON list of
+    {access_token, account_id, environment_id, project_id} objects to pool
+    several accounts.
+    """
+    concurrency_limiter = get_concurrency_limiter()
+    run_history = get_run_history()
+
+    if os.environ.get("DBT_POOL_CONFIG"):
+        with open(os.environ.get("DBT_POOL_CONFIG")) as fp:
+            credentials = json.load(fp)
+    else:
+        credentials = [
+            {
+                "access_token": token.strip(),
+                "environment_id": os.environ.get("DBT_ENVIRONMENT_ID"),
+                "account_id": os.environ.get("DBT_ACCOUNT_ID"),
+                "project_id": os.environ.get("DBT_PROJECT_ID"),
+            }
+            for token in os.environ.get("DBT_ACCESS_TOKENS", "").split(",")
+            if token.strip()
+        ]
+
+    return DBTClientPool(
+        [
+            DBTApi(
+                concurrency_limiter=concurrency_limiter,
+                run_history=run_history,
+                **credential,
+            )
+            for credential in credentials
+        ],
+        requests_per_minute=int(os.environ.get("DBT_TOKEN_REQUESTS_PER_MINUTE", 60)),
+    )
+
+
+@resource
+def dbt_client_pool(init_context):
+    """
+    The DBTClientPool itself, for ops that work across the pooled accounts,
+    E.g. `pool.api(account_id, environment_id).trigger_and_wait(...)`.
+    """
+    return get_client_pool()
+
+
+@resource(
+    config_schema={
+        "account_id": Field(Noneable(str), is_required=False, default_value=None),
+        "environment_id": Field(Noneable(str), is_required=False, default_value=None),
+    }
+)
+def dbt_pool_interface(init_context):
+    """
+    A drop-in for dbt_interface that spreads requests over several tokens,
+    see get_client_pool. It is bound to the account and environment in its
+    config, E.g. `dbt_pool_interface.configured({"account_id": "42"})`,
+    by default to the first configured client's.
+    """
+    return get_client_pool().api(
+        init_context.resource_config["account_id"],
+        init_context.resource_config["environment_id"],
+    )
+
+
+@resource
+def dbt_threads_tuner(init_context):
+    return DBTThreadsTuner(
+        path=os.environ.get("DBT_THREADS_TUNING_DB", "dbt_threads_tuning.db"),
+        max_threads=int(os.environ.get("DBT_MAX_THREADS", 16)),
+    )
+
+
+@resource(required_resource_keys={"dbt_interface"})
+def dbt_job_catalog(init_context):
+    return DBTJobCatalog(
+        init_context.resources.dbt_interface,
+        path=os.environ.get("DBT_JOB_CATALOG_PATH", "dbt_job_catalog.json"),
+    )
+
+
+@resource
+def dbt_run_history(init_context):
+    return DBTRunHistory(
+        path=os.environ.get("DBT_RUN_HISTORY_DB", "dbt_run_history.db")
     )
@@ -1 +1,24 @@
-from .dbt_api import DBTApi
\ No newline at end of file
+# Exports are imported on first access (PEP 562), so importing one module
+# of the package doesn't load the others and their dependencies.
+_EXPORTS = {
+    "DBTApi": "dbt_api",
+    "DBTJobScheduler": "dbt_scheduler",
+    "DBTConcurrencyLimiter": "dbt_concurrency",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    # __import__ rather than importlib.import_module, which -X importtime
+    # doesn't report
+    value = getattr(__import__(f"{__name__}.{_EXPORTS[name]}", fromlist=[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
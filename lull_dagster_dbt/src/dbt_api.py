@@ -1,23 +1,117 @@
-import requests
 import attr
 from typing import List, Dict, Generator, Union
 from lull_dagster_dbt.src.dbt_types import (
     DBTJob,
+    DBTJobList,
     DBTRunStatus,
     DBTRunStatusList,
     DBTRequestHeaders,
 )
 import time
 
+from lull_dagster_dbt.src.dbt_concurrency import DBTConcurrencyLimiter
 from lull_dagster_dbt.src.dbt_exceptions import DBTNoJobIdException, DBTNoRunIdException
+from lull_dagster_dbt.src.dbt_stall import DBTStallDetector
 
 def is_none_or_empty(instance, attribute, value):
     if value is None or value == "":
         raise ValueError(f"{attribute.name} can't be None or Empty String")
 
 
+class DBTRunWaiter:
+    """
+    The polling loop shared by run backends. Subclasses provide
+    `create_run`, `get_run` and `cancel_run` returning DBTRunStatus, and
+    `concurrency_limiter` and `poll_interval_sec` attributes.
+    """
+
+    def trigger_and_wait(
+        self,
+        job_id: str,
+        cause: str = "Triggered by Dagster",
+        steps_override: list = None,
+        time_limit_sec: int = 600,
+        terminate_timed_out_run: bool = True,
+        logger=None,
+        priority: int = 0,
+        stall_detector: Union[DBTStallDetector, None] = None,
+        retrigger_stalled: int = 0,
+    ) -> Generator[DBTRunStatus, None, None]:
+        """
+        GENERATOR Method: Triggers a Job in DBT Cloud and waits for it to complete.
+        This method yields a status and run_id with each request to DBT Cloud.
+        With a `concurrency_limiter` set, a run slot is leased at `priority`
+        before the run is created and held until it finishes.
+        With a `stall_detector` set, a run it reports as hung is cancelled and
+        triggered again up to `retrigger_stalled` times, then marked stalled.
+        """
+        if job_id is None:
+            raise DBTNoJobIdException("No Job ID provided")
+
+        lease = None
+        if self.concurrency_limiter is not None:
+            lease = self.concurrency_limiter.acquire(
+                f"job-{job_id}", priority, logger=logger
+            )
+
+        try:
+            run_status = self.create_run(job_id, cause, steps_override)
+            start = time.time()
+            retriggered = 0
+
+            while run_status.is_running and (time.time() - start) < time_limit_sec:
+                yield run_status
+                time.sleep(self.poll_interval_sec)
+
+                if logger is not None:
+                    logger.info(
+                        f"Waiting on run: {run_status.run_id}, "
+                        f"sleeping {self.poll_interval_sec} seconds."
+                    )
+
+                run_status = self.get_run(run_status.run_id)
+
+                if lease is not None:
+                    self.concurrency_limiter.renew(lease)
+
+                stall_reason = None
+                if stall_detector is not None and run_status.is_running:
+                    stall_reason = stall_detector.check(run_status)
+
+                if stall_reason is not None:
+                    if logger is not None:
+                        logger.warning(
+                            f"Run {run_status.run_id} looks stalled, {stall_reason}. "
+                            f"Cancelling run now."
+                        )
+                    self.cancel_run(run_status.run_id)
+
+                    if retriggered < retrigger_stalled:
+                        retriggered += 1
+                        stall_detector.reset()
+                        run_status = self.create_run(job_id, cause, steps_override)
+                    else:
+                        run_status.stalled(stall_reason)
+
+            if run_status.is_running:
+                if logger is not None:
+                    logger.warning(f"Run {run_status.run_id} did not finish.")
+                run_status.timeout()
+
+                if terminate_timed_out_run:
+                    if logger is not None:
+                        logger.info(f"Cancelling run now.")
+
+                    self.cancel_run(run_status.run_id)
+
+            yield run_status
+        finally:
+            if lease is not None:
+                self.concurrency_limiter.release(lease)
+
+
 @attr.s(auto_attribs=True)
-class DBTApi:
+class DBTApi(DBTRunWaiter):
 
     DBT_URL = "https://cloud.getdbt.com/api/v2/accounts"
 
@@ -41,6 +135,15 @@ class DBTApi:
             takes_self=True,
         )
     )
+    # Optional limiter shared by every process that triggers runs,
+    # runs started by trigger_and_wait hold one of its slots until they end.
+    concurrency_limiter: Union[DBTConcurrencyLimiter, None] = attr.ib(
+        default=None
+    )
+    poll_interval_sec: int = 30
+    # Optional DBTRunHistory mirror, reports read run history from it
+    # instead of the API when it is set.
+    run_history: object = attr.ib(default=None)
 
     def request(
         self,
@@ -49,9 +152,12 @@ class DBTApi:
         json: Union[Dict, None] = None,
         params: dict = None,
         return_type: Union[
-            DBTRunStatus, DBTJob, DBTRunStatusList
+            DBTRunStatus, DBTJob, DBTRunStatusList, DBTJobList, None
         ] = DBTRunStatus,
     ):
+        # Imported here so the client and types import without requests
+        import requests
+
         response = requests.request(
             method,
             self.base_url + url,
@@ -60,6 +166,10 @@ class DBTApi:
             params=params,
         )
         response.raise_for_status()
+
+        if return_type is None:
+            return response.json()
+
         return return_type.from_dict(response.json())
 
     def get_job(self, job_id: str) -> DBTJob:
@@ -68,6 +178,26 @@ class DBTApi:
 
         return self.request(url=f"/jobs/{job_id}", return_type=DBTJob)
 
+    def list_jobs(
+        self,
+        offset: int = 0,
+        limit: int = 100,
+        order_by: str = "-updated_at",
+    ) -> DBTJobList:
+        """
+        One page of the jobs in this environment.
+        """
+        return self.request(
+            url="/jobs/",
+            params={
+                "environment_id": self.environment_id,
+                "order_by": order_by,
+                "offset": offset,
+                "limit": limit,
+            },
+            return_type=DBTJobList,
+        )
+
     def get_job_runs(
         self, job_id: int = None, limit: int = 2
     ) -> DBTRunStatusList:
@@ -77,7 +207,7 @@ class DBTApi:
         return self.request(
             url="/runs",
             params={
-                "include_related": ["job"],
+                "include_related": ["job", "trigger"],
                 "job_definition_id": f"{job_id}",
                 "order_by": "-id",
                 "limit": limit,
@@ -85,6 +215,30 @@ class DBTApi:
             return_type=DBTRunStatusList,
         )
 
+    def list_runs(
+        self,
+        offset: int = 0,
+        limit: int = 100,
+        order_by: str = "-id",
+        job_id: int = None,
+        return_type: Union[DBTRunStatusList, None] = DBTRunStatusList,
+    ) -> Union[DBTRunStatusList, Dict]:
+        """
+        One page of the runs in this environment, or of one job's runs.
+        With `return_type` None the response JSON is returned as is.
+        """
+        params = {
+            "include_related": ["job", "trigger"],
+            "environment_id": self.environment_id,
+            "order_by": order_by,
+            "offset": offset,
+            "limit": limit,
+        }
+        if job_id is not None:
+            params["job_definition_id"] = f"{job_id}"
+
+        return self.request(url="/runs", params=params, return_type=return_type)
+
     def create_run(
         self,
         job_id: str,
@@ -111,49 +265,24 @@ class DBTApi:
 
         return self.request(url=f"/runs/{run_id}")
 
-    def cancel_run(self, run_id: int = None) -> DBTRunStatus:
-        if run_id is None:
-            raise DBTNoRunIdException("Run ID Can't be None")
-
-        return self.request("post", f"/runs/{run_id}/cancel/")
-
-    def trigger_and_wait(
-        self,
-        job_id: str,
-        cause: str = "Triggered by Dagster",
-        steps_override: list = None,
-        time_limit_sec: int = 600,
-        terminate_timed_out_run: bool = True,
-        logger=None,
-    ) -> Generator[DBTRunStatus, None, None]:
+    def get_run_artifact(
+        self, run_id: int = None, path: str = "manifest.json", step: int = None
+    ) -> Dict:
         """
-        GENERATOR Method: Triggers a Job in DBT Cloud and waits for it to complete.
-        This method yields a status and run_id with each request to DBT Cloud.
+        Fetches a JSON artifact (E.g. manifest.json, run_results.json)
+        saved by a run. Without `step` this is the last step's artifact.
         """
-        if job_id is None:
-            raise DBTNoJobIdException("No Job ID provided")
-
-        run_status = self.create_run(job_id, cause, steps_override)
-        start = time.time()
-
-        while run_status.is_running and (time.time() - start) < time_limit_sec:
-            yield run_status
-            time.sleep(30)
-
-            if logger is not None:
-                logger.info(f"Waiting on run: {run_status.run_id}, sleeping 30 seconds.")
-
-            run_status = self.get_run(run_status.run_id)
-
-        if run_status.is_running:
-            if logger is not None:
-                logger.warning(f"Run {run_status.run_id} did not finish.")
-            run_status.timeout()
+        if run_id is None:
+            raise DBTNoRunIdException("Run ID Can't be None")
 
-            if terminate_timed_out_run:
-                if logger is not None:
-                    logger.info(f"Cancelling run now.")
+        return self.request(
+            url=f"/runs/{run_id}/artifacts/{path}",
+            params={"step": step} if step is not None else None,
+            return_type=None,
+        )
 
-                self.cancel_run(run_status.run_id)
+    def cancel_run(self, run_id: int = None) -> DBTRunStatus:
+        if run_id is None:
+            raise DBTNoRunIdException("Run ID Can't be None")
 
-        yield run_status
+        return self.request("post", f"/runs/{run_id}/cancel/")
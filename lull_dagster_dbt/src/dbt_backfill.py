@@ -0,0 +1,358 @@
+import json
+import time
+from datetime import date, datetime, timedelta
+from statistics import median
+from typing import Dict, List, Union
+
+import attr
+
+from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_concurrency import DBTRunLeases
+from lull_dagster_dbt.src.dbt_exceptions import DBTBackfillFailedException
+from lull_dagster_dbt.src.dbt_selectors import DBTStep
+from lull_dagster_dbt.src.dbt_store import sqlite_transaction
+from lull_dagster_dbt.src.dbt_types import DBTRunStatus
+
+# dbt commands that take --vars
+VARS_COMMANDS = (
+    "run", "build", "test", "seed", "snapshot", "compile", "run-operation", "source",
+)
+VARS_FLAG = "--vars"
+
+
+def date_partitions(
+    start: str, end: str, step_days: int = 1, fmt: str = "%Y-%m-%d"
+) -> List[str]:
+    """
+    The dates from `start` to `end`, both included, every `step_days`.
+    """
+    if step_days < 1:
+        raise ValueError(f"step_days must be at least 1, got {step_days}")
+
+    day: date = datetime.strptime(start, fmt).date()
+    last: date = datetime.strptime(end, fmt).date()
+
+    partitions = []
+    while day <= last:
+        partitions.append(day.strftime(fmt))
+        day += timedelta(days=step_days)
+
+    return partitions
+
+
+def render_vars(vars_template: Dict, partition: str) -> Dict:
+    """
+    Formats every string value of the template with the partition, E.g.
+    {"run_date": "{partition}"} becomes {"run_date": "2021-11-01"}.
+    """
+    return {
+        key: value.format(partition=partition) if isinstance(value, str) else value
+        for key, value in vars_template.items()
+    }
+
+
+def partition_steps(
+    execute_steps: List[str], vars_template: Dict, partition: str
+) -> List[str]:
+    """
+    The job's steps with the partition's `--vars` on every dbt command that
+    takes them. Vars already in a step are kept when they are JSON, the
+    partition's vars win on conflicts.
+    """
+    partition_vars = render_vars(vars_template, partition)
+    steps = []
+    for execute_step in execute_steps:
+        step = DBTStep.parse(execute_step)
+        if step.command.split(" ")[0] not in VARS_COMMANDS:
+            steps.append(execute_step)
+            continue
+
+        step_vars = {}
+        if VARS_FLAG in step.args:
+            index = step.args.index(VARS_FLAG)
+            try:
+                step_vars = json.loads(step.args[index + 1])
+            except (IndexError, ValueError):
+                pass
+            del step.args[index : index + 2]
+
+        step.args += [VARS_FLAG, json.dumps({**step_vars, **partition_vars})]
+        steps.append(step.render())
+
+    return steps
+
+
+@attr.s(auto_attribs=True)
+class DBTBackfillWindow:
+    """
+    An AIMD concurrency window: it grows by one run per window of runs
+    that finish without pressure, and is cut by `decrease_factor` on
+    pressure, a run queued longer than `queue_target_sec`, a run slower
+    than `slowdown_factor` times the median so far, or a 429.
+    """
+
+    size: float = 2
+    min_size: int = 1
+    max_size: int = 8
+    decrease_factor: float = 0.5
+    queue_target_sec: float = 120
+    slowdown_factor: float = 2.0
+    durations: List[float] = attr.ib(factory=list)
+
+    @property
+    def slots(self) -> int:
+        return int(self.size)
+
+    def increase(self):
+        self.size = min(self.max_size, self.size + 1 / self.slots)
+
+    def decrease(self):
+        self.size = max(self.min_size, self.size * self.decrease_factor)
+
+    def pressure(self, run_status: DBTRunStatus) -> Union[str, None]:
+        queued = run_status.queued_duration_sec
+        if queued is not None and queued > self.queue_target_sec:
+            return f"queued for {queued:.0f} seconds"
+
+        duration = run_status.run_duration_sec
+        if (
+            run_status.run_succeeded
+            and duration is not None
+            and self.durations
+            and duration > median(self.durations) * self.slowdown_factor
+        ):
+            return f"ran for {duration:.0f} seconds"
+
+        return None
+
+    def finished(self, run_status: DBTRunStatus) -> Union[str, None]:
+        """
+        Resizes the window for a finished run, returns the pressure seen.
+        """
+        pressure = self.pressure(run_status)
+        if run_status.run_succeeded and run_status.run_duration_sec is not None:
+            self.durations.append(run_status.run_duration_sec)
+
+        if pressure is not None:
+            self.decrease()
+        elif run_status.run_succeeded:
+            self.increase()
+
+        return pressure
+
+
+@attr.s(auto_attribs=True)
+class DBTBackfillResult:
+    """
+    The outcome of a `DBTBackfill.run`. Resumed partitions that had already
+    succeeded in an earlier run are in `skipped`.
+    """
+
+    run_statuses: Dict[str, DBTRunStatus] = attr.ib(factory=dict)
+    succeeded: List[str] = attr.ib(factory=list)
+    failed: List[str] = attr.ib(factory=list)
+    skipped: List[str] = attr.ib(factory=list)
+
+    @property
+    def is_success(self) -> bool:
+        return len(self.failed) == 0
+
+    def check_progress(self, logger=None):
+        if self.is_success:
+            if logger is not None:
+                logger.info(
+                    f"Backfilled {len(self.succeeded)} partitions, "
+                    f"{len(self.skipped)} already done."
+                )
+            return
+
+        raise DBTBackfillFailedException(f"Backfill partitions failed: {self.failed}")
+
+
+@attr.s(auto_attribs=True)
+class DBTBackfill:
+    """
+    Runs a DBT Cloud job once per partition, with `vars_template` rendered
+    into the `--vars` of its steps, keeping at most `window.slots` runs in
+    flight. The window adapts to queue and warehouse pressure, see
+    DBTBackfillWindow.
+
+    Partition states are checkpointed in the SQLite file at `path` under
+    `name`, so running the same backfill again resumes it: succeeded
+    partitions are skipped, runs still in flight are picked up again, and
+    failed partitions are retried until they reach `max_attempts`. Each
+    run of the backfill gives failed partitions `max_attempts` new attempts.
+
+    With a `concurrency_limiter` on the DBTApi, each run also holds one of
+    its slots at `priority` until it finishes, see DBTRunLeases. Runs
+    adopted from an earlier backfill are polled without a slot. If the
+    loop stops on an error, the runs still in flight are cancelled.
+    """
+
+    dbt: DBTApi
+    job_id: Union[int, str]
+    partitions: List[str]
+    vars_template: Dict
+    path: str
+    name: Union[str, None] = None
+    cause: str = "Backfill triggered by Dagster"
+    window: DBTBackfillWindow = attr.ib(factory=DBTBackfillWindow)
+    max_attempts: int = 2
+    poll_interval_sec: float = 30
+    time_limit_sec: Union[float, None] = None
+    priority: int = 0
+
+    def __attrs_post_init__(self):
+        if self.name is None:
+            self.name = f"{self.job_id}:{json.dumps(self.vars_template, sort_keys=True)}"
+
+        with sqlite_transaction(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS backfill_partitions ("
+                "backfill TEXT, partition TEXT, status TEXT, run_id INTEGER, "
+                "attempts INTEGER, updated_at REAL, "
+                "PRIMARY KEY (backfill, partition))"
+            )
+
+    def checkpoint(
+        self, partition: str, status: str, run_id: Union[int, None], attempts: int
+    ):
+        with sqlite_transaction(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO backfill_partitions VALUES (?, ?, ?, ?, ?, ?)",
+                (self.name, partition, status, run_id, attempts, time.time()),
+            )
+
+    def checkpoints(self) -> Dict[str, Dict]:
+        with sqlite_transaction(self.path) as conn:
+            rows = conn.execute(
+                "SELECT partition, status, run_id, attempts "
+                "FROM backfill_partitions WHERE backfill = ?",
+                (self.name,),
+            ).fetchall()
+
+        return {row["partition"]: dict(row) for row in rows}
+
+    def run(self, logger=None) -> DBTBackfillResult:
+        import requests
+
+        execute_steps = self.dbt.get_job(self.job_id).execute_steps
+        checkpoints = self.checkpoints()
+        result = DBTBackfillResult()
+        attempts: Dict[str, int] = {}
+        pending: List[str] = []
+        running: Dict[str, DBTRunStatus] = {}
+        started_at: Dict[str, float] = {}
+
+        for partition in self.partitions:
+            checkpoint = checkpoints.get(partition, {})
+            attempts[partition] = 0
+
+            if checkpoint.get("status") == "success":
+                result.skipped.append(partition)
+            elif checkpoint.get("status") == "running":
+                attempts[partition] = checkpoint["attempts"]
+                running[partition] = self.dbt.get_run(checkpoint["run_id"])
+                started_at[partition] = time.time()
+            else:
+                pending.append(partition)
+
+        if logger is not None:
+            logger.info(
+                f"Backfilling {len(self.partitions)} partitions of job {self.job_id}: "
+                f"{len(result.skipped)} done, {len(running)} in flight, "
+                f"{len(pending)} to run."
+            )
+
+        leases = DBTRunLeases(
+            getattr(self.dbt, "concurrency_limiter", None), self.priority
+        )
+
+        try:
+            while pending or running:
+                while pending and len(running) < self.window.slots:
+                    partition = pending[0]
+                    if not leases.try_lease(partition, f"job-{self.job_id}", logger):
+                        break
+
+                    try:
+                        run_status = self.dbt.create_run(
+                            self.job_id,
+                            f"{self.cause}: {partition}",
+                            partition_steps(execute_steps, self.vars_template, partition),
+                        )
+                    except requests.HTTPError as error:
+                        if error.response is None or error.response.status_code != 429:
+                            raise
+                        leases.release(partition)
+                        self.window.decrease()
+                        if logger is not None:
+                            logger.warning(
+                                f"Rate limited, backfill window down to {self.window.slots}."
+                            )
+                        break
+
+                    pending.pop(0)
+                    attempts[partition] += 1
+                    running[partition] = run_status
+                    started_at[partition] = time.time()
+                    self.checkpoint(partition, "running", run_status.run_id, attempts[partition])
+
+                    if logger is not None:
+                        logger.info(f"Started partition {partition} as run {run_status.run_id}.")
+
+                time.sleep(self.poll_interval_sec)
+                leases.renew()
+
+                for partition, run_status in list(running.items()):
+                    run_status = self.dbt.get_run(run_status.run_id)
+
+                    if (
+                        run_status.is_running
+                        and self.time_limit_sec is not None
+                        and time.time() - started_at[partition] >= self.time_limit_sec
+                    ):
+                        if logger is not None:
+                            logger.warning(f"Run {run_status.run_id} did not finish.")
+                        run_status.timeout()
+                        self.dbt.cancel_run(run_status.run_id)
+
+                    if run_status.is_running:
+                        running[partition] = run_status
+                        continue
+
+                    del running[partition]
+                    leases.release(partition)
+                    result.run_statuses[partition] = run_status
+                    pressure = self.window.finished(run_status)
+
+                    if pressure is not None and logger is not None:
+                        logger.info(
+                            f"Partition {partition} {pressure}, "
+                            f"backfill window down to {self.window.slots}."
+                        )
+
+                    if run_status.run_succeeded:
+                        result.succeeded.append(partition)
+                        self.checkpoint(partition, "success", run_status.run_id, attempts[partition])
+                        continue
+
+                    self.checkpoint(partition, "failed", run_status.run_id, attempts[partition])
+                    if attempts[partition] < self.max_attempts:
+                        pending.append(partition)
+                    else:
+                        result.failed.append(partition)
+
+                    if logger is not None:
+                        logger.warning(
+                            f"Partition {partition} failed with status: "
+                            f"{run_status.status_humanized}, attempt {attempts[partition]} "
+                            f"of {self.max_attempts}."
+                        )
+        except BaseException:
+            leases.cancel_in_flight(self.dbt, running, logger)
+            raise
+        finally:
+            leases.release_all()
+
+        return result
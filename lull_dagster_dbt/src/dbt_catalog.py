@@ -0,0 +1,197 @@
+import json
+import os
+from typing import Dict, List, Set, Union
+
+import attr
+
+from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_selectors import DBTStep, resolve_step
+from lull_dagster_dbt.src.dbt_graph import DBTModelGraph
+from lull_dagster_dbt.src.dbt_types import DBTJob
+
+# DBT Cloud job states: 1 active, 2 deleted
+ACTIVE_JOB_STATE = 1
+
+
+def plain_model(selector: str) -> Union[str, None]:
+    """
+    The model name if `selector` names exactly one model, E.g. "orders" or
+    "model:orders", otherwise None.
+    """
+    if selector.startswith("model:"):
+        selector = selector[len("model:"):]
+
+    if any(c in selector for c in "+@:,*/"):
+        return None
+
+    return selector
+
+
+@attr.s(auto_attribs=True)
+class DBTJobCatalog:
+    """
+    A cached catalog of every job in the DBTApi's environment, kept in the
+    JSON file at `path`. `refresh` pages through `list_jobs` newest
+    `updated_at` first and stops at the last change it already has, so a
+    refresh after the first one costs a single request when little changed.
+
+    The catalog indexes each job's execute_steps by selector, and its run
+    and build steps by model, so "which jobs build model X?" is a dict
+    lookup. Without a model graph only plain model name selectors are
+    indexed to models; with one (see `build_index`) every selector is
+    resolved against the manifest. The graph and both indexes are saved
+    with the jobs, so other processes load the resolved index as is.
+    """
+
+    dbt: DBTApi
+    path: str
+    page_size: int = 100
+    jobs: Dict[str, DBTJob] = attr.ib(factory=dict)
+    watermark: Union[str, None] = None
+    selector_index: Dict[str, Set[str]] = attr.ib(factory=dict)
+    model_index: Dict[str, Set[str]] = attr.ib(factory=dict)
+    graph: Union[DBTModelGraph, None] = None
+
+    def __attrs_post_init__(self):
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path) as fp:
+            cached = json.load(fp)
+
+        self.watermark = cached["watermark"]
+        self.jobs = {job_id: DBTJob(**job) for job_id, job in cached["jobs"].items()}
+
+        if cached.get("graph") is not None:
+            self.graph = DBTModelGraph(**cached["graph"])
+
+        # Catalogs saved before the indexes were cached are indexed again
+        if "model_index" not in cached:
+            self.build_index()
+            return
+
+        self.selector_index = {
+            selector: set(job_ids)
+            for selector, job_ids in cached["selector_index"].items()
+        }
+        self.model_index = {
+            model: set(job_ids) for model, job_ids in cached["model_index"].items()
+        }
+
+    def save(self):
+        cached = {
+            "watermark": self.watermark,
+            "jobs": {
+                job_id: attr.asdict(
+                    job, filter=lambda a, v: a.name != "request_status"
+                )
+                for job_id, job in self.jobs.items()
+            },
+            "graph": attr.asdict(self.graph) if self.graph is not None else None,
+            "selector_index": {
+                selector: sorted(job_ids)
+                for selector, job_ids in self.selector_index.items()
+            },
+            "model_index": {
+                model: sorted(job_ids) for model, job_ids in self.model_index.items()
+            },
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(cached, fp)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, full: bool = False, logger=None) -> int:
+        """
+        Fetches jobs changed since the last refresh, or every job with
+        `full`. Returns the number of jobs added, updated or removed.
+        """
+        watermark = None if full else self.watermark
+        fetched: Dict[str, DBTJob] = {}
+        offset = 0
+        done = False
+
+        while not done:
+            page = self.dbt.list_jobs(offset=offset, limit=self.page_size)
+            for job in page.job_list:
+                if watermark is not None and job.updated_at <= watermark:
+                    done = True
+                    break
+                fetched.setdefault(str(job.id), job)
+
+            offset += len(page.job_list)
+            done = done or len(page.job_list) < self.page_size
+
+        if full:
+            self.jobs = {}
+
+        for job_id, job in fetched.items():
+            if job.state == ACTIVE_JOB_STATE:
+                self.jobs[job_id] = job
+            else:
+                self.jobs.pop(job_id, None)
+
+        updated = [job.updated_at for job in fetched.values() if job.updated_at]
+        self.watermark = max(updated + ([watermark] if watermark else []), default=None)
+
+        if logger is not None:
+            logger.info(
+                f"Job catalog refreshed, {len(fetched)} changed, "
+                f"{len(self.jobs)} jobs in environment {self.dbt.environment_id}."
+            )
+
+        self.build_index()
+        self.save()
+
+        return len(fetched)
+
+    def build_index(self, graph: Union[DBTModelGraph, None] = None):
+        """
+        Indexes the jobs, resolving selectors against `graph` or the graph
+        of an earlier call. A new graph is saved with the catalog.
+        """
+        if graph is not None:
+            self.graph = graph
+
+        self.selector_index = {}
+        self.model_index = {}
+
+        for job_id, job in self.jobs.items():
+            for step in [DBTStep.parse(s) for s in job.execute_steps or []]:
+                if not step.is_selecting:
+                    continue
+
+                for selector in step.selectors or ["*"]:
+                    self.selector_index.setdefault(selector, set()).add(job_id)
+
+                if not step.is_building:
+                    continue
+
+                if self.graph is not None:
+                    models = [self.graph.names[m] for m in resolve_step(self.graph, step)]
+                else:
+                    models = [
+                        plain_model(s) for s in step.selectors if plain_model(s)
+                    ]
+
+                for model in models:
+                    self.model_index.setdefault(model, set()).add(job_id)
+
+        if graph is not None:
+            self.save()
+
+    @property
+    def job_ids(self) -> List[str]:
+        return sorted(self.jobs)
+
+    def get_job(self, job_id: Union[int, str]) -> Union[DBTJob, None]:
+        return self.jobs.get(str(job_id))
+
+    def jobs_for_model(self, model: str) -> List[str]:
+        return sorted(self.model_index.get(model, set()))
+
+    def jobs_for_selector(self, selector: str) -> List[str]:
+        return sorted(self.selector_index.get(selector, set()))
@@ -0,0 +1,324 @@
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Generator, Hashable, Union
+
+import attr
+
+from lull_dagster_dbt.src.dbt_exceptions import DBTConcurrencyTimeoutException
+from lull_dagster_dbt.src.dbt_store import sqlite_transaction
+from lull_dagster_dbt.src.dbt_types import DBTRunStatus
+
+
+@attr.s(auto_attribs=True)
+class DBTLease:
+    """
+    A run slot held by `holder` until `expires_at` (epoch seconds) unless
+    renewed. `wait_sec` is how long the holder queued for the slot.
+    """
+
+    lease_id: str
+    holder: str
+    priority: int
+    acquired_at: float
+    expires_at: float
+    wait_sec: float
+
+
+@attr.s(auto_attribs=True)
+class DBTConcurrencyLimiter:
+    """
+    Limits how many DBT Cloud runs are in flight across every process that
+    shares the SQLite file at `path`. Slots are leases that expire after
+    `lease_ttl_sec` unless renewed, so a crashed holder frees its slot.
+
+    Waiters are served by priority (higher first), then in arrival order.
+    With `aging_sec` set, a waiter gains one priority class for every
+    `aging_sec` seconds it has waited, so low priority runs can't starve.
+    """
+
+    path: str
+    max_slots: int = 4
+    lease_ttl_sec: float = 300
+    poll_interval_sec: float = 5
+    aging_sec: Union[float, None] = 600
+
+    def __attrs_post_init__(self):
+        with sqlite_transaction(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "lease_id TEXT PRIMARY KEY, holder TEXT, priority INTEGER, "
+                "acquired_at REAL, expires_at REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS waiters ("
+                "ticket TEXT PRIMARY KEY, holder TEXT, priority INTEGER, "
+                "enqueued_at REAL, expires_at REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS lease_waits ("
+                "holder TEXT, priority INTEGER, wait_sec REAL, acquired_at REAL)"
+            )
+
+    def _purge_expired(self, conn, now: float):
+        conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+        conn.execute("DELETE FROM waiters WHERE expires_at <= ?", (now,))
+
+    def _queue_order(self, now: float) -> str:
+        if self.aging_sec is None:
+            return "priority DESC, enqueued_at, ticket"
+
+        return f"priority + ({now} - enqueued_at) / {float(self.aging_sec)} DESC, enqueued_at, ticket"
+
+    def try_acquire(self, ticket: str) -> Union[DBTLease, None]:
+        """
+        Grants a lease to the waiter `ticket` if a slot is free and it is
+        near enough to the head of the queue. Also keeps the waiter alive.
+        """
+        now = time.time()
+        with sqlite_transaction(self.path) as conn:
+            conn.execute(
+                "UPDATE waiters SET expires_at = ? WHERE ticket = ?",
+                (now + max(self.lease_ttl_sec, self.poll_interval_sec), ticket),
+            )
+            self._purge_expired(conn, now)
+            active = conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0]
+            free = self.max_slots - active
+            if free <= 0:
+                return None
+
+            head = conn.execute(
+                f"SELECT ticket FROM waiters ORDER BY {self._queue_order(now)} LIMIT ?",
+                (free,),
+            ).fetchall()
+            if ticket not in [row["ticket"] for row in head]:
+                return None
+
+            waiter = conn.execute(
+                "SELECT * FROM waiters WHERE ticket = ?", (ticket,)
+            ).fetchone()
+            lease = DBTLease(
+                lease_id=ticket,
+                holder=waiter["holder"],
+                priority=waiter["priority"],
+                acquired_at=now,
+                expires_at=now + self.lease_ttl_sec,
+                wait_sec=now - waiter["enqueued_at"],
+            )
+            conn.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+            conn.execute(
+                "INSERT INTO leases VALUES (?, ?, ?, ?, ?)",
+                (
+                    lease.lease_id,
+                    lease.holder,
+                    lease.priority,
+                    lease.acquired_at,
+                    lease.expires_at,
+                ),
+            )
+            conn.execute(
+                "INSERT INTO lease_waits VALUES (?, ?, ?, ?)",
+                (lease.holder, lease.priority, lease.wait_sec, now),
+            )
+
+        return lease
+
+    def acquire(
+        self,
+        holder: str,
+        priority: int = 0,
+        timeout_sec: Union[float, None] = None,
+        logger=None,
+    ) -> DBTLease:
+        """
+        Queues for a slot and blocks until it is granted. Raises
+        DBTConcurrencyTimeoutException after `timeout_sec` if given.
+        """
+        now = time.time()
+        ticket = self.enqueue(holder, priority)
+
+        try:
+            while True:
+                lease = self.try_acquire(ticket)
+                if lease is not None:
+                    if logger is not None:
+                        logger.info(
+                            f"Acquired run slot for {holder} after waiting "
+                            f"{lease.wait_sec:.1f} seconds."
+                        )
+                    return lease
+
+                if timeout_sec is not None and time.time() - now >= timeout_sec:
+                    raise DBTConcurrencyTimeoutException(
+                        f"{holder} could not get a run slot within {timeout_sec} seconds"
+                    )
+
+                if logger is not None:
+                    logger.info(
+                        f"Waiting on a run slot for {holder}, sleeping "
+                        f"{self.poll_interval_sec} seconds."
+                    )
+                time.sleep(self.poll_interval_sec)
+        finally:
+            self.dequeue(ticket)
+
+    def enqueue(self, holder: str, priority: int = 0) -> str:
+        """
+        Queues `holder` for a slot, returns the ticket to pass to
+        `try_acquire`. The waiter expires unless polled within `lease_ttl_sec`.
+        """
+        ticket = uuid.uuid4().hex
+        now = time.time()
+        with sqlite_transaction(self.path) as conn:
+            conn.execute(
+                "INSERT INTO waiters VALUES (?, ?, ?, ?, ?)",
+                (
+                    ticket,
+                    holder,
+                    priority,
+                    now,
+                    now + max(self.lease_ttl_sec, self.poll_interval_sec),
+                ),
+            )
+
+        return ticket
+
+    def dequeue(self, ticket: str):
+        with sqlite_transaction(self.path) as conn:
+            conn.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+
+    def renew(self, lease: DBTLease) -> DBTLease:
+        lease.expires_at = time.time() + self.lease_ttl_sec
+        with sqlite_transaction(self.path) as conn:
+            conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE lease_id = ?",
+                (lease.expires_at, lease.lease_id),
+            )
+
+        return lease
+
+    def release(self, lease: DBTLease):
+        with sqlite_transaction(self.path) as conn:
+            conn.execute("DELETE FROM leases WHERE lease_id = ?", (lease.lease_id,))
+
+    @contextmanager
+    def lease(
+        self, holder: str, priority: int = 0, logger=None
+    ) -> Generator[DBTLease, None, None]:
+        lease = self.acquire(holder, priority, logger=logger)
+        try:
+            yield lease
+        finally:
+            self.release(lease)
+
+    def active_leases(self) -> int:
+        with sqlite_transaction(self.path) as conn:
+            self._purge_expired(conn, time.time())
+            return conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0]
+
+    def wait_stats(self, since: float = 0) -> Dict[int, Dict[str, float]]:
+        """
+        Queue wait metrics per priority class for leases acquired since
+        `since` (epoch seconds): count, mean, p95 and max wait in seconds.
+        """
+        with sqlite_transaction(self.path) as conn:
+            rows = conn.execute(
+                "SELECT priority, wait_sec FROM lease_waits "
+                "WHERE acquired_at >= ? ORDER BY priority, wait_sec",
+                (since,),
+            ).fetchall()
+
+        waits: Dict[int, list] = {}
+        for row in rows:
+            waits.setdefault(row["priority"], []).append(row["wait_sec"])
+
+        return {
+            priority: {
+                "count": len(values),
+                "mean_wait_sec": sum(values) / len(values),
+                "p95_wait_sec": values[min(int(len(values) * 0.95), len(values) - 1)],
+                "max_wait_sec": values[-1],
+            }
+            for priority, values in waits.items()
+        }
+
+
+@attr.s(auto_attribs=True)
+class DBTRunLeases:
+    """
+    The run slots of a loop that keeps several runs in flight, E.g.
+    DBTJobScheduler or DBTBackfill, keyed by the loop's own run keys.
+    `try_lease` never blocks, so the loop keeps polling the runs it holds
+    slots for while it waits on the next one. The loop queues for one slot
+    at a time, whichever key asks next takes its place in the queue.
+    Without a `limiter` every lease is granted.
+    """
+
+    limiter: Union[DBTConcurrencyLimiter, None]
+    priority: int = 0
+    leases: Dict[Hashable, DBTLease] = attr.ib(factory=dict)
+    ticket: Union[str, None] = None
+
+    @property
+    def waiting(self) -> bool:
+        return self.ticket is not None
+
+    def try_lease(self, key: Hashable, holder: str, logger=None) -> bool:
+        """
+        Takes a slot for `key` if one is free, otherwise queues for it and
+        returns False. Call again on every poll to keep the place.
+        """
+        if self.limiter is None or key in self.leases:
+            return True
+
+        if self.ticket is None:
+            self.ticket = self.limiter.enqueue(holder, self.priority)
+
+        lease = self.limiter.try_acquire(self.ticket)
+        if lease is None:
+            return False
+
+        self.ticket = None
+        self.leases[key] = lease
+        if logger is not None:
+            logger.info(
+                f"Acquired run slot for {holder} after waiting "
+                f"{lease.wait_sec:.1f} seconds."
+            )
+
+        return True
+
+    def renew(self):
+        for lease in self.leases.values():
+            self.limiter.renew(lease)
+
+    def release(self, key: Hashable):
+        if key in self.leases:
+            self.limiter.release(self.leases.pop(key))
+
+    def cancel_in_flight(self, dbt, running: Dict[Hashable, DBTRunStatus], logger=None):
+        """
+        Cancels the runs a loop leaves in flight when it stops on an error,
+        so their slots can be released. A run that can't be cancelled keeps
+        its lease until it expires, the limiter then still counts it.
+        """
+        for key, run_status in running.items():
+            if logger is not None:
+                logger.warning(f"Cancelling run {run_status.run_id} of {key} left in flight.")
+            try:
+                dbt.cancel_run(run_status.run_id)
+            except Exception as error:
+                if logger is not None:
+                    logger.warning(
+                        f"Could not cancel run {run_status.run_id}, its run slot "
+                        f"is held until the lease expires: {error}"
+                    )
+                self.leases.pop(key, None)
+
+    def release_all(self):
+        for key in list(self.leases):
+            self.release(key)
+
+        if self.ticket is not None:
+            self.limiter.dequeue(self.ticket)
+            self.ticket = None
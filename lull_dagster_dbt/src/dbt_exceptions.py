@@ -8,3 +8,31 @@ class DBTNoJobIdException(Exception):
 
 class DBTNoRunIdException(Exception):
     pass
+
+
+class DBTCyclicDependencyException(Exception):
+    pass
+
+
+class DBTScheduleFailedException(Exception):
+    pass
+
+
+class DBTConcurrencyTimeoutException(Exception):
+    pass
+
+
+class DBTNoSuccessfulRunException(Exception):
+    pass
+
+
+class DBTNoClientException(Exception):
+    pass
+
+
+class DBTRunStalledException(Exception):
+    pass
+
+
+class DBTBackfillFailedException(Exception):
+    pass
@@ -0,0 +1,139 @@
+from typing import Dict, List
+
+import attr
+
+
+@attr.s(auto_attribs=True)
+class DBTModelGraph:
+    """
+    The model DAG from a dbt manifest.json, keyed by node unique_id
+    (E.g. "model.my_project.orders"). `parents` only holds models.
+    """
+
+    parents: Dict[str, List[str]]
+    names: Dict[str, str] = attr.ib(factory=dict)
+    tags: Dict[str, List[str]] = attr.ib(factory=dict)
+
+    @classmethod
+    def from_manifest(cls, manifest: Dict) -> "DBTModelGraph":
+        models = {
+            uid: node
+            for uid, node in manifest["nodes"].items()
+            if node.get("resource_type") == "model"
+        }
+
+        return cls(
+            parents={
+                uid: [
+                    p
+                    for p in node.get("depends_on", {}).get("nodes", [])
+                    if p in models
+                ]
+                for uid, node in models.items()
+            },
+            names={uid: node["name"] for uid, node in models.items()},
+            tags={uid: list(node.get("tags", [])) for uid, node in models.items()},
+        )
+
+    @property
+    def models(self) -> List[str]:
+        return list(self.parents)
+
+    def children(self, uid: str) -> List[str]:
+        return [m for m, parents in self.parents.items() if uid in parents]
+
+    def ancestors(self, uid: str) -> List[str]:
+        return self._walk(uid, lambda m: self.parents[m])
+
+    def descendants(self, uid: str) -> List[str]:
+        children: Dict[str, List[str]] = {m: [] for m in self.parents}
+        for model, parents in self.parents.items():
+            for parent in parents:
+                children[parent].append(model)
+
+        return self._walk(uid, lambda m: children[m])
+
+    def _walk(self, uid: str, neighbours) -> List[str]:
+        found = []
+        stack = list(neighbours(uid))
+        while stack:
+            model = stack.pop()
+            if model not in found:
+                found.append(model)
+                stack.extend(neighbours(model))
+
+        return found
+
+    def subgraph(self, models: List[str]) -> "DBTModelGraph":
+        """
+        Restricts the graph to `models`, keeping an edge to the nearest
+        kept ancestors through any model that was dropped.
+        """
+        keep = set(models) & set(self.parents)
+        parents = {}
+        for model in keep:
+            nearest = []
+            stack = list(self.parents[model])
+            seen = set()
+            while stack:
+                parent = stack.pop()
+                if parent in seen:
+                    continue
+                seen.add(parent)
+                if parent in keep:
+                    nearest.append(parent)
+                else:
+                    stack.extend(self.parents[parent])
+            parents[model] = sorted(nearest)
+
+        return DBTModelGraph(
+            parents=parents,
+            names={m: self.names.get(m, m) for m in keep},
+            tags={m: self.tags.get(m, []) for m in keep},
+        )
+
+    def components(self) -> List[List[str]]:
+        """
+        The weakly connected components, models with no path between
+        components can be built by independent runs.
+        """
+        neighbours: Dict[str, set] = {m: set(p) for m, p in self.parents.items()}
+        for model, parents in self.parents.items():
+            for parent in parents:
+                neighbours[parent].add(model)
+
+        components = []
+        seen = set()
+        for model in sorted(self.parents):
+            if model in seen:
+                continue
+            component = []
+            stack = [model]
+            while stack:
+                node = stack.pop()
+                if node in seen:
+                    continue
+                seen.add(node)
+                component.append(node)
+                stack.extend(neighbours[node])
+            components.append(sorted(component))
+
+        return components
+
+    def levels(self) -> Dict[str, int]:
+        """
+        The length of the longest chain of parents above each model.
+        """
+        levels: Dict[str, int] = {}
+
+        def level(model):
+            if model not in levels:
+                levels[model] = 1 + max(
+                    (level(p) for p in self.parents[model]), default=-1
+                )
+            return levels[model]
+
+        for model in self.parents:
+            level(model)
+
+        return levels
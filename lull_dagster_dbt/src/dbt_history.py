@@ -0,0 +1,212 @@
+import json
+import time
+from typing import Dict, List, Union
+
+import attr
+
+from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_store import sqlite_transaction
+from lull_dagster_dbt.src.dbt_types import (
+    DBTRunStatus,
+    DBTRunStatusList,
+    duration_to_seconds,
+)
+
+# Queued, Starting, Running: the status of these runs can still change
+UNFINISHED_STATUSES = (1, 2, 3)
+# Stored runs were fetched successfully, the request status isn't kept
+REQUEST_STATUS_OK = {
+    "code": 200,
+    "is_success": True,
+    "user_message": "Success!",
+    "developer_message": "",
+}
+
+
+@attr.s(auto_attribs=True)
+class DBTRunHistory:
+    """
+    A mirror of the environment's DBT Cloud runs in the SQLite file at
+    `path`, so reports and validations read run history locally instead
+    of from the API, without `get_job_runs`'s `limit`.
+
+    Each run is stored as its normalized DBTRunStatus fields, indexed by
+    job, status and finished time, plus the raw run JSON to rebuild the
+    DBTRunStatus from. `sync` pages through the runs newest first and stops
+    once it reaches the highest run id already stored, or the oldest
+    stored run that hadn't finished yet, so those are refreshed too.
+
+    The start of the last sync is stored with the runs, readers should
+    only trust the mirror while `is_fresh`, within `max_age_sec` of it.
+    """
+
+    path: str
+    page_size: int = 100
+    max_age_sec: float = 900
+
+    def __attrs_post_init__(self):
+        with sqlite_transaction(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "run_id INTEGER PRIMARY KEY, job_id TEXT, status INTEGER, "
+                "status_humanized TEXT, cause TEXT, git_sha TEXT, "
+                "created_at TEXT, started_at TEXT, finished_at TEXT, "
+                "queued_duration_sec REAL, run_duration_sec REAL, raw TEXT)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS runs_job ON runs (job_id, run_id)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS runs_status ON runs (status, run_id)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS runs_finished ON runs (finished_at)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), synced_at REAL)"
+            )
+
+    def last_synced_at(self) -> Union[float, None]:
+        """
+        When the last complete sync started (epoch seconds), None if never.
+        """
+        with sqlite_transaction(self.path) as conn:
+            row = conn.execute("SELECT synced_at FROM sync_state").fetchone()
+
+        return row["synced_at"] if row is not None else None
+
+    def is_fresh(self) -> bool:
+        synced_at = self.last_synced_at()
+        return synced_at is not None and time.time() - synced_at <= self.max_age_sec
+
+    def sync_from(self) -> Union[int, None]:
+        """
+        The run id the next sync pages back to, None for a first sync.
+        """
+        with sqlite_transaction(self.path) as conn:
+            row = conn.execute(
+                "SELECT MAX(run_id) AS last_id, "
+                "(SELECT MIN(run_id) FROM runs WHERE status IN (?, ?, ?)) "
+                "AS unfinished_id FROM runs",
+                UNFINISHED_STATUSES,
+            ).fetchone()
+
+        if row["unfinished_id"] is not None:
+            return row["unfinished_id"] - 1
+
+        return row["last_id"]
+
+    def sync(self, dbt: DBTApi, logger=None) -> int:
+        """
+        Fetches runs created since the last sync and runs that hadn't
+        finished at the last sync. Returns the number of runs stored.
+        """
+        # Runs created while paging may be missed, so the sync counts from its start
+        started_at = time.time()
+        sync_from = self.sync_from()
+        fetched: Dict[int, Dict] = {}
+        offset = 0
+        done = False
+
+        while not done:
+            page = dbt.list_runs(offset=offset, limit=self.page_size, return_type=None)
+            for run in page["data"]:
+                if sync_from is not None and run["id"] <= sync_from:
+                    done = True
+                    break
+                # Runs created while paging shift the offsets, keep the first copy
+                fetched.setdefault(run["id"], run)
+
+            offset += len(page["data"])
+            done = done or len(page["data"]) < self.page_size
+
+        self.store(fetched.values())
+        with sqlite_transaction(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (0, ?)", (started_at,)
+            )
+
+        if logger is not None:
+            logger.info(
+                f"Run history synced, {len(fetched)} runs fetched, "
+                f"last run id {self.sync_from()}."
+            )
+
+        return len(fetched)
+
+    def store(self, runs):
+        rows = []
+        for run in runs:
+            status = DBTRunStatus.from_dict({"data": run, "status": REQUEST_STATUS_OK})
+            rows.append(
+                (
+                    status.run_id,
+                    str(status.job_definition_id),
+                    status.status,
+                    status.status_humanized,
+                    status.cause,
+                    status.git_sha,
+                    status.created_at,
+                    status.started_at,
+                    status.finished_at,
+                    duration_to_seconds(status.queued_duration),
+                    duration_to_seconds(status.run_duration),
+                    json.dumps(run),
+                )
+            )
+
+        with sqlite_transaction(self.path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO runs VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def runs(
+        self,
+        job_id: Union[int, str, None] = None,
+        statuses: Union[List[int], None] = None,
+        finished_after: Union[str, None] = None,
+        limit: Union[int, None] = None,
+    ) -> List[DBTRunStatus]:
+        """
+        Stored runs, newest first. `finished_after` compares against
+        DBT Cloud's "%Y-%m-%d %H:%M:%S" timestamps.
+        """
+        where, params = [], []
+        if job_id is not None:
+            where.append("job_id = ?")
+            params.append(str(job_id))
+        if statuses:
+            where.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+        if finished_after is not None:
+            where.append("finished_at > ?")
+            params.append(finished_after)
+
+        query = "SELECT raw FROM runs"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY run_id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with sqlite_transaction(self.path) as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        return [
+            DBTRunStatus.from_dict(
+                {"data": json.loads(row["raw"]), "status": REQUEST_STATUS_OK}
+            )
+            for row in rows
+        ]
+
+    def get_job_runs(
+        self, job_id: int = None, limit: int = 2
+    ) -> DBTRunStatusList:
+        """
+        The same as DBTApi.get_job_runs, read from the mirror.
+        """
+        return DBTRunStatusList(run_list=self.runs(job_id=job_id, limit=limit))
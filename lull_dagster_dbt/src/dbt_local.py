@@ -0,0 +1,362 @@
+import itertools
+import os
+import shlex
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Union
+
+import attr
+
+from lull_dagster_dbt.src.dbt_api import DBTApi, DBTRunWaiter
+from lull_dagster_dbt.src.dbt_concurrency import DBTConcurrencyLimiter
+from lull_dagster_dbt.src.dbt_exceptions import DBTNoJobIdException, DBTNoRunIdException
+from lull_dagster_dbt.src.dbt_types import (
+    DBTJob,
+    DBTRunStatus,
+    DBTRunStatusList,
+    seconds_to_duration,
+)
+
+# Same codes as DBT Cloud, see DBTRunStatus.RUN_STATUS_REMAPPED
+QUEUED, RUNNING, SUCCESS, ERROR, CANCELLED = 1, 3, 10, 20, 30
+STATUS_HUMANIZED = {
+    QUEUED: "Queued",
+    RUNNING: "Running",
+    SUCCESS: "Success",
+    ERROR: "Error",
+    CANCELLED: "Cancelled",
+}
+
+
+def timestamp(epoch: Union[float, None]) -> Union[str, None]:
+    if epoch is None:
+        return None
+
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime(
+        "%Y-%m-%d %H:%M:%S.%f%z"
+    )
+
+
+@attr.s(auto_attribs=True)
+class DBTLocalJob:
+    """
+    A job run by dbt Core in a local subprocess instead of DBT Cloud.
+    """
+
+    project_dir: str
+    execute_steps: List[str]
+    name: Union[str, None] = None
+    profiles_dir: Union[str, None] = None
+    target: Union[str, None] = None
+    threads: Union[int, None] = None
+    env: Dict[str, str] = attr.ib(factory=dict)
+
+
+@attr.s(auto_attribs=True)
+class DBTLocalRun:
+    run_id: int
+    job_id: str
+    cause: str
+    steps: List[str]
+    status: int = QUEUED
+    status_message: Union[str, None] = None
+    created_at: float = attr.ib(factory=time.time)
+    started_at: Union[float, None] = None
+    finished_at: Union[float, None] = None
+    last_output_at: Union[float, None] = None
+    output: List[str] = attr.ib(factory=list)
+    process: Union[subprocess.Popen, None] = None
+    cancelled: bool = False
+
+
+@attr.s(auto_attribs=True)
+class DBTLocalApi(DBTRunWaiter):
+    """
+    Runs jobs with dbt Core in a pool of at most `max_workers` local
+    subprocesses, behind the same create_run/get_run/cancel_run/
+    trigger_and_wait interface as DBTApi, returning DBTRunStatus objects.
+
+    Run ids are negative so they never collide with DBT Cloud run ids.
+    Each line of output is kept on the run and appended to
+    `<log_dir>/<run_id>.log` when `log_dir` is set. The run's
+    `last_heartbeat_at` moves while its dbt process is alive, as dbt prints
+    nothing while a long model builds, so the stall detector only catches
+    runs whose process is gone without the run finishing.
+    """
+
+    jobs: Dict[str, DBTLocalJob]
+    max_workers: int = 2
+    dbt_executable: str = "dbt"
+    log_dir: Union[str, None] = None
+    poll_interval_sec: float = 5
+    concurrency_limiter: Union[DBTConcurrencyLimiter, None] = None
+    logger: object = None
+    runs: Dict[int, DBTLocalRun] = attr.ib(init=False, factory=dict)
+    run_ids: itertools.count = attr.ib(init=False, factory=lambda: itertools.count(-1, -1))
+    lock: threading.Lock = attr.ib(init=False, factory=threading.Lock)
+    executor: ThreadPoolExecutor = attr.ib(init=False)
+
+    def __attrs_post_init__(self):
+        self.jobs = {str(job_id): job for job_id, job in self.jobs.items()}
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="dbt-local"
+        )
+
+    def has_job(self, job_id: Union[int, str, None]) -> bool:
+        return str(job_id) in self.jobs
+
+    def job_data(self, job_id: str, steps: Union[List[str], None] = None) -> Dict:
+        """
+        The job as DBT Cloud returns it, so it parses into a DBTJob.
+        """
+        job = self.jobs[str(job_id)]
+        return {
+            "id": job_id,
+            "account_id": None,
+            "project_id": None,
+            "environment_id": None,
+            "name": job.name or str(job_id),
+            "dbt_version": None,
+            "execute_steps": steps or job.execute_steps,
+            "settings": {"threads": job.threads, "target_name": job.target},
+            "state": 1,
+            "generate_docs": False,
+            "schedule": {"cron": None, "date": None, "time": None},
+            "updated_at": None,
+        }
+
+    def get_job(self, job_id: str) -> DBTJob:
+        if job_id is None or not self.has_job(job_id):
+            raise DBTNoJobIdException(f"No local job with ID {job_id}")
+
+        return DBTJob.from_dict({"data": self.job_data(job_id)})
+
+    def command(self, job: DBTLocalJob, step: str) -> List[str]:
+        words = shlex.split(step)
+        if words and words[0] == "dbt":
+            words = words[1:]
+
+        if job.profiles_dir is not None:
+            words += ["--profiles-dir", job.profiles_dir]
+        if job.target is not None:
+            words += ["--target", job.target]
+
+        return [self.dbt_executable] + words
+
+    def create_run(
+        self,
+        job_id: str,
+        cause: str = "Triggered by Dagster",
+        steps_override: Union[List[str], None] = None,
+    ) -> DBTRunStatus:
+        if job_id is None or not self.has_job(job_id):
+            raise DBTNoJobIdException(f"No local job with ID {job_id}")
+
+        job = self.jobs[str(job_id)]
+        with self.lock:
+            run = DBTLocalRun(
+                run_id=next(self.run_ids),
+                job_id=str(job_id),
+                cause=cause,
+                steps=steps_override or job.execute_steps,
+            )
+            self.runs[run.run_id] = run
+
+        self.executor.submit(self.execute, run, job)
+
+        return self.status(run)
+
+    def execute(self, run: DBTLocalRun, job: DBTLocalJob):
+        run.status = RUNNING
+        run.started_at = run.last_output_at = time.time()
+        log_file = None
+
+        # Runs in an executor thread, an error escaping here would leave the
+        # run Running until its caller times out
+        try:
+            if self.log_dir is not None:
+                log_file = open(
+                    os.path.join(self.log_dir, f"{abs(run.run_id)}.log"), "a"
+                )
+
+            for step in run.steps:
+                if run.cancelled:
+                    break
+
+                self.output(run, f"Running: {step}", log_file)
+                with self.lock:
+                    if run.cancelled:
+                        break
+                    run.process = subprocess.Popen(
+                        self.command(job, step),
+                        cwd=job.project_dir,
+                        env={**os.environ, **job.env},
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.STDOUT,
+                        text=True,
+                    )
+
+                for line in run.process.stdout:
+                    self.output(run, line.rstrip("\n"), log_file)
+
+                if run.process.wait() != 0 and not run.cancelled:
+                    run.status = ERROR
+                    run.status_message = (
+                        f"{step} exited with code {run.process.returncode}"
+                    )
+                    break
+            else:
+                run.status = SUCCESS
+        except Exception as error:  # pylint: disable=broad-except
+            run.status = ERROR
+            run.status_message = f"{type(error).__name__}: {error}"
+        finally:
+            if run.cancelled:
+                run.status = CANCELLED
+            run.finished_at = time.time()
+            if log_file is not None:
+                log_file.close()
+
+    def output(self, run: DBTLocalRun, line: str, log_file=None):
+        run.output.append(line)
+        run.last_output_at = time.time()
+
+        if log_file is not None:
+            log_file.write(line + "\n")
+            log_file.flush()
+        if self.logger is not None:
+            self.logger.info(f"[run {run.run_id}] {line}")
+
+    def heartbeat(self, run: DBTLocalRun, now: float) -> Union[float, None]:
+        process = run.process
+        if run.finished_at is None and process is not None and process.poll() is None:
+            return now
+
+        return run.last_output_at
+
+    def status(self, run: DBTLocalRun) -> DBTRunStatus:
+        now = time.time()
+        end = run.finished_at or now
+        queued = (run.started_at or end) - run.created_at
+        running = end - run.started_at if run.started_at is not None else 0
+
+        return DBTRunStatus.from_dict(
+            {
+                "data": {
+                    "id": run.run_id,
+                    "trigger_id": None,
+                    "account_id": None,
+                    "project_id": None,
+                    "job_definition_id": run.job_id,
+                    "status": run.status,
+                    "git_branch": None,
+                    "git_sha": None,
+                    "status_message": run.status_message,
+                    "dbt_version": None,
+                    "created_at": timestamp(run.created_at),
+                    "updated_at": timestamp(now),
+                    "dequeued_at": timestamp(run.started_at),
+                    "started_at": timestamp(run.started_at),
+                    "finished_at": timestamp(run.finished_at),
+                    "last_checked_at": timestamp(now),
+                    "last_heartbeat_at": timestamp(self.heartbeat(run, now)),
+                    "owner_thread_id": None,
+                    "executed_by_thread_id": None,
+                    "artifacts_saved": False,
+                    "artifact_s3_path": None,
+                    "has_docs_generated": False,
+                    "job": self.job_data(run.job_id, run.steps),
+                    "trigger": {"cause": run.cause},
+                    "duration": seconds_to_duration(end - run.created_at),
+                    "queued_duration": seconds_to_duration(queued),
+                    "run_duration": seconds_to_duration(running),
+                    "duration_humanized": f"{end - run.created_at:.0f} seconds",
+                    "queued_duration_humanized": f"{queued:.0f} seconds",
+                    "run_duration_humanized": f"{running:.0f} seconds",
+                    "status_humanized": STATUS_HUMANIZED[run.status],
+                    "created_at_humanized": timestamp(run.created_at),
+                },
+                "status": {
+                    "code": 200,
+                    "is_success": True,
+                    "user_message": "Success!",
+                    "developer_message": "",
+                },
+            }
+        )
+
+    def get_run(self, run_id: int = None) -> DBTRunStatus:
+        if run_id is None or run_id not in self.runs:
+            raise DBTNoRunIdException(f"No local run with ID {run_id}")
+
+        return self.status(self.runs[run_id])
+
+    def cancel_run(self, run_id: int = None) -> DBTRunStatus:
+        if run_id is None or run_id not in self.runs:
+            raise DBTNoRunIdException(f"No local run with ID {run_id}")
+
+        run = self.runs[run_id]
+        with self.lock:
+            run.cancelled = True
+            if run.process is not None and run.process.poll() is None:
+                run.process.terminate()
+            if run.status == QUEUED:
+                run.status = CANCELLED
+                run.finished_at = time.time()
+
+        return self.status(run)
+
+    def get_job_runs(self, job_id: int = None, limit: int = 2) -> DBTRunStatusList:
+        if job_id is None:
+            raise DBTNoJobIdException("No Job ID provided")
+
+        runs = sorted(
+            (r for r in self.runs.values() if r.job_id == str(job_id)),
+            key=lambda r: -abs(r.run_id),
+        )
+        return DBTRunStatusList(run_list=[self.status(r) for r in runs[:limit]])
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+
+@attr.s(auto_attribs=True)
+class DBTBackendRouter:
+    """
+    Sends each job to the local backend when it is configured there and to
+    DBT Cloud otherwise. Local runs have negative ids, so run lookups are
+    routed by id. Everything else is answered by the cloud client.
+    """
+
+    cloud: DBTApi
+    local: DBTLocalApi
+
+    def backend(self, job_id: Union[int, str, None]) -> Union[DBTApi, DBTLocalApi]:
+        return self.local if self.local.has_job(job_id) else self.cloud
+
+    def run_backend(self, run_id: Union[int, None]) -> Union[DBTApi, DBTLocalApi]:
+        return self.local if run_id is not None and int(run_id) < 0 else self.cloud
+
+    def get_job(self, job_id: str) -> DBTJob:
+        return self.backend(job_id).get_job(job_id)
+
+    def get_job_runs(self, job_id: int = None, limit: int = 2) -> DBTRunStatusList:
+        return self.backend(job_id).get_job_runs(job_id, limit)
+
+    def create_run(self, job_id: str, *args, **kwargs) -> DBTRunStatus:
+        return self.backend(job_id).create_run(job_id, *args, **kwargs)
+
+    def get_run(self, run_id: int = None) -> DBTRunStatus:
+        return self.run_backend(run_id).get_run(run_id)
+
+    def cancel_run(self, run_id: int = None) -> DBTRunStatus:
+        return self.run_backend(run_id).cancel_run(run_id)
+
+    def trigger_and_wait(self, job_id: str, *args, **kwargs):
+        return self.backend(job_id).trigger_and_wait(job_id, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.cloud, name)
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import re
+from typing import Callable, Dict, Generator, List, Union
+
+from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_types import DBTRunStatus
+
+# The memo key is stored in the run's cause, so any process can read it back
+# from the run history without a local store.
+MEMO_TAG = re.compile(r"\[memo:(?P<key>[0-9a-f]+)\]")
+
+# Returns None when source freshness is unknown
+FreshnessProbe = Callable[[], Union[Dict[str, str], None]]
+
+
+def memo_key(
+    job_id: Union[int, str],
+    steps_override: Union[List[str], None],
+    git_sha: str,
+    freshness: Dict[str, str],
+) -> str:
+    """
+    A short hash of everything that decides what a run would build.
+    """
+    payload = json.dumps(
+        [str(job_id), steps_override or [], git_sha, freshness], sort_keys=True
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def memo_cause(cause: str, key: str) -> str:
+    return f"{MEMO_TAG.sub('', cause).strip()} [memo:{key}]"
+
+
+def find_memoized_run(
+    dbt: DBTApi,
+    job_id: Union[int, str],
+    key: str,
+    git_sha: str,
+    limit: int = 10,
+) -> Union[DBTRunStatus, None]:
+    """
+    The job's last successful run if it was triggered with `key` from the
+    same `git_sha`, otherwise None.
+    """
+    last_run = dbt.get_job_runs(job_id, limit=limit).get_last_successful_run()
+    if last_run is None or last_run.cause is None or last_run.git_sha != git_sha:
+        return None
+
+    match = MEMO_TAG.search(last_run.cause)
+    if match is None or match.group("key") != key:
+        return None
+
+    return last_run
+
+
+def artifact_freshness_probe(
+    dbt: DBTApi,
+    freshness_job_id: Union[int, str],
+    job_id: Union[int, str],
+    limit: int = 10,
+) -> FreshnessProbe:
+    """
+    A probe reading `max_loaded_at` per source from the sources.json saved
+    by the newest finished run of a `dbt source freshness` job. Its status
+    doesn't matter, the command errors whenever a source is past
+    `error_after` and still saves sources.json. Freshness is unknown when
+    that run is older than `job_id`'s last successful run, as data loaded
+    since that run can't be seen.
+    """
+
+    def probe() -> Union[Dict[str, str], None]:
+        import requests
+
+        freshness_run, sources = None, None
+        for run in dbt.get_job_runs(freshness_job_id, limit=limit).run_list:
+            if run.is_running:
+                continue
+            try:
+                sources = dbt.get_run_artifact(run.run_id, "sources.json")
+            except requests.HTTPError:
+                # E.g. the run was cancelled before dbt started
+                continue
+            freshness_run = run
+            break
+
+        if freshness_run is None:
+            return None
+
+        # Run ids only grow, a lower id was triggered earlier
+        last_run = dbt.get_job_runs(job_id, limit=limit).get_last_successful_run()
+        if last_run is not None and freshness_run.run_id < last_run.run_id:
+            return None
+
+        return {
+            result["unique_id"]: result.get("max_loaded_at")
+            for result in sources.get("results", [])
+        }
+
+    return probe
+
+
+def memoized_trigger_and_wait(
+    dbt: DBTApi,
+    job_id: Union[int, str],
+    cause: str = "Triggered by Dagster",
+    steps_override: list = None,
+    time_limit_sec: int = 600,
+    terminate_timed_out_run: bool = True,
+    git_sha: Union[str, None] = None,
+    freshness_probe: Union[FreshnessProbe, None] = None,
+    logger=None,
+    **kwargs,
+) -> Generator[DBTRunStatus, None, None]:
+    """
+    GENERATOR Method: Like `DBTApi.trigger_and_wait`, but skips the run
+    when the job's last successful run was triggered with the same steps,
+    git sha and source freshness, yielding that run's status instead.
+    Without a `git_sha` or known source freshness nothing is skipped, as
+    code or data changes can't be seen.
+    """
+    freshness = freshness_probe() if freshness_probe is not None else None
+
+    if git_sha is None:
+        if logger is not None:
+            logger.warning("No git sha given, memoization is disabled for this run.")
+    elif freshness is None:
+        if logger is not None:
+            logger.warning(
+                "Source freshness is unknown, memoization is disabled for this run."
+            )
+    else:
+        key = memo_key(job_id, steps_override, git_sha, freshness)
+        cached_run = find_memoized_run(dbt, job_id, key, git_sha)
+
+        if cached_run is not None:
+            if logger is not None:
+                logger.info(
+                    f"Nothing changed since run {cached_run.run_id} "
+                    f"(memo {key}), skipping job {job_id}."
+                )
+            yield cached_run
+            return
+
+        cause = memo_cause(cause, key)
+
+    yield from dbt.trigger_and_wait(
+        job_id,
+        cause,
+        steps_override,
+        time_limit_sec,
+        terminate_timed_out_run=terminate_timed_out_run,
+        logger=logger,
+        **kwargs,
+    )
@@ -0,0 +1,227 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Union
+
+import attr
+
+from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_exceptions import DBTNoClientException
+from lull_dagster_dbt.src.dbt_types import DBTRunStatus
+
+
+@attr.s(auto_attribs=True)
+class DBTTokenHealth:
+    """
+    Request and error counts for one token, plus how much of its
+    per-minute request budget is left and whether it is throttled.
+    """
+
+    requests_per_minute: int
+    sent_at: Deque[float] = attr.ib(factory=deque)
+    requests: int = 0
+    errors: int = 0
+    throttled: int = 0
+    throttled_until: float = 0.0
+
+    def remaining_budget(self, now: float) -> int:
+        while self.sent_at and self.sent_at[0] <= now - 60:
+            self.sent_at.popleft()
+
+        return self.requests_per_minute - len(self.sent_at)
+
+    def is_throttled(self, now: float) -> bool:
+        return now < self.throttled_until
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+
+@attr.s(auto_attribs=True)
+class DBTClientPool:
+    """
+    Holds several DBTApi clients, possibly for several accounts and
+    environments, and routes each request to one of them:
+
+    - reads (GET) go to the client for the account with the most request
+      budget left, skipping throttled tokens,
+    - writes go to the first healthy client configured for the account, so
+      runs are created and cancelled with a predictable token.
+
+    A 429 marks the token throttled for its Retry-After and the request
+    moves on to the next token. Reads also move on after a 5xx or a
+    connection error or timeout, writes don't, as the run may have been
+    created.
+    """
+
+    clients: List[DBTApi]
+    requests_per_minute: int = 60
+    throttle_sec: float = 60
+    health: Dict[int, DBTTokenHealth] = attr.ib(init=False)
+    lock: threading.Lock = attr.ib(init=False, factory=threading.Lock)
+
+    def __attrs_post_init__(self):
+        self.health = {
+            id(client): DBTTokenHealth(self.requests_per_minute)
+            for client in self.clients
+        }
+
+    def candidates(
+        self,
+        account_id: Union[int, str, None] = None,
+        environment_id: Union[int, str, None] = None,
+        read: bool = True,
+    ) -> List[DBTApi]:
+        """
+        The clients able to serve the account/environment, best first.
+        """
+        clients = [
+            client
+            for client in self.clients
+            if (account_id is None or str(client.account_id) == str(account_id))
+            and (
+                environment_id is None
+                or str(client.environment_id) == str(environment_id)
+            )
+        ]
+        if not clients:
+            raise DBTNoClientException(
+                f"No client for account {account_id}, environment {environment_id}"
+            )
+
+        now = time.time()
+        with self.lock:
+            if read:
+                return sorted(
+                    clients,
+                    key=lambda c: (
+                        self.health[id(c)].is_throttled(now),
+                        -self.health[id(c)].remaining_budget(now),
+                        self.health[id(c)].error_rate,
+                    ),
+                )
+
+            return sorted(clients, key=lambda c: self.health[id(c)].is_throttled(now))
+
+    def route(
+        self,
+        account_id: Union[int, str, None] = None,
+        environment_id: Union[int, str, None] = None,
+        read: bool = True,
+    ) -> DBTApi:
+        return self.candidates(account_id, environment_id, read)[0]
+
+    def request(
+        self,
+        account_id: Union[int, str, None] = None,
+        environment_id: Union[int, str, None] = None,
+        method: str = "get",
+        url: str = "/jobs",
+        json: Union[Dict, None] = None,
+        params: dict = None,
+        return_type=DBTRunStatus,
+    ):
+        import requests
+
+        read = method.lower() == "get"
+        clients = self.candidates(account_id, environment_id, read)
+
+        for index, client in enumerate(clients):
+            health = self.health[id(client)]
+            with self.lock:
+                health.requests += 1
+                health.sent_at.append(time.time())
+
+            try:
+                return client.request(method, url, json, params, return_type)
+            except requests.HTTPError as error:
+                status_code = error.response.status_code if error.response is not None else None
+                is_last = index == len(clients) - 1
+
+                with self.lock:
+                    health.errors += 1
+                    if status_code == 429:
+                        health.throttled += 1
+                        retry_after = error.response.headers.get("Retry-After")
+                        health.throttled_until = time.time() + (
+                            float(retry_after) if retry_after else self.throttle_sec
+                        )
+
+                retry_elsewhere = status_code == 429 or (
+                    read and status_code is not None and status_code >= 500
+                )
+                if is_last or not retry_elsewhere:
+                    raise
+            except requests.RequestException:
+                with self.lock:
+                    health.errors += 1
+
+                if index == len(clients) - 1 or not read:
+                    raise
+
+    def api(
+        self,
+        account_id: Union[int, str, None] = None,
+        environment_id: Union[int, str, None] = None,
+    ) -> "DBTPooledApi":
+        """
+        A DBTApi for one account/environment whose requests go through the
+        pool. Without ids this is the first configured client's account.
+        """
+        primary = self.route(account_id, environment_id, read=False)
+
+        return DBTPooledApi(
+            access_token=primary.access_token,
+            environment_id=primary.environment_id,
+            account_id=primary.account_id,
+            project_id=primary.project_id,
+            concurrency_limiter=primary.concurrency_limiter,
+            run_history=primary.run_history,
+            pool=self,
+        )
+
+    def health_report(self) -> List[Dict]:
+        now = time.time()
+        with self.lock:
+            return [
+                {
+                    "token": f"...{client.access_token[-4:]}",
+                    "account_id": client.account_id,
+                    "environment_id": client.environment_id,
+                    "requests": self.health[id(client)].requests,
+                    "errors": self.health[id(client)].errors,
+                    "error_rate": self.health[id(client)].error_rate,
+                    "throttled": self.health[id(client)].is_throttled(now),
+                    "remaining_budget": self.health[id(client)].remaining_budget(now),
+                }
+                for client in self.clients
+            ]
+
+
+@attr.s(auto_attribs=True)
+class DBTPooledApi(DBTApi):
+    """
+    A DBTApi whose requests are routed through a DBTClientPool, spreading
+    them over every token configured for its account and environment.
+    """
+
+    pool: Union[DBTClientPool, None] = attr.ib(default=None)
+
+    def request(
+        self,
+        method: str = "get",
+        url: str = "/jobs",
+        json: Union[Dict, None] = None,
+        params: dict = None,
+        return_type=DBTRunStatus,
+    ):
+        return self.pool.request(
+            self.account_id,
+            self.environment_id,
+            method,
+            url,
+            json,
+            params,
+            return_type,
+        )
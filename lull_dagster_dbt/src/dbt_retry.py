@@ -0,0 +1,156 @@
+import re
+from typing import Dict, List, Tuple, Union
+
+from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_selectors import DBTStep
+from lull_dagster_dbt.src.dbt_types import DBTRunStatus
+
+# run_results.json statuses that need to be built again
+RETRY_STATUSES = ("error", "fail", "skipped", "runtime error")
+# Tags the runs of one op's attempts in their cause, so a retry finds the
+# run its failed attempt created rather than the job's newest run
+ATTEMPT_TAG = re.compile(r"\s*\[attempt:(?P<key>[^\]]+)\]")
+
+
+def failed_nodes(run_results: Dict) -> List[str]:
+    """
+    The unique_ids of nodes that errored, failed or were skipped.
+    """
+    return [
+        result["unique_id"]
+        for result in run_results.get("results", [])
+        if str(result.get("status", "")).lower() in RETRY_STATUSES
+    ]
+
+
+def node_selector(unique_id: str) -> Union[str, None]:
+    """
+    The selector for one node of run_results.json, None for node types
+    that can't be selected by name.
+    """
+    parts = unique_id.split(".")
+    if parts[0] in ("model", "seed", "snapshot", "test", "analysis"):
+        return parts[2]
+    if parts[0] == "source":
+        return f"source:{parts[2]}.{parts[3]}"
+
+    return None
+
+
+def retry_steps(
+    execute_steps: List[str], failed_index: int, run_results: Dict
+) -> Union[List[str], None]:
+    """
+    Rewrites the steps of a failed run so they only build what failed.
+
+    `run_results` belongs to the step at `failed_index`. Selecting steps
+    before it already succeeded and are dropped. The failed step selects
+    each failed node and its descendants, intersected with the step's own
+    selection. Steps after it never ran and are kept as they are.
+    Returns None when nothing can be narrowed, so the whole job should rerun.
+    """
+    failed = [
+        f"{selector}+"
+        for selector in map(node_selector, failed_nodes(run_results))
+        if selector is not None
+    ]
+    if not failed:
+        return None
+
+    retry = [
+        step
+        for step in execute_steps[:failed_index]
+        if not DBTStep.parse(step).is_selecting
+    ]
+
+    failed_step = DBTStep.parse(execute_steps[failed_index])
+    if failed_step.selectors:
+        failed_step.selectors = [
+            f"{node},{selector}"
+            for node in failed
+            for selector in failed_step.selectors
+        ]
+    else:
+        failed_step.selectors = failed
+    retry.append(failed_step.render())
+
+    return retry + execute_steps[failed_index + 1 :]
+
+
+def find_failed_step(
+    dbt: DBTApi, run_id: int, execute_steps: List[str]
+) -> Union[Tuple[int, Dict], None]:
+    """
+    The index of the first step of the run with failed nodes, and its
+    run_results.json, read step by step. None if a step before it saved no
+    results, E.g. it failed to compile, as its failures can't be known.
+    """
+    import requests
+
+    for index, step in enumerate(execute_steps):
+        if not DBTStep.parse(step).is_selecting:
+            continue
+
+        try:
+            # The artifacts endpoint counts steps from 1
+            run_results = dbt.get_run_artifact(run_id, "run_results.json", index + 1)
+        except requests.HTTPError:
+            return None
+
+        if failed_nodes(run_results):
+            return index, run_results
+
+    return None
+
+
+def attempt_cause(cause: str, attempt_key: str) -> str:
+    return f"{ATTEMPT_TAG.sub('', cause).strip()} [attempt:{attempt_key}]"
+
+
+def find_attempt_run(
+    dbt: DBTApi, job_id: Union[int, str], attempt_key: str, limit: int = 10
+) -> Union[DBTRunStatus, None]:
+    """
+    The newest of the job's last `limit` runs triggered with `attempt_key`.
+    """
+    for run in dbt.get_job_runs(job_id, limit=limit).run_list:
+        match = ATTEMPT_TAG.search(run.cause or "")
+        if match is not None and match.group("key") == attempt_key:
+            return run
+
+    return None
+
+
+def retry_steps_override(
+    dbt: DBTApi,
+    job_id: Union[int, str],
+    attempt_key: str,
+    steps_override: Union[List[str], None] = None,
+    logger=None,
+) -> Union[List[str], None]:
+    """
+    If the run of the previous attempt tagged with `attempt_key` failed,
+    returns a steps_override that only rebuilds its failed nodes and their
+    descendants. Otherwise None, E.g. the attempt failed before its run
+    was created, and the whole job should run again.
+    """
+    last_run = find_attempt_run(dbt, job_id, attempt_key)
+    if last_run is None or not last_run.run_failed:
+        return None
+
+    # The steps the run really ran, a retry's run ran a narrowed override
+    execute_steps = (
+        last_run.steps_override or steps_override or last_run.job.execute_steps
+    )
+    failed_step = find_failed_step(dbt, last_run.run_id, execute_steps)
+    if failed_step is None:
+        return None
+
+    retry = retry_steps(execute_steps, *failed_step)
+
+    if retry is not None and logger is not None:
+        logger.info(
+            f"Retrying failed nodes of run {last_run.run_id} only: {retry}"
+        )
+
+    return retry
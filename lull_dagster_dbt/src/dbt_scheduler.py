@@ -0,0 +1,255 @@
+import time
+from statistics import median
+from typing import Dict, Hashable, List, Union
+
+import attr
+
+from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_concurrency import DBTRunLeases
+from lull_dagster_dbt.src.dbt_exceptions import (
+    DBTCyclicDependencyException,
+    DBTScheduleFailedException,
+)
+from lull_dagster_dbt.src.dbt_types import DBTRunStatus
+
+
+def is_at_least_one(instance, attribute, value):
+    if value < 1:
+        raise ValueError(f"{attribute.name} must be at least 1, got {value}")
+
+
+@attr.s(auto_attribs=True)
+class DBTScheduleResult:
+    """
+    Holds the outcome of a `DBTJobScheduler.run` of `nodes`. Every node in
+    the graph ends up in exactly one of `succeeded`, `failed` or `skipped`.
+    Skipped nodes are the downstream nodes of a failed node that were never
+    started. The schedule only succeeded if every node succeeded.
+    """
+
+    nodes: List[Hashable] = attr.ib(factory=list)
+    run_statuses: Dict[Hashable, DBTRunStatus] = attr.ib(factory=dict)
+    succeeded: List[Hashable] = attr.ib(factory=list)
+    failed: List[Hashable] = attr.ib(factory=list)
+    skipped: List[Hashable] = attr.ib(factory=list)
+
+    @property
+    def not_run(self) -> List[Hashable]:
+        return [
+            n
+            for n in self.nodes
+            if n not in self.succeeded + self.failed + self.skipped
+        ]
+
+    @property
+    def is_success(self) -> bool:
+        return all(n in self.succeeded for n in self.nodes) and not (
+            self.failed or self.skipped
+        )
+
+    def check_progress(self, logger=None):
+        if self.is_success:
+            if logger is not None:
+                logger.info(f"All scheduled jobs succeeded: {self.succeeded}")
+            return
+
+        raise DBTScheduleFailedException(
+            f"Scheduled jobs failed: {self.failed}, skipped: {self.skipped}, "
+            f"not run: {self.not_run}"
+        )
+
+
+@attr.s(auto_attribs=True)
+class DBTJobScheduler:
+    """
+    Runs a DAG of DBT Cloud jobs. Each node is started as soon as all of
+    its upstream nodes succeed, with at most `max_concurrency` runs in
+    flight. When more nodes are ready than there are free slots, the nodes
+    with the longest critical path (their own duration plus the longest
+    chain of downstream durations) are started first.
+
+    `dependencies` maps a node to the list of nodes it runs after. A node
+    is a DBT Cloud job id unless `job_ids` maps it to one, which allows the
+    same job to appear several times with different `steps_overrides`.
+    Durations come from `durations` or, failing that, the median
+    `run_duration` of the job's recent successful runs.
+
+    With a `concurrency_limiter` on the DBTApi, each run also holds one of
+    its slots at `priority` until it finishes, see DBTRunLeases. If the
+    loop stops on an error, the runs still in flight are cancelled.
+    """
+
+    dbt: DBTApi
+    dependencies: Dict[Hashable, List[Hashable]]
+    max_concurrency: int = attr.ib(default=4, validator=is_at_least_one)
+    job_ids: Dict[Hashable, Union[int, str]] = attr.ib(factory=dict)
+    steps_overrides: Dict[Hashable, List[str]] = attr.ib(factory=dict)
+    durations: Dict[Hashable, float] = attr.ib(factory=dict)
+    cause: str = "Triggered by Dagster"
+    history_limit: int = 10
+    poll_interval_sec: int = 30
+    time_limit_sec: Union[int, None] = None
+    terminate_timed_out_run: bool = True
+    priority: int = 0
+
+    @property
+    def nodes(self) -> List[Hashable]:
+        nodes = list(self.dependencies)
+        for upstreams in self.dependencies.values():
+            nodes.extend(u for u in upstreams if u not in nodes)
+
+        return nodes
+
+    def upstreams(self, node: Hashable) -> List[Hashable]:
+        return list(self.dependencies.get(node, []))
+
+    def downstreams(self, node: Hashable) -> List[Hashable]:
+        return [n for n in self.nodes if node in self.upstreams(n)]
+
+    def descendants(self, node: Hashable) -> List[Hashable]:
+        found = []
+        stack = self.downstreams(node)
+        while stack:
+            child = stack.pop()
+            if child not in found:
+                found.append(child)
+                stack.extend(self.downstreams(child))
+
+        return found
+
+    def topological_order(self) -> List[Hashable]:
+        """
+        Returns the nodes upstream first. Raises if the graph has a cycle.
+        """
+        order = []
+        remaining = {n: set(self.upstreams(n)) for n in self.nodes}
+
+        while remaining:
+            ready = [n for n, ups in remaining.items() if not ups - set(order)]
+            if not ready:
+                raise DBTCyclicDependencyException(
+                    f"Job dependencies contain a cycle between: {list(remaining)}"
+                )
+            for node in ready:
+                order.append(node)
+                del remaining[node]
+
+        return order
+
+    def job_id(self, node: Hashable) -> Union[int, str]:
+        return self.job_ids.get(node, node)
+
+    def estimate_duration(self, node: Hashable) -> float:
+        if node in self.durations:
+            return self.durations[node]
+
+        runs = self.dbt.get_job_runs(
+            self.job_id(node), limit=self.history_limit
+        ).run_list
+        run_durations = [
+            run.run_duration_sec
+            for run in runs
+            if run.run_succeeded and run.run_duration_sec is not None
+        ]
+        self.durations[node] = median(run_durations) if run_durations else 0.0
+
+        return self.durations[node]
+
+    def critical_paths(self) -> Dict[Hashable, float]:
+        """
+        Returns, for each node, its own estimated duration plus the
+        longest chain of estimated durations downstream of it.
+        """
+        paths: Dict[Hashable, float] = {}
+        for node in reversed(self.topological_order()):
+            downstream = [paths[n] for n in self.downstreams(node)]
+            paths[node] = self.estimate_duration(node) + max(downstream, default=0.0)
+
+        return paths
+
+    def run(self, logger=None) -> DBTScheduleResult:
+        priorities = self.critical_paths()
+        result = DBTScheduleResult(nodes=list(priorities))
+        pending = list(priorities)
+        running: Dict[Hashable, DBTRunStatus] = {}
+        started_at: Dict[Hashable, float] = {}
+        leases = DBTRunLeases(
+            getattr(self.dbt, "concurrency_limiter", None), self.priority
+        )
+
+        try:
+            while pending or running:
+                ready = [
+                    n
+                    for n in pending
+                    if all(u in result.succeeded for u in self.upstreams(n))
+                ]
+                ready.sort(key=lambda n: priorities[n], reverse=True)
+
+                for node in ready[: max(self.max_concurrency - len(running), 0)]:
+                    if not leases.try_lease(node, f"job-{self.job_id(node)}", logger):
+                        break
+
+                    pending.remove(node)
+                    running[node] = self.dbt.create_run(
+                        self.job_id(node), self.cause, self.steps_overrides.get(node)
+                    )
+                    started_at[node] = time.time()
+
+                    if logger is not None:
+                        logger.info(
+                            f"Started {node} as run {running[node].run_id}, "
+                            f"critical path {priorities[node]:.0f} seconds."
+                        )
+
+                if not running and not leases.waiting:
+                    break
+
+                time.sleep(self.poll_interval_sec)
+                leases.renew()
+
+                for node, run_status in list(running.items()):
+                    run_status = self.dbt.get_run(run_status.run_id)
+
+                    if (
+                        run_status.is_running
+                        and self.time_limit_sec is not None
+                        and time.time() - started_at[node] >= self.time_limit_sec
+                    ):
+                        if logger is not None:
+                            logger.warning(f"Run {run_status.run_id} did not finish.")
+                        run_status.timeout()
+
+                        if self.terminate_timed_out_run:
+                            self.dbt.cancel_run(run_status.run_id)
+
+                    if run_status.is_running:
+                        running[node] = run_status
+                        continue
+
+                    del running[node]
+                    leases.release(node)
+                    result.run_statuses[node] = run_status
+
+                    if run_status.run_succeeded:
+                        result.succeeded.append(node)
+                        continue
+
+                    result.failed.append(node)
+                    skipped = [n for n in self.descendants(node) if n in pending]
+                    for child in skipped:
+                        pending.remove(child)
+                        result.skipped.append(child)
+
+                    if logger is not None:
+                        logger.warning(
+                            f"{node} failed with status: {run_status.status_humanized}, "
+                            f"skipping downstream: {skipped}"
+                        )
+        except BaseException:
+            leases.cancel_in_flight(self.dbt, running, logger)
+            raise
+        finally:
+            leases.release_all()
+
+        return result
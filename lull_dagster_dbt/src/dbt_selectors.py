@@ -0,0 +1,136 @@
+import re
+import shlex
+from typing import List, Set, Union
+
+import attr
+
+from lull_dagster_dbt.src.dbt_graph import DBTModelGraph
+
+# dbt commands that take --select/--exclude
+SELECTING_COMMANDS = ("run", "build", "test", "seed", "snapshot", "compile", "ls", "list")
+# dbt commands that materialize the models they select
+BUILDING_COMMANDS = ("run", "build")
+SELECT_FLAGS = ("--select", "-s", "--models", "-m")
+EXCLUDE_FLAGS = ("--exclude",)
+GRAPH_OPERATOR = re.compile(r"^(?P<at>@)?(?P<up>\d*\+)?(?P<name>.+?)(?P<down>\+\d*)?$")
+
+
+@attr.s(auto_attribs=True)
+class DBTStep:
+    """
+    A dbt command from a job's execute_steps, E.g.
+    `dbt run --select +orders tag:nightly --exclude stg_x --full-refresh`
+    has command "run", selectors ["+orders", "tag:nightly"], excludes
+    ["stg_x"] and args ["--full-refresh"].
+    """
+
+    command: str
+    selectors: List[str] = attr.ib(factory=list)
+    excludes: List[str] = attr.ib(factory=list)
+    args: List[str] = attr.ib(factory=list)
+
+    @property
+    def is_selecting(self) -> bool:
+        return self.command in SELECTING_COMMANDS
+
+    @property
+    def is_building(self) -> bool:
+        return self.command in BUILDING_COMMANDS
+
+    @classmethod
+    def parse(cls, step: str) -> "DBTStep":
+        words = shlex.split(step)
+        if words and words[0] == "dbt":
+            words = words[1:]
+
+        command = []
+        while words and not words[0].startswith("-"):
+            command.append(words.pop(0))
+
+        parsed = cls(command=" ".join(command))
+        target = parsed.args
+        for word in words:
+            if word in SELECT_FLAGS:
+                target = parsed.selectors
+            elif word in EXCLUDE_FLAGS:
+                target = parsed.excludes
+            elif word.startswith("-"):
+                target = parsed.args
+                target.append(word)
+            elif target is parsed.args:
+                target.append(word)
+            else:
+                target.extend(word.split())
+
+        return parsed
+
+    def render(self) -> str:
+        parts = ["dbt", self.command]
+        if self.selectors:
+            parts += ["--select", " ".join(self.selectors)]
+        if self.excludes:
+            parts += ["--exclude", " ".join(self.excludes)]
+        parts += [shlex.quote(arg) for arg in self.args]
+
+        return " ".join(parts)
+
+
+def last_building_step(execute_steps: List[str]) -> Union[int, None]:
+    """
+    The step number of the last run or build step, counted from 1 as the
+    DBT Cloud artifacts endpoint counts steps, or None if there is none.
+    """
+    for index in reversed(range(len(execute_steps))):
+        if DBTStep.parse(execute_steps[index]).is_building:
+            return index + 1
+
+    return None
+
+
+def resolve_selector(graph: DBTModelGraph, selector: str) -> Set[str]:
+    """
+    Resolves one selector to model unique_ids. Supports model names,
+    `model:`, `tag:`, `*`, the `+`/`@` graph operators and `,`
+    intersections. Other methods (path:, config:, ...) resolve to nothing.
+    """
+    if "," in selector:
+        parts = [resolve_selector(graph, part) for part in selector.split(",")]
+        return set.intersection(*parts)
+
+    match = GRAPH_OPERATOR.match(selector)
+    name = match.group("name")
+
+    if name == "*":
+        selected = set(graph.models)
+    elif name.startswith("tag:"):
+        selected = {m for m in graph.models if name[4:] in graph.tags.get(m, [])}
+    elif ":" in name and not name.startswith("model:"):
+        selected = set()
+    else:
+        name = name[len("model:"):] if name.startswith("model:") else name
+        selected = {m for m in graph.models if graph.names.get(m) == name}
+
+    result = set(selected)
+    for model in selected:
+        if match.group("up") or match.group("at"):
+            result.update(graph.ancestors(model))
+        if match.group("down") or match.group("at"):
+            for child in graph.descendants(model):
+                result.add(child)
+                if match.group("at"):
+                    result.update(graph.ancestors(child))
+
+    return result
+
+
+def resolve_step(graph: DBTModelGraph, step: DBTStep) -> Set[str]:
+    """
+    The model unique_ids a selecting step builds. No --select means all models.
+    """
+    selected = set(graph.models) if not step.selectors else set()
+    for selector in step.selectors:
+        selected |= resolve_selector(graph, selector)
+    for selector in step.excludes:
+        selected -= resolve_selector(graph, selector)
+
+    return selected
@@ -0,0 +1,204 @@
+from statistics import median
+from typing import Dict, List, Union
+
+import attr
+
+from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_exceptions import DBTNoSuccessfulRunException
+from lull_dagster_dbt.src.dbt_graph import DBTModelGraph
+from lull_dagster_dbt.src.dbt_scheduler import DBTJobScheduler, DBTScheduleResult
+from lull_dagster_dbt.src.dbt_selectors import last_building_step
+
+# Marks the cause of shard runs, which only built part of the job
+SHARD_TAG = "[shard]"
+
+
+def timings_from_run_results(run_results: Dict) -> Dict[str, float]:
+    """
+    Per-node execution time in seconds from a run_results.json artifact.
+    """
+    return {
+        result["unique_id"]: result.get("execution_time") or 0.0
+        for result in run_results.get("results", [])
+    }
+
+
+@attr.s(auto_attribs=True)
+class DBTShard:
+    """
+    A set of models built by one run, after every shard in `upstream`.
+    """
+
+    name: str
+    models: List[str]
+    upstream: List[str] = attr.ib(factory=list)
+    duration: float = 0.0
+
+
+def _pack(items: List[str], weights: Dict[str, float], bins: int) -> List[List[str]]:
+    """
+    Longest-processing-time-first packing of `items` into at most `bins`
+    groups of roughly equal total weight. Empty groups are dropped.
+    """
+    groups: List[List[str]] = [[] for _ in range(max(min(bins, len(items)), 1))]
+    totals = [0.0] * len(groups)
+    for item in sorted(items, key=lambda i: (-weights[i], i)):
+        smallest = totals.index(min(totals))
+        groups[smallest].append(item)
+        totals[smallest] += weights[item]
+
+    return [sorted(g) for g in groups if g]
+
+
+def plan_shards(
+    graph: DBTModelGraph, timings: Dict[str, float], n_shards: int
+) -> List[DBTShard]:
+    """
+    Partitions the graph into shards balanced by `timings`. Connected
+    components light enough to fit in one shard are packed together into
+    independent shards. Heavier components are split by level, each level
+    packed into up to `n_shards` shards that run after the shards holding
+    their parents. Models without a timing get the median timing.
+    """
+    known = [t for m, t in timings.items() if m in graph.parents]
+    default = median(known) if known else 1.0
+    weights = {m: timings.get(m, default) for m in graph.models}
+    target = sum(weights.values()) / max(n_shards, 1)
+
+    light, heavy = [], []
+    for component in graph.components():
+        weight = sum(weights[m] for m in component)
+        (light if weight <= target else heavy).append(component)
+
+    component_weights = {
+        component[0]: sum(weights[m] for m in component) for component in light
+    }
+    members = {component[0]: component for component in light}
+    groups = [
+        [m for key in group for m in members[key]]
+        for group in _pack(list(members), component_weights, n_shards)
+    ]
+
+    levels = graph.levels()
+    for component in heavy:
+        by_level: Dict[int, List[str]] = {}
+        for model in component:
+            by_level.setdefault(levels[model], []).append(model)
+        for level in sorted(by_level):
+            groups.extend(_pack(by_level[level], weights, n_shards))
+
+    shards = []
+    shard_of: Dict[str, str] = {}
+    for index, models in enumerate(groups):
+        name = f"shard_{index}"
+        shards.append(
+            DBTShard(
+                name=name,
+                models=sorted(models),
+                duration=sum(weights[m] for m in models),
+            )
+        )
+        shard_of.update({m: name for m in models})
+
+    for shard in shards:
+        shard.upstream = sorted(
+            {
+                shard_of[p]
+                for m in shard.models
+                for p in graph.parents[m]
+                if shard_of[p] != shard.name
+            }
+        )
+
+    return shards
+
+
+@attr.s(auto_attribs=True)
+class DBTShardedRun:
+    """
+    Splits one DBT Cloud job into `n_shards` concurrent runs of the same job,
+    each with a `steps_override` selecting its shard's models. The plan comes
+    from the manifest.json and run_results.json of the job's last successful
+    run that wasn't a shard, so only models that run built are sharded and
+    each is weighted by its execution time there. Shard runs are tagged with
+    SHARD_TAG in their cause, so `history_limit` should cover a few sharded
+    runs' worth of shards. Shards run through DBTJobScheduler, which honours
+    dependencies between shards.
+    """
+
+    dbt: DBTApi
+    job_id: Union[int, str]
+    n_shards: int = 4
+    command: str = "run"
+    cause: str = "Triggered by Dagster"
+    history_limit: int = 50
+    time_limit_sec: Union[int, None] = None
+
+    def plan(self) -> List[DBTShard]:
+        runs = self.dbt.get_job_runs(self.job_id, limit=self.history_limit).run_list
+        # A shard's run only built its shard, planning from it drops the rest
+        last_run = next(
+            (
+                run
+                for run in runs
+                if run.run_succeeded and SHARD_TAG not in (run.cause or "")
+            ),
+            None,
+        )
+        if last_run is None:
+            raise DBTNoSuccessfulRunException(
+                f"Job {self.job_id} has no successful run to plan shards from"
+            )
+
+        # Without `step` the artifacts are the last step's, often `dbt test`
+        step = last_building_step(
+            last_run.steps_override or last_run.job.execute_steps
+        )
+        if step is None:
+            raise DBTNoSuccessfulRunException(
+                f"Job {self.job_id} has no run or build step to plan shards from"
+            )
+
+        manifest = self.dbt.get_run_artifact(last_run.run_id, "manifest.json", step)
+        run_results = self.dbt.get_run_artifact(
+            last_run.run_id, "run_results.json", step
+        )
+        timings = timings_from_run_results(run_results)
+        graph = DBTModelGraph.from_manifest(manifest).subgraph(list(timings))
+
+        shards = plan_shards(graph, timings, self.n_shards)
+        if not shards:
+            raise DBTNoSuccessfulRunException(
+                f"Run {last_run.run_id} of job {self.job_id} built no models "
+                f"to plan shards from"
+            )
+
+        return shards
+
+    def shard_steps(self, shard: DBTShard) -> List[str]:
+        # unique_ids are "model.<project>.<name>"
+        names = " ".join(m.split(".")[-1] for m in shard.models)
+        return [f"dbt {self.command} --select {names}"]
+
+    def run(self, logger=None) -> DBTScheduleResult:
+        shards = self.plan()
+
+        if logger is not None:
+            for shard in shards:
+                logger.info(
+                    f"{shard.name}: {len(shard.models)} models, "
+                    f"{shard.duration:.0f} seconds, after {shard.upstream}"
+                )
+
+        scheduler = DBTJobScheduler(
+            self.dbt,
+            {shard.name: shard.upstream for shard in shards},
+            max_concurrency=self.n_shards,
+            job_ids={shard.name: self.job_id for shard in shards},
+            steps_overrides={shard.name: self.shard_steps(shard) for shard in shards},
+            durations={shard.name: shard.duration for shard in shards},
+            cause=f"{self.cause} {SHARD_TAG}",
+            time_limit_sec=self.time_limit_sec,
+        )
+
+        return scheduler.run(logger=logger)
@@ -0,0 +1,92 @@
+import time
+from statistics import median
+from typing import Union
+
+import attr
+
+from lull_dagster_dbt.src.dbt_types import DBTRunStatus
+
+
+@attr.s(auto_attribs=True)
+class DBTStallDetector:
+    """
+    Watches the statuses polled for one run and reports why it looks hung:
+
+    - it is Running but `last_heartbeat_at` hasn't moved for
+      `heartbeat_timeout_sec`,
+    - it has been Queued/Starting for longer than `queue_factor` times the
+      job's usual `queued_duration` (`expected_queued_sec`), and at least
+      `min_queue_sec`.
+
+    Either check is off when its setting is None.
+    """
+
+    heartbeat_timeout_sec: Union[float, None] = 600
+    queue_factor: Union[float, None] = 3.0
+    min_queue_sec: float = 300
+    expected_queued_sec: Union[float, None] = None
+    last_heartbeat_at: Union[str, None] = attr.ib(default=None, init=False)
+    heartbeat_moved_at: Union[float, None] = attr.ib(default=None, init=False)
+    queued_since: Union[float, None] = attr.ib(default=None, init=False)
+
+    @classmethod
+    def from_history(
+        cls, dbt, job_id: Union[int, str], limit: int = 10, **kwargs
+    ) -> "DBTStallDetector":
+        """
+        Sets `expected_queued_sec` to the median queued_duration of the
+        job's recent finished runs.
+        """
+        runs = dbt.get_job_runs(job_id, limit=limit).run_list
+        queued = [
+            run.queued_duration_sec
+            for run in runs
+            if not run.is_running and run.queued_duration_sec is not None
+        ]
+
+        return cls(expected_queued_sec=median(queued) if queued else None, **kwargs)
+
+    def reset(self):
+        self.last_heartbeat_at = None
+        self.heartbeat_moved_at = None
+        self.queued_since = None
+
+    def queue_limit_sec(self) -> Union[float, None]:
+        if self.queue_factor is None or self.expected_queued_sec is None:
+            return None
+
+        return max(self.min_queue_sec, self.queue_factor * self.expected_queued_sec)
+
+    def check(self, run_status: DBTRunStatus, now: float = None) -> Union[str, None]:
+        now = time.time() if now is None else now
+
+        if run_status.is_queued:
+            if self.queued_since is None:
+                self.queued_since = now
+
+            queue_limit = self.queue_limit_sec()
+            if queue_limit is not None and now - self.queued_since > queue_limit:
+                return (
+                    f"{run_status.status_humanized} for {now - self.queued_since:.0f} "
+                    f"seconds, usually queued {self.expected_queued_sec:.0f} seconds"
+                )
+            return None
+
+        if not run_status.is_running or self.heartbeat_timeout_sec is None:
+            return None
+
+        if (
+            self.heartbeat_moved_at is None
+            or run_status.last_heartbeat_at != self.last_heartbeat_at
+        ):
+            self.last_heartbeat_at = run_status.last_heartbeat_at
+            self.heartbeat_moved_at = now
+            return None
+
+        if now - self.heartbeat_moved_at > self.heartbeat_timeout_sec:
+            return (
+                f"no heartbeat since {run_status.last_heartbeat_at} "
+                f"for {now - self.heartbeat_moved_at:.0f} seconds"
+            )
+
+        return None
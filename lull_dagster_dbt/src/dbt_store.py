@@ -0,0 +1,28 @@
+import sqlite3
+from contextlib import contextmanager
+from typing import Generator
+
+
+@contextmanager
+def sqlite_transaction(
+    path: str, timeout_sec: float = 30.0
+) -> Generator[sqlite3.Connection, None, None]:
+    """
+    Opens the SQLite database at `path` and runs the block inside an
+    IMMEDIATE transaction, so concurrent processes sharing the file are
+    serialized on the write lock. Commits on success, rolls back on error.
+    """
+    conn = sqlite3.connect(path, timeout=timeout_sec, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        # Outside the rollback, a failed BEGIN leaves no transaction open
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
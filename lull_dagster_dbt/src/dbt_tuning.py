@@ -0,0 +1,206 @@
+import re
+import time
+from statistics import median
+from typing import Dict, Generator, List, Union
+
+import attr
+
+from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_store import sqlite_transaction
+from lull_dagster_dbt.src.dbt_types import DBTRunStatus
+
+# dbt commands that accept --threads
+THREADED_COMMANDS = ("run", "build", "test", "seed", "snapshot", "compile")
+THREADS_FLAG = re.compile(r"\s+--threads(=|\s+)\d+")
+
+
+def steps_with_threads(execute_steps: List[str], threads: int) -> List[str]:
+    """
+    Returns the job's steps with `--threads` set on every dbt command that
+    takes it, replacing any value already in the step.
+    """
+    steps = []
+    for step in execute_steps:
+        words = step.split()
+        if len(words) > 1 and words[0] == "dbt" and words[1] in THREADED_COMMANDS:
+            step = f"{THREADS_FLAG.sub('', step)} --threads {threads}"
+        steps.append(step)
+
+    return steps
+
+
+@attr.s(auto_attribs=True)
+class DBTThreadsTuner:
+    """
+    Records each successful run's `run_duration` against the thread count it
+    ran with, per job, in the SQLite file at `path`, and proposes the thread
+    count to use next:
+
+    - stay on a thread count until it has `min_samples` runs,
+    - step up by `step` threads while the highest count tried is the fastest
+      and below `max_threads` (the warehouse concurrency cap),
+    - back off one step when the latest run at the best count is slower than
+      its history by more than `degrade_tolerance`,
+    - otherwise use the count with the lowest median duration.
+    """
+
+    path: str
+    max_threads: int = 16
+    min_threads: int = 1
+    step: int = 2
+    min_samples: int = 2
+    history_limit: int = 5
+    degrade_tolerance: float = 0.2
+
+    def __attrs_post_init__(self):
+        with sqlite_transaction(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS threads_runs ("
+                "job_id TEXT, run_id INTEGER, threads INTEGER, "
+                "run_duration_sec REAL, recorded_at REAL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS threads_runs_job "
+                "ON threads_runs (job_id, threads, recorded_at)"
+            )
+
+    def record(self, job_id: Union[int, str], threads: int, run_status: DBTRunStatus):
+        if not run_status.run_succeeded or run_status.run_duration_sec is None:
+            return
+
+        with sqlite_transaction(self.path) as conn:
+            conn.execute(
+                "INSERT INTO threads_runs VALUES (?, ?, ?, ?, ?)",
+                (
+                    str(job_id),
+                    run_status.run_id,
+                    threads,
+                    run_status.run_duration_sec,
+                    time.time(),
+                ),
+            )
+
+    def durations(self, job_id: Union[int, str]) -> Dict[int, List[float]]:
+        """
+        The most recent `history_limit` durations per thread count, oldest first.
+        """
+        with sqlite_transaction(self.path) as conn:
+            rows = conn.execute(
+                "SELECT threads, run_duration_sec FROM threads_runs "
+                "WHERE job_id = ? ORDER BY recorded_at, rowid",
+                (str(job_id),),
+            ).fetchall()
+
+        durations: Dict[int, List[float]] = {}
+        for row in rows:
+            durations.setdefault(row["threads"], []).append(row["run_duration_sec"])
+
+        return {t: d[-self.history_limit :] for t, d in durations.items()}
+
+    def last_threads(self, job_id: Union[int, str]) -> Union[int, None]:
+        with sqlite_transaction(self.path) as conn:
+            row = conn.execute(
+                "SELECT threads FROM threads_runs WHERE job_id = ? "
+                "ORDER BY recorded_at DESC, rowid DESC LIMIT 1",
+                (str(job_id),),
+            ).fetchone()
+
+        return row["threads"] if row is not None else None
+
+    def clamp(self, threads: int) -> int:
+        return max(self.min_threads, min(self.max_threads, threads))
+
+    def propose(self, job_id: Union[int, str], default_threads: int) -> int:
+        current = self.last_threads(job_id)
+        if current is None:
+            return self.clamp(default_threads)
+
+        durations = self.durations(job_id)
+        if len(durations[current]) < self.min_samples:
+            return self.clamp(current)
+
+        sampled = {
+            t: median(d) for t, d in durations.items() if len(d) >= self.min_samples
+        }
+        best = min(sampled, key=sampled.get)
+
+        if best == max(sampled) and best < self.max_threads:
+            return self.clamp(best + self.step)
+
+        *previous, latest = durations[best]
+        if previous and latest > median(previous) * (1 + self.degrade_tolerance):
+            return self.clamp(best - self.step)
+
+        return best
+
+    def report(self, job_id: Union[int, str, None] = None) -> List[Dict]:
+        """
+        One row per job and thread count with the run count, median and
+        best duration, flagging the thread count that is currently fastest.
+        """
+        with sqlite_transaction(self.path) as conn:
+            jobs = [
+                row["job_id"]
+                for row in conn.execute(
+                    "SELECT DISTINCT job_id FROM threads_runs ORDER BY job_id"
+                ).fetchall()
+            ]
+
+        rows = []
+        for job in jobs if job_id is None else [str(job_id)]:
+            durations = self.durations(job)
+            medians = {t: median(d) for t, d in durations.items()}
+            for threads in sorted(durations):
+                rows.append(
+                    {
+                        "job_id": job,
+                        "threads": threads,
+                        "runs": len(durations[threads]),
+                        "median_run_duration_sec": medians[threads],
+                        "best_run_duration_sec": min(durations[threads]),
+                        "fastest": threads == min(medians, key=medians.get),
+                    }
+                )
+
+        return rows
+
+    def trigger_and_wait(
+        self,
+        dbt: DBTApi,
+        job_id: Union[int, str],
+        cause: str = "Triggered by Dagster",
+        time_limit_sec: int = 600,
+        terminate_timed_out_run: bool = True,
+        apply: bool = True,
+        logger=None,
+    ) -> Generator[DBTRunStatus, None, None]:
+        """
+        GENERATOR Method: Runs the job through `dbt.trigger_and_wait` with the
+        proposed thread count and records the result. With `apply` False
+        the proposal is only logged and the job runs with its own threads.
+        """
+        job = dbt.get_job(job_id)
+        threads = self.propose(job_id, job.threads)
+        steps_override = None
+
+        if apply:
+            steps_override = steps_with_threads(job.execute_steps, threads)
+        else:
+            if logger is not None:
+                logger.info(
+                    f"Proposed threads for job {job_id}: {threads}, "
+                    f"running with {job.threads}."
+                )
+            threads = job.threads
+
+        for run_status in dbt.trigger_and_wait(
+            job_id,
+            cause,
+            steps_override,
+            time_limit_sec,
+            terminate_timed_out_run=terminate_timed_out_run,
+            logger=logger,
+        ):
+            yield run_status
+
+        self.record(job_id, threads, run_status)
@@ -2,8 +2,11 @@ from __future__ import annotations
 from typing import List, Dict, Union
 from typing_extensions import TypedDict
 import attr
-from helpers.attr_serialization import attr_serialization
-from lull_dagster_dbt.src.dbt_exceptions import DBTRunTimeoutException
+from lull_dagster_dbt.helpers.attr_serialization import attr_serialization
+from lull_dagster_dbt.src.dbt_exceptions import (
+    DBTRunStalledException,
+    DBTRunTimeoutException,
+)
 
 class DBTApiResponseDict(TypedDict):
     data: Union[List, Dict]
@@ -11,6 +14,35 @@ class DBTApiResponseDict(TypedDict):
     extra: Union[Dict, None]
 
 
+def duration_to_seconds(duration: Union[str, None]) -> Union[float, None]:
+    """
+    Converts a DBT Cloud duration string (E.g. "01:02:03" or
+    "1 day, 01:02:03") into seconds. Returns None if it can't be parsed.
+    """
+    if duration is None or duration == "":
+        return None
+
+    days = 0
+    if "," in duration:
+        day_part, duration = duration.split(",", 1)
+        days = int(day_part.split()[0])
+
+    try:
+        hours, minutes, seconds = duration.strip().split(":")
+        return days * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+
+def seconds_to_duration(seconds: float) -> str:
+    """
+    Formats seconds the way DBT Cloud formats durations, E.g. "01:02:03".
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
 DBTRequestHeaders = TypedDict(
     "RequestHeadersType", {"Content-Type": str, "Authorization": str}
 )
@@ -54,6 +86,9 @@ class DBTJob:
     cron: str = attr.ib(metadata={"from": ["schedule", "cron"]})
     schedule_date: str = attr.ib(metadata={"from": ["schedule", "date"]})
     schedule_time: str = attr.ib(metadata={"from": ["schedule", "time"]})
+    # pylint: disable=invalid-name
+    id: int = attr.ib(kw_only=True, default=None)
+    updated_at: str = attr.ib(kw_only=True, default=None)
     request_status: DBTRequestStatus = attr.ib(
         kw_only=True,
         metadata={"from": ["status"], "ignore_default": True},
@@ -84,7 +119,9 @@ class DBTRunStatus:
     # 20: "Error",
     # 30: "Cancelled"
     # -1: "Manual Timeout" is a custom status for the trigger_and_wait method
+    # -2: "Stalled" is a custom status for runs cancelled by stall detection
     RUN_STATUS_REMAPPED: Dict[int, str] = {
+        -2: "Stalled",
         -1: "Manual Timeout",
         1: "Running",
         2: "Running",
@@ -142,6 +179,13 @@ class DBTRunStatus:
     run_duration_humanized: str = attr.ib(kw_only=True)
     status_humanized: str = attr.ib(kw_only=True)
     created_at_humanized: str = attr.ib(kw_only=True)
+    # only present when the trigger is included with the run
+    cause: Union[str, None] = attr.ib(
+        kw_only=True, default=None, metadata={"from": ["trigger", "cause"]}
+    )
+    steps_override: Union[List[str], None] = attr.ib(
+        kw_only=True, default=None, metadata={"from": ["trigger", "steps_override"]}
+    )
     # the status dict
     request_status: DBTRequestStatus = attr.ib(
         kw_only=True,
@@ -153,6 +197,7 @@ class DBTRunStatus:
     run_succeeded: bool = attr.ib(init=False)
     is_running: bool = attr.ib(init=False)
     run_timed_out: bool = attr.ib(default=False)
+    stall_reason: Union[str, None] = attr.ib(default=None)
 
     def __attrs_post_init__(self):
         self.status_map = self.RUN_STATUS_REMAPPED[self.status]
@@ -161,14 +206,37 @@ class DBTRunStatus:
         self.run_succeeded = self.status_map == "Success"
         self.is_running = self.status_map == "Running"
 
+    @property
+    def run_duration_sec(self) -> Union[float, None]:
+        return duration_to_seconds(self.run_duration)
+
+    @property
+    def queued_duration_sec(self) -> Union[float, None]:
+        return duration_to_seconds(self.queued_duration)
+
     def timeout(self):
         self.is_running = False
         self.run_timed_out = True
         self.status = -1
         self.status_humanized = "Timeout"
 
+    @property
+    def is_queued(self) -> bool:
+        # Queued or Starting
+        return self.status in (1, 2)
+
+    def stalled(self, reason: str):
+        self.is_running = False
+        self.stall_reason = reason
+        self.status = -2
+        self.status_humanized = "Stalled"
+
     def check_run_progress(self, logger=None):
-        if self.run_timed_out:
+        if self.stall_reason is not None:
+            raise DBTRunStalledException(
+                f"Run {self.run_id} stalled and was cancelled: {self.stall_reason}"
+            )
+        elif self.run_timed_out:
             raise DBTRunTimeoutException(
                 f"Run {self.run_id} failed to complete, status: {self.status_humanized}"
             )
@@ -203,6 +271,16 @@ class DBTRunStatusList:
 
         return self.run_list[0].status_humanized
 
+    def get_last_successful_run(self) -> Union[DBTRunStatus, None]:
+        """
+        The most recent successful run in the list, if there is one.
+        """
+        for run in self.run_list:
+            if run.run_succeeded:
+                return run
+
+        return None
+
     @classmethod
     def from_dict(cls, dbt_response: DBTApiResponseDict) -> DBTRunStatusList:
         """
@@ -218,3 +296,26 @@ class DBTRunStatusList:
                 for item in dbt_response["data"]
             ]
         )
+
+
+@attr.s
+class DBTJobList:
+    """
+    This class holds one page of jobs from the `list_jobs` method in the
+    api, along with the total number of jobs across all pages.
+    """
+
+    job_list: List[DBTJob] = attr.ib(kw_only=True)
+    total_count: Union[int, None] = attr.ib(kw_only=True, default=None)
+
+    @classmethod
+    def from_dict(cls, dbt_response: DBTApiResponseDict) -> DBTJobList:
+        pagination = (dbt_response.get("extra") or {}).get("pagination") or {}
+
+        return cls(
+            job_list=[
+                DBTJob.from_dict(item, ignore_default=True)
+                for item in dbt_response["data"]
+            ],
+            total_count=pagination.get("total_count"),
+        )
@@ -0,0 +1,159 @@
+import copy
+
+import pytest
+
+
+REQUEST_STATUS = {
+    "code": 200,
+    "is_success": True,
+    "user_message": "Success!",
+    "developer_message": "",
+}
+
+JOB = {
+    "id": 1234,
+    "account_id": 1128,
+    "project_id": 2200,
+    "environment_id": 3300,
+    "name": "Nightly Build",
+    "dbt_version": "1.0.0",
+    "execute_steps": ["dbt seed", "dbt run", "dbt test"],
+    "settings": {"threads": 4, "target_name": "prod"},
+    "state": 1,
+    "generate_docs": False,
+    "schedule": {"cron": "0 6 * * *", "date": {}, "time": {}},
+    "created_at": "2021-11-01 12:00:00.000000+00:00",
+    "updated_at": "2021-11-01 12:00:00.000000+00:00",
+}
+
+RUN = {
+    "id": 5678,
+    "trigger_id": 9012,
+    "account_id": 1128,
+    "project_id": 2200,
+    "job_definition_id": 1234,
+    "status": 10,
+    "git_branch": "main",
+    "git_sha": "0123456789abcdef",
+    "status_message": None,
+    "dbt_version": "1.0.0",
+    "created_at": "2021-11-02 06:00:00.000000+00:00",
+    "updated_at": "2021-11-02 06:10:00.000000+00:00",
+    "dequeued_at": "2021-11-02 06:00:05.000000+00:00",
+    "started_at": "2021-11-02 06:00:10.000000+00:00",
+    "finished_at": "2021-11-02 06:10:00.000000+00:00",
+    "last_checked_at": "2021-11-02 06:10:00.000000+00:00",
+    "last_heartbeat_at": "2021-11-02 06:09:55.000000+00:00",
+    "owner_thread_id": None,
+    "executed_by_thread_id": "dbt-run-5678",
+    "artifacts_saved": True,
+    "artifact_s3_path": "s3://bucket/runs/5678",
+    "has_docs_generated": False,
+    "trigger": {"id": 9012, "cause": "Triggered by Dagster"},
+    "job": JOB,
+    "duration": "00:10:00",
+    "queued_duration": "00:00:10",
+    "run_duration": "00:09:50",
+    "duration_humanized": "10 minutes",
+    "queued_duration_humanized": "10 seconds",
+    "run_duration_humanized": "9 minutes, 50 seconds",
+    "status_humanized": "Success",
+    "created_at_humanized": "1 hour ago",
+}
+
+
+def make_job(**overrides):
+    """
+    Builds a `/jobs/{id}` style API response, overriding job fields.
+    """
+    job = copy.deepcopy(JOB)
+    job.update(overrides)
+    return {"data": job, "status": dict(REQUEST_STATUS)}
+
+
+def make_run(**overrides):
+    """
+    Builds a `/runs/{id}` style API response, overriding run fields.
+    """
+    run = copy.deepcopy(RUN)
+    run.update(overrides)
+    return {"data": run, "status": dict(REQUEST_STATUS)}
+
+
+def make_run_list(*runs):
+    """
+    Builds a `/runs` style API response from `make_run` responses.
+    """
+    return {
+        "data": [run["data"] for run in runs],
+        "status": dict(REQUEST_STATUS),
+        "extra": {"pagination": {"count": len(runs), "total_count": len(runs)}},
+    }
+
+
+@pytest.fixture
+def get_job():
+    return make_job()
+
+
+@pytest.fixture
+def get_run_success():
+    return make_run()
+
+
+@pytest.fixture
+def get_run_running():
+    return make_run(
+        status=3,
+        status_humanized="Running",
+        finished_at=None,
+        duration="00:05:00",
+        run_duration="00:04:50",
+    )
+
+
+@pytest.fixture
+def get_run_status_list():
+    return make_run_list(
+        make_run(id=5679),
+        make_run(id=5678),
+    )
+
+
+def make_manifest(parents, tags=None):
+    """
+    Builds a minimal manifest.json from a dict of model name to the list
+    of model names it depends on.
+    """
+    tags = tags or {}
+    return {
+        "nodes": {
+            f"model.lull.{name}": {
+                "resource_type": "model",
+                "name": name,
+                "tags": tags.get(name, []),
+                "depends_on": {
+                    "nodes": [f"model.lull.{p}" for p in ups] + ["source.lull.raw.events"]
+                },
+            }
+            for name, ups in parents.items()
+        }
+    }
+
+
+def make_run_results(timings, statuses=None):
+    """
+    Builds a minimal run_results.json from a dict of model name to its
+    execution time, with optional per-model statuses (default "success").
+    """
+    statuses = statuses or {}
+    return {
+        "results": [
+            {
+                "unique_id": f"model.lull.{name}",
+                "status": statuses.get(name, "success"),
+                "execution_time": seconds,
+            }
+            for name, seconds in timings.items()
+        ]
+    }
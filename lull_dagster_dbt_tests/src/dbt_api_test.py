@@ -1,31 +1,31 @@
 import pytest, pdb
 from unittest.mock import patch, Mock
-from dbt.src.dbt_api import DBTApi
-from dbt.src.dbt_exceptions import DBTNoJobIdException, DBTNoRunIdException
-from dbt.src.dbt_types import DBTJob, DBTRunStatus
-from tests.fixtures.dbt_fixtures import get_run_success, get_run_running
+from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_exceptions import DBTNoJobIdException, DBTNoRunIdException
+from lull_dagster_dbt.src.dbt_types import DBTJob, DBTJobList, DBTRunStatus
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import get_run_success, get_run_running
 
 
 @pytest.fixture
 def dbt_obj():
-    return DBTApi("test")
+    return DBTApi("test", 1, 1128, 1)
 
 
 class TestDBTApi:
     def test___init___set(self, dbt_obj):
-        dbt = DBTApi("test")
+        dbt = DBTApi("test", 1, 1128, 1)
         assert dbt.headers["Authorization"] == "Token test"
 
     def test___init___exception(self):
         with pytest.raises(ValueError) as exec_info:
-            DBTApi(access_token=None)
+            DBTApi(None, 1, 1128, 1)
 
         assert (
             str(exec_info.value)
             == "access_token can't be None or Empty String"
         )
 
-    @patch("dbt.src.dbt_api.requests.request")
+    @patch("requests.request")
     def test_request(self, dbt_req_get, dbt_obj):
         response_mock = Mock()
         json_mock = Mock()
@@ -49,7 +49,7 @@ class TestDBTApi:
         json_mock.assert_called_once()
         from_dict_mock.assert_called_once()
 
-    @patch("dbt.src.dbt_api.DBTApi.request")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.request")
     def test_get_job_success(self, req_func, dbt_obj):
         dbt_obj.get_job("1234")
         req_func.assert_called_once_with(url="/jobs/1234", return_type=DBTJob)
@@ -92,7 +92,7 @@ class TestDBTApi:
             ),
         ],
     )
-    @patch("dbt.src.dbt_api.DBTApi.request")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.request")
     def test_create_run_success(
         self, req_func, dbt_obj, job_id, keyargs, jsonfield
     ):
@@ -105,7 +105,7 @@ class TestDBTApi:
 
         assert str(exec_info.value) == "No Job ID provided"
 
-    @patch("dbt.src.dbt_api.DBTApi.request")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.request")
     def test_get_run_success(self, req_func, dbt_obj):
         dbt_obj.get_run(1234)
         req_func.assert_called_once_with(url="/runs/1234")
@@ -116,11 +116,11 @@ class TestDBTApi:
 
         assert str(exec_info.value) == "Run ID Can't be None"
 
-    @patch("dbt.src.dbt_api.time.sleep", return_value=None)
-    @patch("dbt.src.dbt_api.time.time")
-    @patch("dbt.src.dbt_api.DBTApi.get_run")
-    @patch("dbt.src.dbt_api.DBTApi.create_run")
-    @patch("dbt.src.dbt_api.DBTApi.cancel_run")
+    @patch("lull_dagster_dbt.src.dbt_api.time.sleep", return_value=None)
+    @patch("lull_dagster_dbt.src.dbt_api.time.time")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.get_run")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.create_run")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.cancel_run")
     def test_trigger_and_wait(
         self,
         cancel_run_mock,
@@ -150,11 +150,11 @@ class TestDBTApi:
         create_run_mock.assert_called_once_with(job_id, "test", [])
         assert get_run_mock.call_count == len(get_run_returns)
 
-    @patch("dbt.src.dbt_api.time.sleep", return_value=None)
-    @patch("dbt.src.dbt_api.time.time")
-    @patch("dbt.src.dbt_api.DBTApi.get_run")
-    @patch("dbt.src.dbt_api.DBTApi.create_run")
-    @patch("dbt.src.dbt_api.DBTApi.cancel_run")
+    @patch("lull_dagster_dbt.src.dbt_api.time.sleep", return_value=None)
+    @patch("lull_dagster_dbt.src.dbt_api.time.time")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.get_run")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.create_run")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.cancel_run")
     @pytest.mark.parametrize("to_cancel_run", [True, False])
     def test_trigger_and_wait_cancel_run(
         self,
@@ -190,7 +190,7 @@ class TestDBTApi:
         if to_cancel_run:
             cancel_run_mock.assert_called_once_with(run_id)
 
-    @patch("dbt.src.dbt_api.DBTApi.request")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.request")
     def test_cancel_run_success(self, req_func, dbt_obj):
         dbt_obj.cancel_run(1234)
         req_func.assert_called_once_with("post", "/runs/1234/cancel/")
@@ -199,4 +199,49 @@ class TestDBTApi:
         with pytest.raises(DBTNoRunIdException) as exec_info:
             dbt_obj.cancel_run(None)
 
-        assert str(exec_info.value) == "Run ID Can't be None"
\ No newline at end of file
+        assert str(exec_info.value) == "Run ID Can't be None"
+
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.request")
+    def test_get_run_artifact_success(self, req_func, dbt_obj):
+        dbt_obj.get_run_artifact(1234, "run_results.json")
+        req_func.assert_called_once_with(
+            url="/runs/1234/artifacts/run_results.json",
+            params=None,
+            return_type=None,
+        )
+
+    def test_get_run_artifact_exception(self, dbt_obj):
+        with pytest.raises(DBTNoRunIdException) as exec_info:
+            dbt_obj.get_run_artifact(None)
+
+        assert str(exec_info.value) == "Run ID Can't be None"
+
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.request")
+    def test_list_jobs_success(self, req_func, dbt_obj):
+        dbt_obj.list_jobs(offset=100)
+        req_func.assert_called_once_with(
+            url="/jobs/",
+            params={
+                "environment_id": dbt_obj.environment_id,
+                "order_by": "-updated_at",
+                "offset": 100,
+                "limit": 100,
+            },
+            return_type=DBTJobList,
+        )
+
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.request")
+    def test_list_runs_success(self, req_func, dbt_obj):
+        dbt_obj.list_runs(offset=100, job_id=1234, return_type=None)
+        req_func.assert_called_once_with(
+            url="/runs",
+            params={
+                "include_related": ["job", "trigger"],
+                "environment_id": dbt_obj.environment_id,
+                "order_by": "-id",
+                "offset": 100,
+                "limit": 100,
+                "job_definition_id": "1234",
+            },
+            return_type=None,
+        )
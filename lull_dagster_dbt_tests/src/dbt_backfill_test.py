@@ -0,0 +1,243 @@
+import json
+import shlex
+
+import pytest
+import requests
+from unittest.mock import Mock
+from lull_dagster_dbt.src.dbt_backfill import (
+    DBTBackfill,
+    DBTBackfillWindow,
+    date_partitions,
+    partition_steps,
+)
+from lull_dagster_dbt.src.dbt_concurrency import DBTConcurrencyLimiter
+from lull_dagster_dbt.src.dbt_exceptions import DBTBackfillFailedException
+from lull_dagster_dbt.src.dbt_types import DBTJob, DBTRunStatus
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import make_job, make_run
+
+
+def status(run_id, code=10, queued="00:00:10", duration="00:05:00"):
+    return DBTRunStatus.from_dict(
+        make_run(id=run_id, status=code, queued_duration=queued, run_duration=duration)
+    )
+
+
+def step_vars(step):
+    words = shlex.split(step)
+    return json.loads(words[words.index("--vars") + 1])
+
+
+class FakeDBT:
+    """
+    Creates runs that finish on the next poll with the status `outcomes`
+    gives their partition, recording the most runs in flight.
+    """
+
+    def __init__(self, outcomes=None, queued=None):
+        self.outcomes = outcomes or {}
+        self.queued = queued or {}
+        self.runs = {}
+        self.created = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def get_job(self, job_id):
+        return DBTJob.from_dict(
+            make_job(execute_steps=["dbt seed", "dbt run --vars '{\"a\": 1}'"])
+        )
+
+    def create_run(self, job_id, cause, steps_override):
+        partition = cause.split(": ")[1]
+        run_id = len(self.created) + 1
+        self.created.append((partition, steps_override))
+        self.runs[run_id] = partition
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return status(run_id, code=3)
+
+    def get_run(self, run_id):
+        partition = self.runs[run_id]
+        outcome = self.outcomes.get(partition, [10])
+        code = outcome.pop(0) if len(outcome) > 1 else outcome[0]
+        if code != 3:
+            self.in_flight -= 1
+        return status(run_id, code, queued=self.queued.get(partition, "00:00:10"))
+
+    def cancel_run(self, run_id):
+        pass
+
+
+def backfill(dbt, tmp_path, partitions, **kwargs):
+    return DBTBackfill(
+        dbt,
+        1234,
+        partitions,
+        {"run_date": "{partition}"},
+        str(tmp_path / "backfill.db"),
+        poll_interval_sec=0,
+        **kwargs,
+    )
+
+
+class TestPartitions:
+    def test_date_partitions(self):
+        assert date_partitions("2021-11-29", "2021-12-02") == [
+            "2021-11-29",
+            "2021-11-30",
+            "2021-12-01",
+            "2021-12-02",
+        ]
+        assert date_partitions("2021-11-01", "2021-11-10", step_days=7) == [
+            "2021-11-01",
+            "2021-11-08",
+        ]
+
+    def test_date_partitions_step_days(self):
+        with pytest.raises(ValueError):
+            date_partitions("2021-11-01", "2021-11-10", step_days=0)
+
+    def test_partition_steps(self):
+        steps = partition_steps(
+            ["dbt seed", "dbt run -s orders --vars '{\"a\": 1, \"run_date\": \"x\"}'", "dbt docs generate"],
+            {"run_date": "{partition}", "full": True},
+            "2021-11-01",
+        )
+
+        assert step_vars(steps[0]) == {"run_date": "2021-11-01", "full": True}
+        assert steps[1].startswith("dbt run --select orders --vars")
+        assert step_vars(steps[1]) == {"a": 1, "run_date": "2021-11-01", "full": True}
+        assert steps[2] == "dbt docs generate"
+
+
+class TestDBTBackfillWindow:
+    def test_aimd(self):
+        window = DBTBackfillWindow(size=2, max_size=4, queue_target_sec=60)
+
+        window.finished(status(1))
+        window.finished(status(2))
+        assert window.slots == 3
+
+        assert window.finished(status(3, queued="00:05:00")) == "queued for 300 seconds"
+        assert window.slots == 1
+
+        window.decrease()
+        assert window.slots == 1
+
+    def test_slowdown(self):
+        window = DBTBackfillWindow(size=4)
+        window.finished(status(1, duration="00:05:00"))
+
+        assert window.finished(status(2, duration="00:20:00")) == "ran for 1200 seconds"
+        assert window.slots == 2
+
+
+class TestDBTBackfill:
+    def test_runs_every_partition(self, tmp_path):
+        dbt = FakeDBT()
+        partitions = date_partitions("2021-11-01", "2021-11-06")
+
+        result = backfill(dbt, tmp_path, partitions, window=DBTBackfillWindow(size=2)).run()
+
+        assert sorted(result.succeeded) == partitions
+        assert dbt.max_in_flight <= 3
+        partition, steps = dbt.created[0]
+        assert step_vars(steps[1]) == {"a": 1, "run_date": partition}
+
+    def test_resumes_from_checkpoint(self, tmp_path):
+        partitions = date_partitions("2021-11-01", "2021-11-03")
+        dbt = FakeDBT(outcomes={"2021-11-02": [20]})
+
+        result = backfill(dbt, tmp_path, partitions, max_attempts=1).run()
+
+        assert result.failed == ["2021-11-02"]
+        with pytest.raises(DBTBackfillFailedException):
+            result.check_progress()
+
+        dbt = FakeDBT()
+        result = backfill(dbt, tmp_path, partitions, max_attempts=2).run()
+
+        assert sorted(result.skipped) == ["2021-11-01", "2021-11-03"]
+        assert result.succeeded == ["2021-11-02"]
+        assert [p for p, _ in dbt.created] == ["2021-11-02"]
+
+    def test_rerun_retries_exhausted_partitions(self, tmp_path):
+        dbt = FakeDBT(outcomes={"2021-11-01": [20]})
+        result = backfill(dbt, tmp_path, ["2021-11-01"]).run()
+
+        assert result.failed == ["2021-11-01"]
+        assert len(dbt.created) == 2
+
+        dbt = FakeDBT()
+        result = backfill(dbt, tmp_path, ["2021-11-01"]).run()
+
+        assert result.succeeded == ["2021-11-01"]
+        assert len(dbt.created) == 1
+
+    def test_adopts_runs_in_flight(self, tmp_path):
+        dbt = FakeDBT()
+        first = backfill(dbt, tmp_path, ["2021-11-01"])
+        dbt.runs[7] = "2021-11-01"
+        first.checkpoint("2021-11-01", "running", 7, 1)
+
+        result = backfill(dbt, tmp_path, ["2021-11-01"]).run()
+
+        assert result.succeeded == ["2021-11-01"]
+        assert dbt.created == []
+
+    def test_retries_failed_partition(self, tmp_path):
+        dbt = FakeDBT(outcomes={"2021-11-01": [20, 10]})
+
+        result = backfill(dbt, tmp_path, ["2021-11-01"]).run()
+
+        assert result.succeeded == ["2021-11-01"]
+        assert len(dbt.created) == 2
+
+    def test_rate_limited(self, tmp_path):
+        class RateLimitedDBT(FakeDBT):
+            def create_run(self, *args):
+                if not self.runs and not hasattr(self, "limited"):
+                    self.limited = True
+                    raise requests.HTTPError(response=Mock(status_code=429))
+                return super().create_run(*args)
+
+        dbt = RateLimitedDBT()
+        window = DBTBackfillWindow(size=4)
+
+        result = backfill(dbt, tmp_path, ["2021-11-01"], window=window).run()
+
+        assert result.succeeded == ["2021-11-01"]
+        # halved by the 429, then grown by the successful run
+        assert window.size == 2.5
+
+    def test_holds_limiter_slots(self, tmp_path):
+        dbt = FakeDBT()
+        dbt.concurrency_limiter = DBTConcurrencyLimiter(
+            str(tmp_path / "leases.db"), max_slots=1
+        )
+        partitions = date_partitions("2021-11-01", "2021-11-04")
+
+        result = backfill(dbt, tmp_path, partitions, window=DBTBackfillWindow(size=4)).run()
+
+        assert sorted(result.succeeded) == partitions
+        assert dbt.max_in_flight == 1
+        assert dbt.concurrency_limiter.active_leases() == 0
+
+    def test_cancels_runs_left_in_flight(self, tmp_path):
+        class FailingDBT(FakeDBT):
+            def get_run(self, run_id):
+                raise requests.ConnectionError("API down")
+
+            def cancel_run(self, run_id):
+                self.cancelled.append(run_id)
+
+        dbt = FailingDBT()
+        dbt.cancelled = []
+        dbt.concurrency_limiter = DBTConcurrencyLimiter(
+            str(tmp_path / "leases.db"), max_slots=4
+        )
+
+        with pytest.raises(requests.ConnectionError):
+            backfill(dbt, tmp_path, ["2021-11-01", "2021-11-02"]).run()
+
+        assert sorted(dbt.cancelled) == [1, 2]
+        assert dbt.concurrency_limiter.active_leases() == 0
@@ -0,0 +1,110 @@
+import pytest
+from unittest.mock import Mock
+from lull_dagster_dbt.src.dbt_catalog import DBTJobCatalog, plain_model
+from lull_dagster_dbt.src.dbt_graph import DBTModelGraph
+from lull_dagster_dbt.src.dbt_types import DBTJobList
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import make_job, make_manifest
+
+
+def job(job_id, updated_at, steps, state=1):
+    return make_job(
+        id=job_id, updated_at=updated_at, execute_steps=steps, state=state
+    )["data"]
+
+
+def page(*jobs):
+    return DBTJobList.from_dict(
+        {"data": list(jobs), "status": {}, "extra": {"pagination": {"total_count": 9}}}
+    )
+
+
+@pytest.fixture
+def dbt():
+    dbt = Mock(environment_id=3300)
+    dbt.list_jobs.side_effect = [
+        page(
+            job(1, "2021-11-03", ["dbt run -s orders", "dbt test"]),
+            job(2, "2021-11-02", ["dbt run -s +customers tag:daily"]),
+        ),
+        page(job(3, "2021-11-01", ["dbt seed", "dbt run"])),
+    ]
+    return dbt
+
+
+class TestDBTJobCatalog:
+    def test_full_refresh_pages(self, dbt, tmp_path):
+        catalog = DBTJobCatalog(dbt, str(tmp_path / "catalog.json"), page_size=2)
+
+        assert catalog.refresh() == 3
+        assert catalog.job_ids == ["1", "2", "3"]
+        assert catalog.watermark == "2021-11-03"
+        assert dbt.list_jobs.call_count == 2
+
+    def test_index_without_graph(self, dbt, tmp_path):
+        catalog = DBTJobCatalog(dbt, str(tmp_path / "catalog.json"), page_size=2)
+        catalog.refresh()
+
+        assert catalog.jobs_for_model("orders") == ["1"]
+        assert catalog.jobs_for_model("customers") == []
+        assert catalog.jobs_for_selector("tag:daily") == ["2"]
+        assert catalog.jobs_for_selector("*") == ["1", "3"]
+
+    def test_index_with_graph(self, dbt, tmp_path):
+        catalog = DBTJobCatalog(dbt, str(tmp_path / "catalog.json"), page_size=2)
+        catalog.refresh()
+        catalog.build_index(
+            DBTModelGraph.from_manifest(
+                make_manifest({"stg_customers": [], "customers": ["stg_customers"], "orders": []})
+            )
+        )
+
+        assert catalog.jobs_for_model("stg_customers") == ["2", "3"]
+        assert catalog.jobs_for_model("orders") == ["1", "3"]
+
+    def test_index_with_graph_reloads(self, dbt, tmp_path):
+        path = str(tmp_path / "catalog.json")
+        catalog = DBTJobCatalog(dbt, path, page_size=2)
+        catalog.refresh()
+        catalog.build_index(
+            DBTModelGraph.from_manifest(
+                make_manifest({"stg_customers": [], "customers": ["stg_customers"]})
+            )
+        )
+
+        reloaded = DBTJobCatalog(Mock(), path)
+
+        assert reloaded.jobs_for_model("stg_customers") == ["2", "3"]
+        assert reloaded.jobs_for_selector("tag:daily") == ["2"]
+        assert reloaded.graph == catalog.graph
+
+        # a refresh in another process keeps resolving against the saved graph
+        reloaded.dbt.list_jobs.return_value = page(job(4, "2021-11-04", ["dbt run -s +customers"]))
+        reloaded.refresh()
+
+        assert reloaded.jobs_for_model("stg_customers") == ["2", "3", "4"]
+
+    def test_incremental_refresh(self, dbt, tmp_path):
+        path = str(tmp_path / "catalog.json")
+        DBTJobCatalog(dbt, path, page_size=2).refresh()
+        dbt.list_jobs.side_effect = [
+            page(
+                job(2, "2021-11-05", ["dbt run -s orders"]),
+                job(3, "2021-11-04", [], state=2),
+            ),
+            page(job(1, "2021-11-03", ["dbt run -s orders"])),
+        ]
+
+        catalog = DBTJobCatalog(dbt, path, page_size=2)
+        assert catalog.job_ids == ["1", "2", "3"]
+
+        assert catalog.refresh() == 2
+        assert catalog.job_ids == ["1", "2"]
+        assert catalog.jobs_for_model("orders") == ["1", "2"]
+        assert catalog.watermark == "2021-11-05"
+
+    @pytest.mark.parametrize(
+        "selector,expected",
+        [("orders", "orders"), ("model:orders", "orders"), ("+orders", None), ("tag:x", None)],
+    )
+    def test_plain_model(self, selector, expected):
+        assert plain_model(selector) == expected
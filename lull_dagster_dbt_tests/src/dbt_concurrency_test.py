@@ -0,0 +1,141 @@
+import pytest
+from unittest.mock import patch, Mock
+from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_concurrency import DBTConcurrencyLimiter, DBTRunLeases
+from lull_dagster_dbt.src.dbt_exceptions import DBTConcurrencyTimeoutException
+from lull_dagster_dbt.src.dbt_store import sqlite_transaction
+from lull_dagster_dbt.src.dbt_types import DBTRunStatus
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import make_run
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return DBTConcurrencyLimiter(
+        path=str(tmp_path / "leases.db"), max_slots=2, poll_interval_sec=0
+    )
+
+
+def enqueue(limiter, holder, priority, enqueued_at):
+    ticket = f"ticket-{holder}"
+    with sqlite_transaction(limiter.path) as conn:
+        conn.execute(
+            "INSERT INTO waiters VALUES (?, ?, ?, ?, ?)",
+            (ticket, holder, priority, enqueued_at, enqueued_at + 10_000_000_000),
+        )
+    return ticket
+
+
+class TestDBTConcurrencyLimiter:
+    def test_acquire_and_release(self, limiter):
+        first = limiter.acquire("a")
+        second = limiter.acquire("b")
+
+        assert limiter.active_leases() == 2
+
+        with pytest.raises(DBTConcurrencyTimeoutException):
+            limiter.acquire("c", timeout_sec=0)
+
+        limiter.release(first)
+        third = limiter.acquire("c")
+
+        assert third.holder == "c"
+        assert limiter.active_leases() == 2
+        limiter.release(second)
+        limiter.release(third)
+        assert limiter.active_leases() == 0
+
+    @patch("lull_dagster_dbt.src.dbt_concurrency.time.time")
+    def test_expired_lease_frees_slot(self, time_mock, limiter):
+        time_mock.return_value = 1000
+        limiter.acquire("crashed")
+        limiter.acquire("crashed-too")
+
+        time_mock.return_value = 1000 + limiter.lease_ttl_sec
+
+        assert limiter.active_leases() == 0
+        assert limiter.acquire("next").holder == "next"
+
+    def test_priority_then_fifo(self, limiter):
+        limiter.max_slots = 1
+        limiter.aging_sec = None
+        low = enqueue(limiter, "low", 0, 1)
+        high_late = enqueue(limiter, "high-late", 5, 3)
+        high_early = enqueue(limiter, "high-early", 5, 2)
+
+        assert limiter.try_acquire(low) is None
+        assert limiter.try_acquire(high_late) is None
+        lease = limiter.try_acquire(high_early)
+
+        assert lease.holder == "high-early"
+        limiter.release(lease)
+        assert limiter.try_acquire(high_late).holder == "high-late"
+
+    def test_aging_prevents_starvation(self, limiter):
+        limiter.max_slots = 1
+        limiter.aging_sec = 60
+        old_low = enqueue(limiter, "old-low", 0, 0)
+        new_high = enqueue(limiter, "new-high", 1, 10_000)
+
+        assert limiter.try_acquire(new_high) is None
+        assert limiter.try_acquire(old_low).holder == "old-low"
+
+    def test_wait_stats(self, limiter):
+        with limiter.lease("a", priority=1):
+            pass
+        with limiter.lease("b", priority=1):
+            pass
+
+        stats = limiter.wait_stats()
+
+        assert stats[1]["count"] == 2
+        assert stats[1]["max_wait_sec"] >= stats[1]["mean_wait_sec"] >= 0
+
+
+class TestDBTRunLeases:
+    def test_try_lease(self, limiter):
+        limiter.max_slots = 1
+        leases = DBTRunLeases(limiter, priority=2)
+
+        assert leases.try_lease("a", "job-1")
+        assert leases.try_lease("a", "job-1")
+        assert not leases.try_lease("b", "job-2")
+        assert leases.waiting
+
+        leases.release("a")
+        # "c" takes the queue place "b" held
+        assert leases.try_lease("c", "job-3")
+        assert not leases.waiting
+        assert list(leases.leases) == ["c"]
+
+        leases.renew()
+        leases.release_all()
+        assert limiter.active_leases() == 0
+
+    def test_without_limiter(self):
+        leases = DBTRunLeases(None)
+
+        assert leases.try_lease("a", "job-1")
+        leases.release_all()
+
+
+class TestDBTApiConcurrencyLimiter:
+    @patch("lull_dagster_dbt.src.dbt_api.time.sleep", return_value=None)
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.get_run")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.create_run")
+    def test_trigger_and_wait_holds_lease(
+        self, create_run_mock, get_run_mock, sleep_mock, limiter
+    ):
+        dbt = DBTApi("test", 1, 1128, 1, concurrency_limiter=limiter)
+        create_run_mock.return_value = DBTRunStatus.from_dict(make_run(status=3))
+        get_run_mock.return_value = DBTRunStatus.from_dict(make_run())
+
+        statuses = dbt.trigger_and_wait(1234, "test", [], priority=3)
+        next(statuses)
+
+        assert limiter.active_leases() == 1
+
+        for status in statuses:
+            pass
+
+        assert limiter.active_leases() == 0
+        assert limiter.wait_stats()[3]["count"] == 1
@@ -0,0 +1,41 @@
+import pytest
+from lull_dagster_dbt.src.dbt_graph import DBTModelGraph
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import make_manifest
+
+
+def uid(name):
+    return f"model.lull.{name}"
+
+
+@pytest.fixture
+def graph():
+    # a -> b -> d, a -> c -> d, plus an independent e -> f
+    return DBTModelGraph.from_manifest(
+        make_manifest({"a": [], "b": ["a"], "c": ["a"], "d": ["b", "c"], "e": [], "f": ["e"]})
+    )
+
+
+class TestDBTModelGraph:
+    def test_from_manifest_ignores_sources(self, graph):
+        assert graph.parents[uid("d")] == [uid("b"), uid("c")]
+        assert graph.parents[uid("a")] == []
+
+    def test_components(self, graph):
+        assert graph.components() == [
+            [uid("a"), uid("b"), uid("c"), uid("d")],
+            [uid("e"), uid("f")],
+        ]
+
+    def test_levels(self, graph):
+        levels = graph.levels()
+
+        assert [levels[uid(m)] for m in "abcdef"] == [0, 1, 1, 2, 0, 1]
+
+    def test_descendants_and_ancestors(self, graph):
+        assert sorted(graph.descendants(uid("b"))) == [uid("d")]
+        assert sorted(graph.ancestors(uid("d"))) == [uid("a"), uid("b"), uid("c")]
+
+    def test_subgraph_keeps_transitive_edges(self, graph):
+        sub = graph.subgraph([uid("a"), uid("d")])
+
+        assert sub.parents == {uid("a"): [], uid("d"): [uid("a")]}
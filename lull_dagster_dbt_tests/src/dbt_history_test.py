@@ -0,0 +1,116 @@
+import pytest
+from unittest.mock import patch, Mock
+from lull_dagster_dbt.src.dbt_history import DBTRunHistory
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import make_run, make_run_list
+
+
+def run(run_id, job_id=1234, status=10, finished_at="2021-11-02 06:10:00"):
+    return make_run(
+        id=run_id, job_definition_id=job_id, status=status, finished_at=finished_at
+    )
+
+
+def running(run_id, job_id=1234):
+    return make_run(
+        id=run_id,
+        job_definition_id=job_id,
+        status=3,
+        status_humanized="Running",
+        finished_at=None,
+    )
+
+
+@pytest.fixture
+def history(tmp_path):
+    return DBTRunHistory(str(tmp_path / "history.db"), page_size=2)
+
+
+class TestDBTRunHistory:
+    def test_first_sync_pages_everything(self, history):
+        dbt = Mock()
+        dbt.list_runs.side_effect = [
+            make_run_list(run(5), run(4, job_id=99)),
+            make_run_list(run(3)),
+        ]
+
+        assert history.sync(dbt) == 3
+        assert dbt.list_runs.call_count == 2
+        assert [r.run_id for r in history.runs()] == [5, 4, 3]
+        assert [r.run_id for r in history.runs(job_id=1234)] == [5, 3]
+
+    def test_incremental_sync_stops_at_last_id(self, history):
+        dbt = Mock()
+        dbt.list_runs.side_effect = [make_run_list(run(3))]
+        history.sync(dbt)
+
+        dbt.list_runs.side_effect = [make_run_list(run(5), run(4)), make_run_list(run(3))]
+        assert history.sync(dbt) == 2
+        # the second page was fetched as the first one was full, but
+        # paging stopped at run 3
+        assert history.sync_from() == 5
+
+    def test_unfinished_runs_are_resynced(self, history):
+        dbt = Mock()
+        dbt.list_runs.side_effect = [make_run_list(running(4), run(3)), make_run_list()]
+        history.sync(dbt)
+
+        assert history.sync_from() == 3
+
+        dbt.list_runs.side_effect = [make_run_list(run(5), run(4)), make_run_list(run(3))]
+        history.sync(dbt)
+
+        assert history.runs(job_id=1234, limit=2)[1].run_succeeded
+        assert history.sync_from() == 5
+
+    @patch("lull_dagster_dbt.src.dbt_history.time.time")
+    def test_is_fresh(self, time_mock, history):
+        time_mock.return_value = 1000
+        assert history.last_synced_at() is None
+        assert not history.is_fresh()
+
+        dbt = Mock()
+        dbt.list_runs.side_effect = [make_run_list(run(3))]
+        history.sync(dbt)
+
+        assert history.last_synced_at() == 1000
+        time_mock.return_value = 1000 + history.max_age_sec
+        assert history.is_fresh()
+        time_mock.return_value += 1
+        assert not history.is_fresh()
+
+    def test_failed_sync_keeps_last_sync_time(self, history):
+        dbt = Mock()
+        dbt.list_runs.side_effect = RuntimeError("API down")
+
+        with pytest.raises(RuntimeError):
+            history.sync(dbt)
+
+        assert history.last_synced_at() is None
+
+    def test_query_filters(self, history):
+        dbt = Mock()
+        dbt.list_runs.side_effect = [
+            make_run_list(
+                run(3, status=20, finished_at="2021-11-03 06:10:00"),
+                run(2, finished_at="2021-11-02 06:10:00"),
+            ),
+            make_run_list(run(1, finished_at="2021-11-01 06:10:00")),
+        ]
+        history.sync(dbt)
+
+        assert [r.run_id for r in history.runs(statuses=[20])] == [3]
+        assert [
+            r.run_id for r in history.runs(finished_after="2021-11-01 23:59:59")
+        ] == [3, 2]
+
+    def test_get_job_runs(self, history):
+        dbt = Mock()
+        dbt.list_runs.side_effect = [make_run_list(run(3), run(2)), make_run_list()]
+        history.sync(dbt)
+
+        runs = history.get_job_runs(1234)
+
+        assert [r.run_id for r in runs.run_list] == [3, 2]
+        assert runs.run_list[0].job.name == "Nightly Build"
+        assert runs.run_list[0].cause == "Triggered by Dagster"
+        assert history.get_job_runs(99).run_list == []
@@ -0,0 +1,177 @@
+import os
+import stat
+import sys
+import time
+
+import pytest
+from unittest.mock import Mock
+from lull_dagster_dbt.src.dbt_exceptions import DBTNoJobIdException, DBTNoRunIdException
+from lull_dagster_dbt.src.dbt_local import DBTBackendRouter, DBTLocalApi, DBTLocalJob
+
+# Fake dbt: prints its arguments, `fail` exits 1, `sleep` hangs
+FAKE_DBT = f"""#!{sys.executable}
+import sys, time
+print("args:", " ".join(sys.argv[1:]), flush=True)
+if "fail" in sys.argv:
+    sys.exit(1)
+if "sleep" in sys.argv:
+    time.sleep(30)
+print("Completed successfully", flush=True)
+"""
+
+
+@pytest.fixture
+def fake_dbt(tmp_path):
+    path = tmp_path / "dbt"
+    path.write_text(FAKE_DBT)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+@pytest.fixture
+def local(fake_dbt, tmp_path):
+    api = DBTLocalApi(
+        jobs={
+            1: DBTLocalJob(
+                project_dir=str(tmp_path),
+                execute_steps=["dbt seed", "dbt run --select orders"],
+                target="ci",
+            ),
+            2: DBTLocalJob(
+                project_dir=str(tmp_path), execute_steps=["dbt run fail", "dbt test"]
+            ),
+            3: DBTLocalJob(project_dir=str(tmp_path), execute_steps=["dbt run sleep"]),
+        },
+        dbt_executable=fake_dbt,
+        log_dir=str(tmp_path),
+        poll_interval_sec=0.05,
+    )
+    yield api
+    api.shutdown(wait=False)
+
+
+def wait_for(local, run_id, timeout_sec=10):
+    deadline = time.time() + timeout_sec
+    while local.runs[run_id].finished_at is None and time.time() < deadline:
+        time.sleep(0.05)
+    return local.get_run(run_id)
+
+
+class TestDBTLocalApi:
+    def test_success(self, local, tmp_path):
+        run = local.create_run(1, cause="test")
+
+        assert run.run_id < 0
+        assert run.cause == "test"
+
+        status = wait_for(local, run.run_id)
+
+        assert status.run_succeeded
+        assert status.job.execute_steps == ["dbt seed", "dbt run --select orders"]
+        assert status.job.target_name == "ci"
+        assert local.runs[run.run_id].output == [
+            "Running: dbt seed",
+            "args: seed --target ci",
+            "Completed successfully",
+            "Running: dbt run --select orders",
+            "args: run --select orders --target ci",
+            "Completed successfully",
+        ]
+        with open(os.path.join(tmp_path, f"{abs(run.run_id)}.log")) as fp:
+            assert fp.read().splitlines() == local.runs[run.run_id].output
+
+    def test_failure_stops_later_steps(self, local):
+        status = wait_for(local, local.create_run(2).run_id)
+
+        assert status.run_failed
+        assert "exited with code 1" in status.status_message
+        assert "Running: dbt test" not in local.runs[status.run_id].output
+
+    def test_unparsable_step(self, local):
+        status = wait_for(local, local.create_run(1, steps_override=["dbt run -s 'a"]).run_id)
+
+        assert status.run_failed
+        assert status.status_message.startswith("ValueError")
+        assert status.finished_at is not None
+
+    def test_missing_log_dir(self, local, tmp_path):
+        local.log_dir = str(tmp_path / "missing")
+        status = wait_for(local, local.create_run(1).run_id)
+
+        assert status.run_failed
+        assert status.status_message.startswith("FileNotFoundError")
+
+    def test_steps_override(self, local):
+        status = wait_for(local, local.create_run(1, steps_override=["dbt build"]).run_id)
+
+        assert status.run_succeeded
+        assert "args: build --target ci" in local.runs[status.run_id].output
+
+    def test_cancel(self, local):
+        run = local.create_run(3)
+        while not local.runs[run.run_id].output[1:]:
+            time.sleep(0.05)
+
+        local.cancel_run(run.run_id)
+        status = wait_for(local, run.run_id)
+
+        assert status.status == 30
+        assert status.run_failed
+
+    def test_heartbeat_while_process_is_silent(self, local):
+        run = local.create_run(3)
+        while not local.runs[run.run_id].output[1:]:
+            time.sleep(0.05)
+
+        first = local.get_run(run.run_id).last_heartbeat_at
+        time.sleep(0.1)
+        # the fake dbt prints nothing while it sleeps
+        assert local.get_run(run.run_id).last_heartbeat_at > first
+
+        local.cancel_run(run.run_id)
+
+    def test_unknown_ids(self, local):
+        with pytest.raises(DBTNoJobIdException):
+            local.create_run(99)
+        with pytest.raises(DBTNoRunIdException):
+            local.get_run(-99)
+
+    def test_get_job_runs(self, local):
+        first = wait_for(local, local.create_run(1).run_id)
+        second = wait_for(local, local.create_run(1).run_id)
+
+        runs = local.get_job_runs(1, limit=5).run_list
+
+        assert [r.run_id for r in runs] == [second.run_id, first.run_id]
+
+    def test_trigger_and_wait(self, local):
+        statuses = list(local.trigger_and_wait(1, time_limit_sec=10))
+
+        assert statuses[-1].run_succeeded
+
+    def test_trigger_and_wait_timeout(self, local):
+        statuses = list(local.trigger_and_wait(3, time_limit_sec=0.2))
+
+        assert statuses[-1].run_timed_out
+        assert local.runs[statuses[-1].run_id].cancelled
+
+
+class TestDBTBackendRouter:
+    def test_routing(self, local):
+        cloud = Mock()
+        router = DBTBackendRouter(cloud=cloud, local=local)
+
+        run = router.create_run("1")
+        assert run.run_id < 0
+        assert wait_for(local, run.run_id).run_succeeded
+        assert router.get_run(run.run_id).run_succeeded
+        assert router.get_job(1).execute_steps == local.jobs["1"].execute_steps
+        cloud.create_run.assert_not_called()
+
+        router.create_run(1234, "cause")
+        router.get_run(5678)
+        router.list_jobs(offset=0)
+
+        cloud.create_run.assert_called_once_with(1234, "cause")
+        cloud.get_run.assert_called_once_with(5678)
+        cloud.list_jobs.assert_called_once_with(offset=0)
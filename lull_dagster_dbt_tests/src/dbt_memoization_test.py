@@ -0,0 +1,152 @@
+import pytest
+import requests
+from unittest.mock import Mock
+from lull_dagster_dbt.src.dbt_memoization import (
+    artifact_freshness_probe,
+    find_memoized_run,
+    memo_cause,
+    memo_key,
+    memoized_trigger_and_wait,
+)
+from lull_dagster_dbt.src.dbt_types import DBTRunStatus, DBTRunStatusList
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import make_run, make_run_list
+
+SHA = "0123456789abcdef"
+FRESHNESS = {"source.lull.raw.events": "2021-11-02T05:00:00Z"}
+
+
+def dbt_with_last_run(cause, git_sha=SHA, status=10):
+    dbt = Mock()
+    run = make_run(git_sha=git_sha, status=status, trigger={"cause": cause})
+    dbt.get_job_runs.return_value = DBTRunStatusList.from_dict(make_run_list(run))
+    dbt.trigger_and_wait.return_value = iter(
+        [DBTRunStatus.from_dict(make_run(id=9999))]
+    )
+    return dbt
+
+
+class TestMemoization:
+    def test_memo_key_changes_with_inputs(self):
+        key = memo_key(1234, [], SHA, FRESHNESS)
+
+        assert key == memo_key(1234, None, SHA, dict(FRESHNESS))
+        assert key != memo_key(1234, [], "fedcba", FRESHNESS)
+        assert key != memo_key(1234, ["dbt run"], SHA, FRESHNESS)
+        assert key != memo_key(1234, [], SHA, {"source.lull.raw.events": "later"})
+
+    def test_memo_cause_replaces_old_tag(self):
+        cause = memo_cause("Nightly [memo:abc123]", "def456")
+
+        assert cause == "Nightly [memo:def456]"
+
+    def test_run_status_cause(self):
+        run_status = DBTRunStatus.from_dict(make_run(trigger={"cause": "Nightly"}))
+
+        assert run_status.cause == "Nightly"
+
+    def test_find_memoized_run(self):
+        key = memo_key(1234, [], SHA, FRESHNESS)
+
+        assert find_memoized_run(
+            dbt_with_last_run(memo_cause("x", key)), 1234, key, SHA
+        ) is not None
+        assert find_memoized_run(
+            dbt_with_last_run(memo_cause("x", key), git_sha="other"), 1234, key, SHA
+        ) is None
+        assert find_memoized_run(dbt_with_last_run("x"), 1234, key, SHA) is None
+
+    def test_skips_when_unchanged(self):
+        key = memo_key(1234, [], SHA, FRESHNESS)
+        dbt = dbt_with_last_run(memo_cause("Nightly", key))
+
+        statuses = list(
+            memoized_trigger_and_wait(
+                dbt, 1234, "Nightly", [], git_sha=SHA, freshness_probe=lambda: FRESHNESS
+            )
+        )
+
+        assert [s.run_id for s in statuses] == [5678]
+        dbt.trigger_and_wait.assert_not_called()
+
+    def test_runs_with_memo_cause_when_changed(self):
+        dbt = dbt_with_last_run(memo_cause("Nightly", "0" * 16))
+
+        statuses = list(
+            memoized_trigger_and_wait(
+                dbt, 1234, "Nightly", [], git_sha=SHA, freshness_probe=lambda: FRESHNESS
+            )
+        )
+
+        assert [s.run_id for s in statuses] == [9999]
+        cause = dbt.trigger_and_wait.call_args.args[1]
+        assert cause == memo_cause("Nightly", memo_key(1234, [], SHA, FRESHNESS))
+
+    def test_runs_without_git_sha(self):
+        dbt = dbt_with_last_run("Nightly")
+
+        list(memoized_trigger_and_wait(dbt, 1234, "Nightly", []))
+
+        dbt.get_job_runs.assert_not_called()
+        assert dbt.trigger_and_wait.call_args.args[1] == "Nightly"
+
+    def test_runs_without_freshness(self):
+        key = memo_key(1234, [], SHA, {})
+        dbt = dbt_with_last_run(memo_cause("Nightly", key))
+
+        statuses = list(memoized_trigger_and_wait(dbt, 1234, "Nightly", [], git_sha=SHA))
+        assert [s.run_id for s in statuses] == [9999]
+
+        dbt = dbt_with_last_run(memo_cause("Nightly", key))
+        list(
+            memoized_trigger_and_wait(
+                dbt, 1234, "Nightly", [], git_sha=SHA, freshness_probe=lambda: None
+            )
+        )
+        assert dbt.trigger_and_wait.call_args.args[1] == "Nightly"
+
+    def freshness_dbt(self, *freshness_runs, job_run_id=5000):
+        dbt = Mock()
+        runs = {
+            42: make_run_list(*freshness_runs),
+            1234: make_run_list(make_run(id=job_run_id)),
+        }
+        dbt.get_job_runs.side_effect = lambda job_id, limit: DBTRunStatusList.from_dict(
+            runs[job_id]
+        )
+        dbt.get_run_artifact.return_value = {
+            "results": [{"unique_id": "source.lull.raw.events", "max_loaded_at": "t1"}]
+        }
+        return dbt
+
+    def test_artifact_freshness_probe(self):
+        dbt = self.freshness_dbt(make_run(status=3, id=5679), make_run())
+
+        assert artifact_freshness_probe(dbt, 42, 1234)() == {"source.lull.raw.events": "t1"}
+        dbt.get_run_artifact.assert_called_once_with(5678, "sources.json")
+
+    def test_artifact_freshness_probe_reads_errored_run(self):
+        # `dbt source freshness` errors when a source is past error_after
+        dbt = self.freshness_dbt(make_run(status=20, id=5679), make_run())
+
+        assert artifact_freshness_probe(dbt, 42, 1234)() == {"source.lull.raw.events": "t1"}
+        dbt.get_run_artifact.assert_called_once_with(5679, "sources.json")
+
+    def test_artifact_freshness_probe_skips_runs_without_artifacts(self):
+        dbt = self.freshness_dbt(make_run(status=30, id=5679), make_run())
+        dbt.get_run_artifact.side_effect = [
+            requests.HTTPError("404"),
+            {"results": []},
+        ]
+
+        assert artifact_freshness_probe(dbt, 42, 1234)() == {}
+        dbt.get_run_artifact.assert_called_with(5678, "sources.json")
+
+    def test_artifact_freshness_probe_without_run(self):
+        dbt = self.freshness_dbt(make_run(status=3))
+
+        assert artifact_freshness_probe(dbt, 42, 1234)() is None
+
+    def test_artifact_freshness_probe_older_than_job_run(self):
+        dbt = self.freshness_dbt(make_run(), job_run_id=6000)
+
+        assert artifact_freshness_probe(dbt, 42, 1234)() is None
@@ -0,0 +1,112 @@
+import pytest
+import requests
+from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_exceptions import DBTNoClientException
+from lull_dagster_dbt.src.dbt_pool import DBTClientPool, DBTPooledApi
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import make_run
+
+RUN_URL = "https://cloud.getdbt.com/api/v2/accounts/1128/runs/5678"
+CREATE_URL = "https://cloud.getdbt.com/api/v2/accounts/1128/jobs/1234/run/"
+
+
+def tokens_used(requests_mock):
+    return [r.headers["Authorization"] for r in requests_mock.request_history]
+
+
+@pytest.fixture
+def pool():
+    return DBTClientPool(
+        [
+            DBTApi("token-a", 1, 1128, 1),
+            DBTApi("token-b", 1, 1128, 1),
+            DBTApi("token-c", 2, 2256, 1),
+        ],
+        requests_per_minute=10,
+    )
+
+
+class TestDBTClientPool:
+    def test_reads_spread_by_budget(self, pool, requests_mock):
+        requests_mock.get(RUN_URL, json=make_run())
+        dbt = pool.api(account_id=1128)
+
+        for _ in range(4):
+            dbt.get_run(5678)
+
+        assert sorted(tokens_used(requests_mock)) == [
+            "Token token-a",
+            "Token token-a",
+            "Token token-b",
+            "Token token-b",
+        ]
+
+    def test_writes_use_primary(self, pool, requests_mock):
+        requests_mock.post(CREATE_URL, json=make_run())
+        dbt = pool.api(account_id=1128)
+
+        dbt.create_run(1234)
+        dbt.create_run(1234)
+
+        assert tokens_used(requests_mock) == ["Token token-a", "Token token-a"]
+
+    def test_throttled_token_skipped(self, pool, requests_mock):
+        requests_mock.get(
+            RUN_URL,
+            [
+                {"status_code": 429, "headers": {"Retry-After": "120"}},
+                {"json": make_run()},
+                {"json": make_run()},
+            ],
+        )
+        dbt = pool.api(account_id=1128)
+
+        assert dbt.get_run(5678).run_id == 5678
+        dbt.get_run(5678)
+
+        first, second, third = tokens_used(requests_mock)
+        assert second != first
+        assert third == second
+        report = {r["token"]: r for r in pool.health_report()}
+        throttled = report[f"...{first[-4:]}"]
+        assert throttled["throttled"]
+        assert throttled["error_rate"] == 1.0
+
+    def test_write_not_retried_on_server_error(self, pool, requests_mock):
+        requests_mock.post(CREATE_URL, status_code=502)
+        dbt = pool.api(account_id=1128)
+
+        with pytest.raises(requests.HTTPError):
+            dbt.create_run(1234)
+
+        assert len(requests_mock.request_history) == 1
+
+    def test_read_moves_on_after_connection_error(self, pool, requests_mock):
+        requests_mock.get(
+            RUN_URL, [{"exc": requests.ConnectionError}, {"json": make_run()}]
+        )
+        dbt = pool.api(account_id=1128)
+
+        assert dbt.get_run(5678).run_id == 5678
+
+        first, second = tokens_used(requests_mock)
+        assert second != first
+        report = {r["token"]: r for r in pool.health_report()}
+        assert report[f"...{first[-4:]}"]["error_rate"] == 1.0
+
+    def test_write_not_retried_on_timeout(self, pool, requests_mock):
+        requests_mock.post(CREATE_URL, exc=requests.Timeout)
+        dbt = pool.api(account_id=1128)
+
+        with pytest.raises(requests.Timeout):
+            dbt.create_run(1234)
+
+        assert len(requests_mock.request_history) == 1
+        assert pool.health_report()[0]["errors"] == 1
+
+    def test_routes_by_account(self, pool):
+        assert pool.route(account_id=2256).access_token == "token-c"
+        assert isinstance(pool.api(account_id=2256), DBTPooledApi)
+        assert pool.api().account_id == 1128
+
+        with pytest.raises(DBTNoClientException):
+            pool.route(account_id=9999)
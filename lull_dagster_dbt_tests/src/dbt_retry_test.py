@@ -0,0 +1,157 @@
+import pytest
+import requests
+from unittest.mock import Mock
+from lull_dagster_dbt.src.dbt_retry import (
+    attempt_cause,
+    failed_nodes,
+    find_failed_step,
+    node_selector,
+    retry_steps,
+    retry_steps_override,
+)
+from lull_dagster_dbt.src.dbt_types import DBTRunStatusList
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import (
+    make_run,
+    make_run_list,
+    make_run_results,
+)
+
+STEPS = ["dbt deps", "dbt seed", "dbt run --full-refresh", "dbt test"]
+
+
+def run_results(statuses):
+    return make_run_results({name: 1 for name in statuses}, statuses)
+
+
+class TestRetrySteps:
+    def test_failed_nodes(self):
+        results = run_results({"a": "success", "b": "error", "c": "skipped"})
+
+        assert failed_nodes(results) == ["model.lull.b", "model.lull.c"]
+
+    def test_node_selector(self):
+        assert node_selector("model.lull.orders") == "orders"
+        assert node_selector("test.lull.not_null_orders_id.1a2b") == "not_null_orders_id"
+        assert node_selector("source.lull.raw.events") == "source:raw.events"
+        assert node_selector("operation.lull.lull-on-run-end-0") is None
+
+    def test_retry_steps(self):
+        results = run_results({"a": "success", "b": "error", "c": "skipped"})
+
+        assert retry_steps(STEPS, 2, results) == [
+            "dbt deps",
+            "dbt run --select b+ c+ --full-refresh",
+            "dbt test",
+        ]
+
+    def test_retry_steps_of_later_step(self):
+        steps = ["dbt run -s staging", "dbt run -s marts", "dbt test"]
+
+        assert retry_steps(steps, 1, run_results({"mart_a": "error"})) == [
+            "dbt run --select mart_a+,marts",
+            "dbt test",
+        ]
+
+    def test_retry_steps_intersects_selection(self):
+        results = run_results({"b": "error"})
+
+        assert retry_steps(["dbt run -s tag:x +y --exclude z"], 0, results) == [
+            "dbt run --select b+,tag:x b+,+y --exclude z"
+        ]
+
+    def test_retry_steps_source(self):
+        results = {"results": [{"unique_id": "source.lull.raw.events", "status": "error"}]}
+
+        assert retry_steps(["dbt source freshness"], 0, results) == [
+            "dbt source freshness --select source:raw.events+"
+        ]
+
+    def test_retry_steps_nothing_failed(self):
+        assert retry_steps(STEPS, 2, run_results({"a": "success"})) is None
+
+    def test_retry_steps_unselectable_nodes(self):
+        results = {
+            "results": [{"unique_id": "operation.lull.on-run-end-0", "status": "error"}]
+        }
+
+        assert retry_steps(STEPS, 2, results) is None
+
+
+class TestFindFailedStep:
+    def test_reads_each_step(self):
+        steps = ["dbt deps", "dbt run -s staging", "dbt run -s marts", "dbt test"]
+        dbt = Mock()
+        dbt.get_run_artifact.side_effect = [
+            run_results({"stg_a": "success"}),
+            run_results({"mart_a": "error"}),
+        ]
+
+        assert find_failed_step(dbt, 5678, steps) == (2, run_results({"mart_a": "error"}))
+        dbt.get_run_artifact.assert_called_with(5678, "run_results.json", 3)
+        assert dbt.get_run_artifact.call_count == 2
+
+    def test_step_without_results(self):
+        dbt = Mock()
+        dbt.get_run_artifact.side_effect = requests.HTTPError("404")
+
+        assert find_failed_step(dbt, 5678, STEPS) is None
+
+
+class TestRetryStepsOverride:
+    def dbt(self, status, cause=attempt_cause("Nightly", "run-1/op"), steps=None):
+        dbt = Mock()
+        dbt.get_job_runs.return_value = DBTRunStatusList.from_dict(
+            make_run_list(
+                make_run(id=5679, status=20, trigger={"cause": "Someone else"}),
+                make_run(
+                    status=status, trigger={"cause": cause, "steps_override": steps}
+                ),
+            )
+        )
+        dbt.get_run_artifact.side_effect = lambda run_id, path, step: (
+            run_results({"a": "success"}) if step == 1 else run_results({"b": "error"})
+        )
+        return dbt
+
+    def test_attempt_cause(self):
+        cause = attempt_cause("Nightly [attempt:old]", "run-1/op")
+
+        assert cause == "Nightly [attempt:run-1/op]"
+
+    def test_uses_attempt_run_results(self):
+        dbt = self.dbt(status=20)
+
+        assert retry_steps_override(dbt, 1234, "run-1/op") == [
+            "dbt run --select b+",
+            "dbt test",
+        ]
+        dbt.get_run_artifact.assert_called_with(5678, "run_results.json", 2)
+
+    def test_uses_steps_the_run_ran(self):
+        dbt = self.dbt(status=20, steps=["dbt run -s a", "dbt run -s b+", "dbt test"])
+
+        assert retry_steps_override(dbt, 1234, "run-1/op", ["dbt build"]) == [
+            "dbt run --select b+,b+",
+            "dbt test",
+        ]
+
+    def test_attempt_run_succeeded(self):
+        assert retry_steps_override(self.dbt(status=10), 1234, "run-1/op") is None
+
+    def test_no_run_for_attempt(self):
+        dbt = self.dbt(status=20, cause="Nightly")
+
+        assert retry_steps_override(dbt, 1234, "run-1/op") is None
+        dbt.get_run_artifact.assert_not_called()
+
+    def test_job_without_runs(self):
+        dbt = Mock()
+        dbt.get_job_runs.return_value = DBTRunStatusList.from_dict(make_run_list())
+
+        assert retry_steps_override(dbt, 1234, "run-1/op") is None
+
+    def test_no_artifacts(self):
+        dbt = self.dbt(status=20)
+        dbt.get_run_artifact.side_effect = requests.HTTPError("404")
+
+        assert retry_steps_override(dbt, 1234, "run-1/op") is None
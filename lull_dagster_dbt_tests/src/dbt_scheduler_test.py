@@ -0,0 +1,194 @@
+import pytest
+from unittest.mock import patch, Mock
+from lull_dagster_dbt.src.dbt_concurrency import DBTConcurrencyLimiter
+from lull_dagster_dbt.src.dbt_exceptions import (
+    DBTCyclicDependencyException,
+    DBTScheduleFailedException,
+)
+from lull_dagster_dbt.src.dbt_scheduler import DBTJobScheduler, DBTScheduleResult
+from lull_dagster_dbt.src.dbt_types import DBTRunStatus, DBTRunStatusList
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import make_run, make_run_list
+
+
+def run_for(job_id, status=10, run_duration="00:01:00"):
+    return DBTRunStatus.from_dict(
+        make_run(
+            id=job_id * 10,
+            job_definition_id=job_id,
+            status=status,
+            run_duration=run_duration,
+        )
+    )
+
+
+@pytest.fixture
+def dbt_mock():
+    dbt = Mock(concurrency_limiter=None)
+    dbt.create_run.side_effect = lambda job_id, cause, steps: run_for(job_id, 3)
+    dbt.get_run.side_effect = lambda run_id: run_for(run_id // 10)
+    return dbt
+
+
+class TestDBTJobScheduler:
+    def test_topological_order(self, dbt_mock):
+        scheduler = DBTJobScheduler(dbt_mock, {1: [], 2: [1], 3: [1], 4: [2, 3]})
+
+        order = scheduler.topological_order()
+
+        assert order.index(1) < order.index(2) < order.index(4)
+        assert order.index(3) < order.index(4)
+
+    def test_topological_order_cycle(self, dbt_mock):
+        scheduler = DBTJobScheduler(dbt_mock, {1: [2], 2: [1]})
+
+        with pytest.raises(DBTCyclicDependencyException):
+            scheduler.topological_order()
+
+    def test_estimate_duration_from_history(self, dbt_mock):
+        dbt_mock.get_job_runs.return_value = DBTRunStatusList.from_dict(
+            make_run_list(
+                make_run(run_duration="00:02:00"),
+                make_run(run_duration="00:04:00"),
+                make_run(status=20, run_duration="01:00:00"),
+            )
+        )
+        scheduler = DBTJobScheduler(dbt_mock, {1: []})
+
+        assert scheduler.estimate_duration(1) == 180
+
+    def test_critical_paths(self, dbt_mock):
+        scheduler = DBTJobScheduler(
+            dbt_mock,
+            {1: [], 2: [1], 3: [1], 4: [2]},
+            durations={1: 10, 2: 50, 3: 5, 4: 20},
+        )
+
+        assert scheduler.critical_paths() == {1: 80, 2: 70, 3: 5, 4: 20}
+
+    @patch("lull_dagster_dbt.src.dbt_scheduler.time.sleep", return_value=None)
+    def test_run_prioritizes_critical_path(self, sleep_mock, dbt_mock):
+        scheduler = DBTJobScheduler(
+            dbt_mock,
+            {1: [], 2: [], 3: [2]},
+            max_concurrency=1,
+            durations={1: 10, 2: 5, 3: 30},
+        )
+
+        result = scheduler.run()
+
+        started = [c.args[0] for c in dbt_mock.create_run.call_args_list]
+        assert started == [2, 3, 1]
+        assert result.is_success
+        assert sorted(result.succeeded) == [1, 2, 3]
+
+    @patch("lull_dagster_dbt.src.dbt_scheduler.time.sleep", return_value=None)
+    def test_run_skips_only_downstream_of_failure(self, sleep_mock, dbt_mock):
+        dbt_mock.get_run.side_effect = lambda run_id: run_for(
+            run_id // 10, 20 if run_id == 20 else 10
+        )
+        scheduler = DBTJobScheduler(
+            dbt_mock,
+            {1: [], 2: [1], 3: [1], 4: [2], 5: [3, 4]},
+            durations={1: 1, 2: 1, 3: 1, 4: 1, 5: 1},
+        )
+
+        result = scheduler.run()
+
+        assert result.failed == [2]
+        assert sorted(result.skipped) == [4, 5]
+        assert sorted(result.succeeded) == [1, 3]
+        with pytest.raises(DBTScheduleFailedException):
+            result.check_progress()
+
+    def test_max_concurrency_at_least_one(self, dbt_mock):
+        with pytest.raises(ValueError):
+            DBTJobScheduler(dbt_mock, {1: []}, max_concurrency=0)
+
+    def test_result_requires_every_node(self):
+        result = DBTScheduleResult(nodes=[1, 2], succeeded=[1])
+
+        assert not result.is_success
+        assert result.not_run == [2]
+        with pytest.raises(DBTScheduleFailedException, match=r"not run: \[2\]"):
+            result.check_progress()
+
+        result.succeeded.append(2)
+        assert result.is_success
+
+    @patch("lull_dagster_dbt.src.dbt_scheduler.time.sleep", return_value=None)
+    def test_run_respects_max_concurrency(self, sleep_mock, dbt_mock):
+        in_flight = []
+
+        def create_run(job_id, cause, steps):
+            in_flight.append(job_id)
+            assert len(in_flight) <= 2
+            return run_for(job_id, 3)
+
+        def get_run(run_id):
+            in_flight.remove(run_id // 10)
+            return run_for(run_id // 10)
+
+        dbt_mock.create_run.side_effect = create_run
+        dbt_mock.get_run.side_effect = get_run
+        scheduler = DBTJobScheduler(
+            dbt_mock,
+            {1: [], 2: [], 3: [], 4: []},
+            max_concurrency=2,
+            durations={1: 1, 2: 1, 3: 1, 4: 1},
+        )
+
+        assert scheduler.run().is_success
+        assert dbt_mock.create_run.call_count == 4
+
+    @patch("lull_dagster_dbt.src.dbt_scheduler.time.sleep", return_value=None)
+    def test_run_holds_limiter_slots(self, sleep_mock, dbt_mock, tmp_path):
+        limiter = DBTConcurrencyLimiter(str(tmp_path / "leases.db"), max_slots=1)
+        # another process holds the only slot for the first poll
+        other = limiter.acquire("other")
+        in_flight = []
+
+        def create_run(job_id, cause, steps):
+            assert limiter.active_leases() == 1
+            in_flight.append(job_id)
+            return run_for(job_id, 3)
+
+        def get_run(run_id):
+            in_flight.remove(run_id // 10)
+            return run_for(run_id // 10)
+
+        sleep_mock.side_effect = lambda sec: limiter.release(other)
+        dbt_mock.concurrency_limiter = limiter
+        dbt_mock.create_run.side_effect = create_run
+        dbt_mock.get_run.side_effect = get_run
+
+        result = DBTJobScheduler(dbt_mock, {1: [], 2: [1], 3: []}, durations={1: 1, 2: 1, 3: 1}).run()
+
+        assert result.is_success
+        assert dbt_mock.create_run.call_count == 3
+        assert limiter.active_leases() == 0
+        assert limiter.wait_stats()[0]["count"] == 4
+
+    @patch("lull_dagster_dbt.src.dbt_scheduler.time.sleep", return_value=None)
+    def test_run_cancels_runs_left_in_flight(self, sleep_mock, dbt_mock, tmp_path):
+        limiter = DBTConcurrencyLimiter(str(tmp_path / "leases.db"), max_slots=4)
+        dbt_mock.concurrency_limiter = limiter
+        dbt_mock.get_run.side_effect = RuntimeError("API down")
+        logger = Mock()
+
+        with pytest.raises(RuntimeError):
+            DBTJobScheduler(dbt_mock, {1: [], 2: []}, durations={1: 1, 2: 1}).run(logger)
+
+        assert sorted(c.args[0] for c in dbt_mock.cancel_run.call_args_list) == [10, 20]
+        assert limiter.active_leases() == 0
+
+    @patch("lull_dagster_dbt.src.dbt_scheduler.time.sleep", return_value=None)
+    def test_run_keeps_slot_of_run_it_cannot_cancel(self, sleep_mock, dbt_mock, tmp_path):
+        limiter = DBTConcurrencyLimiter(str(tmp_path / "leases.db"), max_slots=4)
+        dbt_mock.concurrency_limiter = limiter
+        dbt_mock.get_run.side_effect = RuntimeError("API down")
+        dbt_mock.cancel_run.side_effect = RuntimeError("API down")
+
+        with pytest.raises(RuntimeError):
+            DBTJobScheduler(dbt_mock, {1: []}, durations={1: 1}).run()
+
+        assert limiter.active_leases() == 1
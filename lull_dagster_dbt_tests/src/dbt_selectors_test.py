@@ -0,0 +1,86 @@
+import pytest
+from lull_dagster_dbt.src.dbt_selectors import (
+    DBTStep,
+    last_building_step,
+    resolve_selector,
+    resolve_step,
+)
+from lull_dagster_dbt.src.dbt_graph import DBTModelGraph
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import make_manifest
+
+
+def uid(name):
+    return f"model.lull.{name}"
+
+
+@pytest.fixture
+def graph():
+    return DBTModelGraph.from_manifest(
+        make_manifest(
+            {"a": [], "b": ["a"], "c": ["b"], "x": ["a"], "y": []},
+            tags={"b": ["nightly"], "y": ["nightly"]},
+        )
+    )
+
+
+class TestDBTStep:
+    def test_parse(self):
+        step = DBTStep.parse(
+            "dbt run --full-refresh -s +orders tag:nightly --exclude stg_x "
+            "--vars '{day: 2021-11-01}'"
+        )
+
+        assert step.command == "run"
+        assert step.selectors == ["+orders", "tag:nightly"]
+        assert step.excludes == ["stg_x"]
+        assert step.args == ["--full-refresh", "--vars", "{day: 2021-11-01}"]
+        assert step.is_selecting
+
+    def test_parse_quoted_selection(self):
+        step = DBTStep.parse('dbt build --models "a b+"')
+
+        assert step.selectors == ["a", "b+"]
+
+    def test_parse_multi_word_command(self):
+        step = DBTStep.parse("dbt docs generate")
+
+        assert step.command == "docs generate"
+        assert not step.is_selecting
+
+    def test_render_round_trip(self):
+        step = DBTStep.parse("dbt run -s a b --vars '{day: 1}'")
+
+        assert DBTStep.parse(step.render()) == step
+
+
+def test_last_building_step():
+    assert last_building_step(["dbt seed", "dbt run", "dbt test"]) == 2
+    assert last_building_step(["dbt run -s a", "dbt build -s b", "dbt test"]) == 2
+    assert last_building_step(["dbt seed", "dbt test"]) is None
+
+
+class TestResolveSelector:
+    @pytest.mark.parametrize(
+        "selector,expected",
+        [
+            ("b", ["b"]),
+            ("model:b", ["b"]),
+            ("+b", ["a", "b"]),
+            ("b+", ["b", "c"]),
+            ("@b", ["a", "b", "c"]),
+            ("tag:nightly", ["b", "y"]),
+            ("tag:nightly,a+", ["b"]),
+            ("*", ["a", "b", "c", "x", "y"]),
+            ("path:models/staging", []),
+        ],
+    )
+    def test_resolve_selector(self, graph, selector, expected):
+        assert resolve_selector(graph, selector) == {uid(m) for m in expected}
+
+    def test_resolve_step(self, graph):
+        step = DBTStep.parse("dbt run --select a+ --exclude c")
+
+        assert resolve_step(graph, step) == {uid("a"), uid("b"), uid("x")}
+
+    def test_resolve_step_without_select(self, graph):
+        assert resolve_step(graph, DBTStep.parse("dbt run")) == set(graph.models)
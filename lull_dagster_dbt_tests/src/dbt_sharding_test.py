@@ -0,0 +1,183 @@
+import pytest
+from unittest.mock import patch, Mock
+from lull_dagster_dbt.src.dbt_exceptions import DBTNoSuccessfulRunException
+from lull_dagster_dbt.src.dbt_graph import DBTModelGraph
+from lull_dagster_dbt.src.dbt_sharding import (
+    DBTShardedRun,
+    plan_shards,
+    timings_from_run_results,
+)
+from lull_dagster_dbt.src.dbt_types import DBTRunStatus, DBTRunStatusList
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import (
+    make_manifest,
+    make_run,
+    make_run_list,
+    make_run_results,
+)
+
+
+def uid(name):
+    return f"model.lull.{name}"
+
+
+@pytest.fixture
+def graph():
+    # a -> b -> d, a -> c -> d, plus an independent e -> f
+    return DBTModelGraph.from_manifest(
+        make_manifest({"a": [], "b": ["a"], "c": ["a"], "d": ["b", "c"], "e": [], "f": ["e"]})
+    )
+
+
+class TestPlanShards:
+    def test_independent_components(self, graph):
+        timings = {uid(m): 10 for m in "abcdef"}
+        shards = plan_shards(graph.subgraph([uid(m) for m in "abef"]), timings, 2)
+
+        assert [s.models for s in shards] == [
+            [uid("a"), uid("b")],
+            [uid("e"), uid("f")],
+        ]
+        assert all(s.upstream == [] for s in shards)
+
+    def test_heavy_component_layered(self, graph):
+        timings = {uid("a"): 10, uid("b"): 50, uid("c"): 50, uid("d"): 10}
+        timings.update({uid("e"): 1, uid("f"): 1})
+
+        shards = {tuple(s.models): s for s in plan_shards(graph, timings, 2)}
+        by_model = {m: s.name for models, s in shards.items() for m in models}
+
+        assert by_model[uid("b")] != by_model[uid("c")]
+        assert shards[(uid("d"),)].upstream == sorted(
+            [by_model[uid("b")], by_model[uid("c")]]
+        )
+        assert shards[(uid("b"),)].upstream == [by_model[uid("a")]]
+        assert shards[(uid("e"), uid("f"))].upstream == []
+
+    def test_timings_from_run_results(self):
+        timings = timings_from_run_results(make_run_results({"a": 1.5, "b": 2}))
+
+        assert timings == {uid("a"): 1.5, uid("b"): 2}
+
+
+class TestDBTShardedRun:
+    @patch("lull_dagster_dbt.src.dbt_scheduler.time.sleep", return_value=None)
+    def test_run(self, sleep_mock):
+        dbt = Mock()
+        dbt.get_job_runs.return_value = DBTRunStatusList.from_dict(
+            make_run_list(make_run(id=1, status=20), make_run(id=2))
+        )
+
+        def get_run_artifact(run_id, path, step=None):
+            if path == "manifest.json":
+                return make_manifest({"a": [], "b": ["a"], "e": []})
+            if step == 2:
+                return make_run_results({"a": 10, "b": 10, "e": 20})
+            # the job's last step is `dbt test`, its results hold only tests
+            return {"results": [{"unique_id": "test.lull.not_null_a", "execution_time": 1}]}
+
+        dbt.get_run_artifact.side_effect = get_run_artifact
+        dbt.create_run.return_value = DBTRunStatus.from_dict(make_run(status=3))
+        dbt.get_run.return_value = DBTRunStatus.from_dict(make_run())
+
+        result = DBTShardedRun(dbt, 1234, n_shards=2).run()
+
+        assert result.is_success
+        # the fixture job is seed, run, test: artifacts come from the run step
+        dbt.get_run_artifact.assert_any_call(2, "manifest.json", 2)
+        dbt.get_run_artifact.assert_any_call(2, "run_results.json", 2)
+        steps = sorted(c.args[2] for c in dbt.create_run.call_args_list)
+        assert steps == [["dbt run --select a b"], ["dbt run --select e"]]
+
+    @patch("lull_dagster_dbt.src.dbt_scheduler.time.sleep", return_value=None)
+    def test_plans_again_after_sharded_run(self, sleep_mock):
+        class FakeDBT:
+            """
+            A job that built a, b, c and d once, later runs build only
+            their steps_override's selection.
+            """
+
+            concurrency_limiter = None
+
+            def __init__(self):
+                self.runs = [make_run(id=1)["data"]]
+
+            def get_job_runs(self, job_id, limit):
+                return DBTRunStatusList.from_dict(
+                    make_run_list(*[{"data": run} for run in self.runs[::-1][:limit]])
+                )
+
+            def get_run_artifact(self, run_id, path, step):
+                if path == "manifest.json":
+                    return make_manifest({"a": [], "b": [], "c": [], "d": []})
+                steps = self.runs[run_id - 1]["trigger"].get("steps_override")
+                names = steps[0].split("--select ")[1].split() if steps else "abcd"
+                return make_run_results({name: 10 for name in names})
+
+            def create_run(self, job_id, cause, steps_override):
+                run = make_run(
+                    id=len(self.runs) + 1,
+                    status=3,
+                    trigger={"cause": cause, "steps_override": steps_override},
+                )
+                self.runs.append(run["data"])
+                return DBTRunStatus.from_dict(run)
+
+            def get_run(self, run_id):
+                self.runs[run_id - 1]["status"] = 10
+                return DBTRunStatus.from_dict({**make_run(), "data": self.runs[run_id - 1]})
+
+        dbt = FakeDBT()
+        sharded_run = DBTShardedRun(dbt, 1234, n_shards=4)
+
+        assert len(sharded_run.plan()) == 4
+        assert sharded_run.run().is_success
+        assert len(dbt.runs) == 5
+        assert len(sharded_run.plan()) == 4
+
+    def test_plan_uses_steps_override_of_run(self):
+        dbt = Mock()
+        dbt.get_job_runs.return_value = DBTRunStatusList.from_dict(
+            make_run_list(
+                make_run(trigger={"cause": "Nightly", "steps_override": ["dbt deps", "dbt seed", "dbt run"]})
+            )
+        )
+        dbt.get_run_artifact.side_effect = lambda run_id, path, step: {
+            "manifest.json": make_manifest({"a": []}),
+            "run_results.json": make_run_results({"a": 10}),
+        }[path]
+
+        assert len(DBTShardedRun(dbt, 1234).plan()) == 1
+        dbt.get_run_artifact.assert_called_with(5678, "run_results.json", 3)
+
+    def test_plan_without_successful_run(self):
+        dbt = Mock()
+        dbt.get_job_runs.return_value = DBTRunStatusList.from_dict(
+            make_run_list(make_run(status=20))
+        )
+
+        with pytest.raises(DBTNoSuccessfulRunException):
+            DBTShardedRun(dbt, 1234).plan()
+
+    def test_plan_without_built_models(self):
+        dbt = Mock()
+        dbt.get_job_runs.return_value = DBTRunStatusList.from_dict(
+            make_run_list(make_run())
+        )
+        # the run step's results hold no models, E.g. everything was excluded
+        dbt.get_run_artifact.side_effect = lambda run_id, path, step: {
+            "manifest.json": make_manifest({"a": []}),
+            "run_results.json": {"results": []},
+        }[path]
+
+        with pytest.raises(DBTNoSuccessfulRunException):
+            DBTShardedRun(dbt, 1234).plan()
+
+    def test_plan_without_building_step(self):
+        dbt = Mock()
+        dbt.get_job_runs.return_value = DBTRunStatusList.from_dict(
+            make_run_list(make_run(job={**make_run()["data"]["job"], "execute_steps": ["dbt test"]}))
+        )
+
+        with pytest.raises(DBTNoSuccessfulRunException):
+            DBTShardedRun(dbt, 1234).plan()
+        dbt.get_run_artifact.assert_not_called()
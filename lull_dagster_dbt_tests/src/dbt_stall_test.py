@@ -0,0 +1,122 @@
+import pytest
+from unittest.mock import patch, Mock
+from lull_dagster_dbt.src.dbt_api import DBTApi
+from lull_dagster_dbt.src.dbt_exceptions import DBTRunStalledException
+from lull_dagster_dbt.src.dbt_stall import DBTStallDetector
+from lull_dagster_dbt.src.dbt_types import DBTRunStatus, DBTRunStatusList
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import make_run, make_run_list
+
+
+def running(heartbeat="2021-11-02 06:01:00", run_id=5678):
+    return DBTRunStatus.from_dict(
+        make_run(id=run_id, status=3, last_heartbeat_at=heartbeat)
+    )
+
+
+def queued():
+    return DBTRunStatus.from_dict(make_run(status=1, status_humanized="Queued"))
+
+
+class TestDBTStallDetector:
+    def test_heartbeat_stall(self):
+        detector = DBTStallDetector(heartbeat_timeout_sec=60)
+
+        assert detector.check(running("t1"), now=0) is None
+        assert detector.check(running("t1"), now=50) is None
+        assert detector.check(running("t2"), now=100) is None
+        assert detector.check(running("t2"), now=150) is None
+        assert "no heartbeat since t2" in detector.check(running("t2"), now=161)
+
+    def test_queue_stall(self):
+        detector = DBTStallDetector(
+            queue_factor=3, min_queue_sec=60, expected_queued_sec=30
+        )
+
+        assert detector.queue_limit_sec() == 90
+        assert detector.check(queued(), now=0) is None
+        assert detector.check(queued(), now=90) is None
+        assert "Queued for 91 seconds" in detector.check(queued(), now=91)
+
+    def test_queue_check_off_without_history(self):
+        detector = DBTStallDetector(expected_queued_sec=None)
+
+        assert detector.check(queued(), now=0) is None
+        assert detector.check(queued(), now=100_000) is None
+
+    def test_from_history(self):
+        dbt = Mock()
+        dbt.get_job_runs.return_value = DBTRunStatusList.from_dict(
+            make_run_list(
+                make_run(status=1, queued_duration="01:00:00"),
+                make_run(queued_duration="00:00:10"),
+                make_run(queued_duration="00:00:30"),
+            )
+        )
+
+        assert DBTStallDetector.from_history(dbt, 1234).expected_queued_sec == 20
+
+    def test_stalled_status(self):
+        run_status = running()
+        run_status.stalled("no heartbeat")
+
+        assert not run_status.is_running
+        assert run_status.status_map != "Success"
+        assert run_status.status_humanized == "Stalled"
+        with pytest.raises(DBTRunStalledException) as exec_info:
+            run_status.check_run_progress()
+
+        assert str(exec_info.value) == (
+            f"Run {run_status.run_id} stalled and was cancelled: no heartbeat"
+        )
+
+
+class TestDBTApiStallDetection:
+    @pytest.fixture
+    def dbt(self):
+        return DBTApi("test", 1, 1128, 1)
+
+    @patch("lull_dagster_dbt.src.dbt_api.time.sleep", return_value=None)
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.cancel_run")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.get_run")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.create_run")
+    def test_stalled_run_cancelled(
+        self, create_run_mock, get_run_mock, cancel_run_mock, sleep_mock, dbt
+    ):
+        detector = Mock()
+        detector.check.side_effect = [None, "no heartbeat"]
+        create_run_mock.return_value = running()
+        get_run_mock.side_effect = [running(), running()]
+
+        statuses = list(
+            dbt.trigger_and_wait(1234, "test", [], stall_detector=detector)
+        )
+
+        cancel_run_mock.assert_called_once_with(5678)
+        assert statuses[-1].stall_reason == "no heartbeat"
+
+    @patch("lull_dagster_dbt.src.dbt_api.time.sleep", return_value=None)
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.cancel_run")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.get_run")
+    @patch("lull_dagster_dbt.src.dbt_api.DBTApi.create_run")
+    def test_stalled_run_retriggered(
+        self, create_run_mock, get_run_mock, cancel_run_mock, sleep_mock, dbt
+    ):
+        detector = Mock()
+        detector.check.side_effect = ["no heartbeat", None]
+        create_run_mock.side_effect = [running(run_id=1), running(run_id=2)]
+        get_run_mock.side_effect = [
+            running(run_id=1),
+            DBTRunStatus.from_dict(make_run(id=2)),
+        ]
+
+        statuses = list(
+            dbt.trigger_and_wait(
+                1234, "test", [], stall_detector=detector, retrigger_stalled=1
+            )
+        )
+
+        cancel_run_mock.assert_called_once_with(1)
+        detector.reset.assert_called_once()
+        assert create_run_mock.call_count == 2
+        assert statuses[-1].run_id == 2
+        assert statuses[-1].run_succeeded
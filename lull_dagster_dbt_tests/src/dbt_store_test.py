@@ -0,0 +1,41 @@
+import sqlite3
+
+import pytest
+from lull_dagster_dbt.src.dbt_store import sqlite_transaction
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "store.db")
+    with sqlite_transaction(path) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    return path
+
+
+class TestSqliteTransaction:
+    def test_commits(self, path):
+        with sqlite_transaction(path) as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+
+        with sqlite_transaction(path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+
+    def test_rolls_back_on_error(self, path):
+        with pytest.raises(ValueError):
+            with sqlite_transaction(path) as conn:
+                conn.execute("INSERT INTO t VALUES (1)")
+                raise ValueError("boom")
+
+        with sqlite_transaction(path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+    def test_locked_database(self, path):
+        other = sqlite3.connect(path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        try:
+            with pytest.raises(sqlite3.OperationalError, match="database is locked"):
+                with sqlite_transaction(path, timeout_sec=0):
+                    pass
+        finally:
+            other.execute("ROLLBACK")
+            other.close()
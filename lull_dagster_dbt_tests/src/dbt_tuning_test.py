@@ -0,0 +1,96 @@
+import pytest
+from unittest.mock import Mock
+from lull_dagster_dbt.src.dbt_tuning import DBTThreadsTuner, steps_with_threads
+from lull_dagster_dbt.src.dbt_types import DBTJob, DBTRunStatus
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import make_job, make_run
+
+
+def run_taking(seconds, status=10):
+    return DBTRunStatus.from_dict(
+        make_run(status=status, run_duration=f"00:00:{seconds:02d}")
+    )
+
+
+@pytest.fixture
+def tuner(tmp_path):
+    return DBTThreadsTuner(path=str(tmp_path / "threads.db"), max_threads=8)
+
+
+def record_all(tuner, threads, durations):
+    for seconds in durations:
+        tuner.record(1234, threads, run_taking(seconds))
+
+
+class TestStepsWithThreads:
+    def test_sets_threads_on_threaded_commands(self):
+        steps = steps_with_threads(
+            ["dbt deps", "dbt run --threads 4 -s tag:nightly", "dbt test"], 8
+        )
+
+        assert steps == [
+            "dbt deps",
+            "dbt run -s tag:nightly --threads 8",
+            "dbt test --threads 8",
+        ]
+
+
+class TestDBTThreadsTuner:
+    def test_propose_without_history(self, tuner):
+        assert tuner.propose(1234, 4) == 4
+        assert tuner.propose(1234, 32) == 8
+
+    def test_propose_waits_for_samples(self, tuner):
+        record_all(tuner, 4, [50])
+
+        assert tuner.propose(1234, 4) == 4
+
+    def test_propose_steps_up_while_faster(self, tuner):
+        record_all(tuner, 2, [50, 50])
+        record_all(tuner, 4, [40, 40])
+
+        assert tuner.propose(1234, 4) == 6
+
+    def test_propose_settles_on_fastest(self, tuner):
+        record_all(tuner, 4, [40, 40])
+        record_all(tuner, 6, [45, 46])
+
+        assert tuner.propose(1234, 4) == 4
+
+    def test_propose_backs_off_on_degradation(self, tuner):
+        record_all(tuner, 6, [45, 45])
+        record_all(tuner, 4, [40, 40, 55])
+
+        assert tuner.propose(1234, 4) == 2
+
+    def test_failed_runs_not_recorded(self, tuner):
+        tuner.record(1234, 4, run_taking(10, status=20))
+
+        assert tuner.durations(1234) == {}
+
+    def test_report(self, tuner):
+        record_all(tuner, 4, [40, 42])
+        record_all(tuner, 6, [45])
+
+        report = tuner.report()
+
+        assert [(r["threads"], r["runs"], r["fastest"]) for r in report] == [
+            (4, 2, True),
+            (6, 1, False),
+        ]
+        assert report[0]["median_run_duration_sec"] == 41
+
+    def test_trigger_and_wait_applies_threads(self, tuner):
+        dbt = Mock()
+        dbt.get_job.return_value = DBTJob.from_dict(make_job())
+        dbt.trigger_and_wait.return_value = iter([run_taking(30)])
+
+        for status in tuner.trigger_and_wait(dbt, 1234, "test"):
+            pass
+
+        steps_override = dbt.trigger_and_wait.call_args.args[2]
+        assert steps_override == [
+            "dbt seed --threads 4",
+            "dbt run --threads 4",
+            "dbt test --threads 4",
+        ]
+        assert tuner.durations(1234) == {4: [30]}
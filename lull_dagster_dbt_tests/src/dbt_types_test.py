@@ -1,15 +1,16 @@
 import pytest
 
-from dbt.src.dbt_types import (
+from lull_dagster_dbt.src.dbt_types import (
     DBTRequestStatus,
     DBTJob,
+    DBTJobList,
     DBTRunStatus,
     DBTRunStatusList,
 )
 
-from dbt.src.dbt_exceptions import DBTRunTimeoutException
+from lull_dagster_dbt.src.dbt_exceptions import DBTRunTimeoutException
 
-from tests.fixtures.dbt_fixtures import (
+from lull_dagster_dbt_tests.fixtures.dbt_fixtures import (
     get_job,
     get_run_running,
     get_run_success,
@@ -84,3 +85,15 @@ class TestDBTTypes:
 
         # Checks previous run:
         assert run_status_list.get_last_completed_status() == "Success"
+
+    def test_job_list(self, get_job):
+        job_list = DBTJobList.from_dict(
+            {
+                "data": [get_job["data"]],
+                "status": get_job["status"],
+                "extra": {"pagination": {"count": 1, "total_count": 12}},
+            }
+        )
+
+        assert job_list.job_list[0].id == get_job["data"]["id"]
+        assert job_list.total_count == 12
@@ -0,0 +1,65 @@
+import subprocess
+import sys
+
+import pytest
+
+# Generous enough for slow CI machines, importing dagster alone takes longer
+IMPORT_BUDGET_US = 500_000
+HEAVY_MODULES = ("dagster", "requests")
+
+
+def import_times(statement):
+    """
+    Runs `statement` in a fresh interpreter with `-X importtime` and
+    returns {module: (self_us, cumulative_us, depth)}.
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times[name.strip()] = (int(self_us), int(cumulative_us), depth)
+
+    return times
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "import lull_dagster_dbt.src",
+        "from lull_dagster_dbt.src import DBTApi",
+        "from lull_dagster_dbt.src.dbt_types import DBTRunStatus",
+    ],
+)
+def test_client_imports_without_heavy_dependencies(statement):
+    times = import_times(statement)
+
+    assert not [
+        name for name in times if name.split(".")[0] in HEAVY_MODULES
+    ], f"{statement} imported {HEAVY_MODULES}"
+
+
+def test_client_import_budget():
+    startup = import_times("pass")
+    times = import_times(
+        "from lull_dagster_dbt.src import DBTApi\n"
+        "from lull_dagster_dbt.src.dbt_types import DBTRunStatus"
+    )
+    # Top level entries hold the cumulative time of everything they
+    # imported, the interpreter's own startup imports are left out
+    total_us = sum(
+        cumulative
+        for name, (_, cumulative, depth) in times.items()
+        if depth == 0 and name not in startup
+    )
+
+    assert "lull_dagster_dbt.src.dbt_api" in times
+    assert total_us < IMPORT_BUDGET_US, f"importing the client took {total_us} us"
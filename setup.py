@@ -31,6 +31,7 @@ if __name__ == "__main__":
             "dagster==0.13.12",
             "packaging",
             "requests",
+            "typing_extensions",
             "pytest-cov"
         ],
         extras_require={